@@ -5,8 +5,9 @@ from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
 from config import Config
+from app.database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
 bcrypt = Bcrypt()
@@ -17,6 +18,9 @@ def create_app(config_dict=None):
     if config_dict:
         app.config.update(config_dict)
 
+    from app.database import configure_engines
+    configure_engines(app)
+
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
@@ -24,13 +28,56 @@ def create_app(config_dict=None):
 
     login_manager.login_view = 'main.admin_login' # type: ignore
 
-    from app.models import User
+    from app.passwords import init_password_policy
+    init_password_policy(app)
+
+    from app.identity import init_identity_cache, load_identity
+    init_identity_cache(app)
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_identity(int(user_id))
+
+    from app.query_budget import init_query_budget
+    init_query_budget(app)
+
+    from app.counters import init_dashboard_counters
+    init_dashboard_counters(app)
+
+    from app.rollups import init_rollups
+    init_rollups(app)
+
+    from app.inbox import init_inbox
+    init_inbox(app)
+
+    from app.billing import init_billing
+    init_billing(app)
+
+    from app.search import init_search
+    init_search()
+
+    from app.directory import init_directory
+    init_directory(app)
+
+    from app.attendance_stream import init_attendance_stream
+    init_attendance_stream(app)
 
     from app.routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
 
+    if app.config['ATTENDANCE_GROUP_COMMIT']:
+        from app.punch_queue import PunchQueue
+        app.extensions['punch_queue'] = PunchQueue(app)
+
+    from app.commands import (attendance_cli, auth_cli, bench_cli, billing_cli, import_cli, reports_cli, search_cli,
+                              seed_command)
+    app.cli.add_command(attendance_cli)
+    app.cli.add_command(billing_cli)
+    app.cli.add_command(import_cli)
+    app.cli.add_command(reports_cli)
+    app.cli.add_command(auth_cli)
+    app.cli.add_command(bench_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(seed_command)
+
     return app
\ No newline at end of file
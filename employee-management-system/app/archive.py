@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select, union_all
+from app import db
+from app.models import Attendance, AttendanceArchive, AttendanceArchiveMonth
+
+ARCHIVE_COLUMNS = ['id', 'employee_id', 'clock_in_time', 'clock_out_time']
+
+def _month_start(value):
+    return datetime(value.year, value.month, 1)
+
+def _next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+def attendance_history(start=None, end=None, employee_ids=None):
+    """UNION ALL of hot and archived attendance as (id, employee_id, clock_in_time, clock_out_time).
+
+    The clock-in range [start, end) and employee filter are applied inside both halves so each uses its own
+    indexes; a range that ends after the archive horizon finds nothing in the archive at the cost of one
+    index probe.
+    """
+    selects = []
+    for model in (Attendance, AttendanceArchive):
+        stmt = select(*(getattr(model, column) for column in ARCHIVE_COLUMNS))
+        if start is not None:
+            stmt = stmt.where(model.clock_in_time >= start)
+        if end is not None:
+            stmt = stmt.where(model.clock_in_time < end)
+        if employee_ids:
+            stmt = stmt.where(model.employee_id.in_(employee_ids))
+        selects.append(stmt)
+    return union_all(*selects)
+
+def archive_attendance(before, echo=print):
+    """Move closed shifts that clocked in before the month containing `before` into attendance_archive.
+
+    Works one calendar month per transaction, so an interrupted run leaves whole months in one place or the
+    other and can simply be repeated. Open shifts stay in attendance whatever their age. Returns the number
+    of shifts moved.
+    """
+    cutoff = _month_start(before)
+    # SQLite hands out max(rowid) + 1, so archiving the newest row could let its id be reused
+    newest_id = db.session.query(db.func.max(Attendance.id)).scalar()
+    oldest = db.session.query(db.func.min(Attendance.clock_in_time)).filter(
+        Attendance.clock_out_time.isnot(None), Attendance.clock_in_time < cutoff).scalar()
+    if oldest is None:
+        return 0
+
+    moved = 0
+    month = _month_start(oldest)
+    while month < cutoff:
+        next_month = _next_month(month)
+        closed = select(*(getattr(Attendance, column) for column in ARCHIVE_COLUMNS)).where(
+            Attendance.clock_in_time >= month, Attendance.clock_in_time < next_month,
+            Attendance.clock_out_time.isnot(None), Attendance.id != newest_id)
+        count = db.session.execute(insert(AttendanceArchive).from_select(ARCHIVE_COLUMNS, closed)).rowcount
+        if count:
+            # Delete by archived id, not by repeating the filter, so a shift closed meanwhile is not lost
+            db.session.execute(delete(Attendance).where(Attendance.id.in_(
+                select(AttendanceArchive.id).where(AttendanceArchive.clock_in_time >= month,
+                                                   AttendanceArchive.clock_in_time < next_month)
+            )), execution_options={'synchronize_session': False})
+            archived_month = db.session.get(AttendanceArchiveMonth, month.date())
+            if archived_month is None:
+                archived_month = AttendanceArchiveMonth(month=month.date(), shift_count=0)
+                db.session.add(archived_month)
+            archived_month.shift_count += count
+            archived_month.archived_date = datetime.utcnow()
+            echo(f'{month:%Y-%m}: archived {count} shifts.')
+            moved += count
+        db.session.commit()
+        month = next_month
+    return moved
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import tempfile
+from flask import current_app, send_file
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Attachment
+
+def attachment_dir():
+    return current_app.config['ATTACHMENT_DIR']
+
+def blob_path(sha256):
+    # Fan out by digest prefix so no directory ends up with millions of entries
+    return os.path.join(attachment_dir(), sha256[:2], sha256[2:4], sha256)
+
+def store_attachment(upload):
+    """Stream an uploaded file to disk in chunks, hashing as it goes, and return its Attachment.
+
+    Identical content is stored once: a second upload of the same bytes reuses the existing blob and row.
+    The caller commits.
+    """
+    chunk_size = current_app.config['ATTACHMENT_CHUNK_SIZE']
+    os.makedirs(attachment_dir(), exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=attachment_dir(), prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            while True:
+                chunk = upload.stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                tmp.write(chunk)
+        sha256 = digest.hexdigest()
+        path = blob_path(sha256)
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    attachment = Attachment.query.filter_by(sha256=sha256).first()
+    if attachment:
+        return attachment
+    try:
+        with db.session.begin_nested():
+            attachment = Attachment(sha256=sha256, size=size,
+                                    content_type=upload.mimetype or 'application/octet-stream')
+            db.session.add(attachment)
+    except IntegrityError:
+        # The same content was uploaded concurrently
+        attachment = Attachment.query.filter_by(sha256=sha256).one()
+    return attachment
+
+def attachment_response(attachment, download_name):
+    """Serve a stored blob. send_file hands the open file to the server (sendfile or X-Sendfile when
+    USE_X_SENDFILE is set) and answers Range and If-None-Match requests itself."""
+    return send_file(blob_path(attachment.sha256), mimetype=attachment.content_type, as_attachment=True,
+                     download_name=download_name or attachment.sha256, etag=attachment.sha256,
+                     conditional=True, max_age=current_app.config['ATTACHMENT_MAX_AGE'])
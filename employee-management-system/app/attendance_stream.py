@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Attendance, Employee, OpenShift
+
+class AttendanceHub:
+    """Per-process fan-out of committed clock-in/clock-out events to stream subscribers.
+
+    Events go into one bounded history shared by every subscriber; a subscriber only remembers the id of the
+    last event it sent, so publishing costs the same however many streams are open. A subscriber that falls
+    further behind than the history reaches gets None from `wait` and must resend a snapshot. Commits made by
+    this process are published as they happen; those of other processes are found by `sync` every `resync`
+    seconds (0 turns it off).
+    """
+
+    def __init__(self, history_size, resync):
+        # Event ids are only meaningful to the hub that issued them, e.g. not after a restart
+        self.epoch = os.urandom(4).hex()
+        self.resync = resync
+        self._events = deque(maxlen=history_size)
+        self._last_id = 0
+        self._cond = threading.Condition()
+        # Clock-in time of every open shift as of the events published so far, None until the first sync
+        self._open_shifts = None
+        # Event id of each employee's latest punch published from a commit here, until a sync has seen it
+        self._punched = {}
+        self._next_sync = 0
+        self._sync_lock = threading.Lock()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def event_id(self, last_id):
+        return f'{self.epoch}-{last_id}'
+
+    def parse_event_id(self, value):
+        """The position in this hub named by a client's Last-Event-ID, or None if the hub cannot replay from it."""
+        epoch, _, number = (value or '').partition('-')
+        if epoch != self.epoch or not number.isdigit() or int(number) > self._last_id:
+            return None
+        return int(number) if self.events_after(int(number)) is not None else None
+
+    def publish(self, events):
+        with self._cond:
+            for name, data in events:
+                self._last_id += 1
+                self._events.append((self._last_id, name, data))
+                self._punched[data['employee_id']] = self._last_id
+                if self._open_shifts is not None:
+                    if name == 'clock_in':
+                        self._open_shifts[data['employee_id']] = data['time']
+                    else:
+                        self._open_shifts.pop(data['employee_id'], None)
+            self._cond.notify_all()
+
+    def sync_due(self):
+        return bool(self.resync) and (self._open_shifts is None or time.monotonic() >= self._next_sync)
+
+    def sync(self, load_open_shifts, load_clock_outs):
+        """Publish the punches other processes have committed since the last sync.
+
+        `load_open_shifts()` gives {employee_id: clock-in time} for every open shift and `load_clock_outs(ids)`
+        the latest clock-out time of those employees. The first sync only records the open shifts. Callers that
+        find another sync running return at once.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sync = time.monotonic() + self.resync
+            since = self._last_id
+            current = load_open_shifts()
+            with self._cond:
+                if self._open_shifts is None:
+                    self._open_shifts = current
+                    return
+                clock_ins = {id: clock_in for id, clock_in in current.items() if self._open_shifts.get(id) != clock_in}
+                clock_outs = [id for id in self._open_shifts if id not in current]
+            clock_out_times = load_clock_outs(clock_outs) if clock_outs else {}
+            with self._cond:
+                # Punches published here after the query started are newer than what it read
+                now = datetime.utcnow().isoformat()
+                events = [('clock_out', {'employee_id': id, 'time': clock_out_times.get(id) or now})
+                          for id in clock_outs if self._punched.get(id, 0) <= since]
+                events += [('clock_in', {'employee_id': id, 'time': clock_in})
+                           for id, clock_in in clock_ins.items() if self._punched.get(id, 0) <= since]
+                self._punched = {id: event_id for id, event_id in self._punched.items() if event_id > since}
+                if events:
+                    self.publish(events)
+        finally:
+            self._sync_lock.release()
+
+    def events_after(self, last_id):
+        """Events newer than `last_id`, or None if some of them have already left the history."""
+        with self._cond:
+            return self._events_after(last_id)
+
+    def wait(self, last_id, timeout):
+        """Block until there are events newer than `last_id` or `timeout` seconds pass; [] on timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._last_id > last_id, timeout=timeout)
+            return self._events_after(last_id)
+
+    def _events_after(self, last_id):
+        if last_id >= self._last_id:
+            return []
+        if not self._events or self._events[0][0] > last_id + 1:
+            return None
+        return [entry for entry in self._events if entry[0] > last_id]
+
+def attendance_snapshot(employee_id=None):
+    """Current status of every active employee (or just one), as sent when a stream starts."""
+    query = db.session.query(Employee.id, Employee.first_name, Employee.last_name, OpenShift.clock_in_time).outerjoin(
+        OpenShift, OpenShift.employee_id == Employee.id
+    ).filter(Employee.is_active == True)
+    if employee_id is not None:
+        query = query.filter(Employee.id == employee_id)
+    return {'employees': [
+        {'employee_id': id, 'employee_name': f'{first_name} {last_name}', 'clocked_in': clock_in is not None,
+         'clock_in_time': clock_in.isoformat() if clock_in else None}
+        for id, first_name, last_name, clock_in in query.order_by(Employee.id)
+    ]}
+
+def open_shift_times():
+    return {employee_id: clock_in.isoformat()
+            for employee_id, clock_in in db.session.query(OpenShift.employee_id, OpenShift.clock_in_time)}
+
+def last_clock_out_times(employee_ids):
+    rows = db.session.query(Attendance.employee_id, db.func.max(Attendance.clock_out_time)).filter(
+        Attendance.employee_id.in_(employee_ids)
+    ).group_by(Attendance.employee_id)
+    return {employee_id: clock_out.isoformat() for employee_id, clock_out in rows if clock_out}
+
+def format_event(event_id, name, data):
+    return f'id: {event_id}\nevent: {name}\ndata: {json.dumps(data)}\n\n'
+
+def event_stream(hub, load_snapshot, last_id, keepalive, snapshot=None, employee_id=None, sync=None):
+    """Yield `snapshot` if given, then every delta after event `last_id` as SSE messages, forever.
+
+    The snapshot must have been loaded after `last_id` was read so no delta falls between the two; deltas the
+    snapshot already reflects are harmless to apply twice. A client that falls too far behind is sent a fresh
+    snapshot from `load_snapshot()`, and an idle stream gets a comment every `keepalive` seconds so proxies
+    keep it open. While waiting the stream calls `sync()` whenever the hub is due to look for other processes'
+    punches.
+    """
+    yield 'retry: 3000\n\n'
+    if snapshot is not None:
+        yield format_event(hub.event_id(last_id), 'snapshot', snapshot)
+    timeout = min(keepalive, hub.resync) if hub.resync else keepalive
+    idle_since = time.monotonic()
+    while True:
+        if sync is not None and hub.sync_due():
+            sync()
+        events = hub.wait(last_id, timeout)
+        if events is None:
+            last_id = hub.last_id
+            yield format_event(hub.event_id(last_id), 'snapshot', load_snapshot())
+            idle_since = time.monotonic()
+            continue
+        if not events:
+            if time.monotonic() - idle_since >= keepalive:
+                yield ': keepalive\n\n'
+                idle_since = time.monotonic()
+            continue
+        idle_since = time.monotonic()
+        chunk = []
+        for event_id, name, data in events:
+            if employee_id is None or data['employee_id'] == employee_id:
+                chunk.append(format_event(hub.event_id(event_id), name, data))
+            last_id = event_id
+        if chunk:
+            yield ''.join(chunk)
+
+def _track_punches(session, flush_context, instances):
+    punches = session.info.setdefault('attendance_punches', [])
+    for obj in session.new:
+        if isinstance(obj, OpenShift):
+            punches.append(('clock_in', {'employee_id': obj.employee_id, 'time': obj.clock_in_time.isoformat()}))
+    for obj in session.deleted:
+        if isinstance(obj, OpenShift):
+            clock_out = obj.attendance.clock_out_time or datetime.utcnow()
+            punches.append(('clock_out', {'employee_id': obj.employee_id, 'time': clock_out.isoformat()}))
+
+def _publish_on_commit(session):
+    punches = session.info.pop('attendance_punches', None)
+    if punches and has_app_context() and 'attendance_hub' in current_app.extensions:
+        current_app.extensions['attendance_hub'].publish(punches)
+
+def _forget_punches(session):
+    session.info.pop('attendance_punches', None)
+
+def init_attendance_stream(app):
+    app.extensions['attendance_hub'] = AttendanceHub(app.config['ATTENDANCE_STREAM_HISTORY'],
+                                                         app.config['ATTENDANCE_STREAM_RESYNC'])
+    if not event.contains(Session, 'before_flush', _track_punches):
+        event.listen(Session, 'before_flush', _track_punches)
+        event.listen(Session, 'after_commit', _publish_on_commit)
+        event.listen(Session, 'after_rollback', _forget_punches)
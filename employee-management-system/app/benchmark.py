@@ -0,0 +1,122 @@
+import json
+import platform
+import resource
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event
+from app import db
+from app.models import BillingJob, BillingRecord, CalendarEvent, Employee, Message, Project, User
+
+# GET endpoints the driver leaves out: logging out would end the session, streams never finish
+SKIP_ENDPOINTS = {'static', 'main.logout', 'main.attendance_stream'}
+
+# Where to find a real id for each URL parameter
+PARAM_SOURCES = {
+    'employee_id': lambda: db.session.query(db.func.min(Employee.id)).scalar(),
+    'project_id': lambda: db.session.query(db.func.min(Project.id)).scalar(),
+    'event_id': lambda: db.session.query(db.func.min(CalendarEvent.id)).scalar(),
+    'record_id': lambda: db.session.query(db.func.min(BillingRecord.id)).scalar(),
+    'job_id': lambda: db.session.query(db.func.max(BillingJob.id)).scalar(),
+    'message_id': lambda: db.session.query(db.func.min(Message.id)).filter(Message.attachment_id.isnot(None)).scalar(),
+}
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def peak_rss_kb():
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if platform.system() == 'Darwin' else rss
+
+def benchmark_targets(app):
+    """(endpoint, url) for every GET route, with URL parameters filled from existing rows.
+
+    Write routes are not driven so that repeated runs see the same data; routes whose parameters have no row
+    to point at are returned with url None.
+    """
+    params = {name: source() for name, source in PARAM_SOURCES.items()}
+    targets = []
+    with app.test_request_context():
+        from flask import url_for
+        for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+            if 'GET' not in rule.methods or rule.endpoint in SKIP_ENDPOINTS:
+                continue
+            values = {name: params.get(name) for name in rule.arguments}
+            url = None if None in values.values() else url_for(rule.endpoint, **values)
+            targets.append((rule.endpoint, url))
+    return targets
+
+def run_benchmark(app, username, password, iterations=20, label=None):
+    """Request every GET route `iterations` times through the test client and summarise latency and queries per
+    request per route, and the process's peak RSS over the run (the kernel only tracks a process-wide peak). Runs on its own thread so each request gets a fresh app context and session, as
+    under a real server."""
+    if User.query.filter_by(username=username).first() is None:
+        user = User(username=username)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+    targets = benchmark_targets(app)
+    results = {'label': label, 'timestamp': datetime.utcnow().isoformat(), 'iterations': iterations,
+               'database': db.engine.dialect.name, 'python': platform.python_version(), 'routes': {}, 'skipped': []}
+
+    queries = [0]
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        queries[0] += 1
+
+    def drive():
+        client = app.test_client()
+        login = client.post('/admin/login', data={'username': username, 'password': password})
+        if login.status_code != 302:
+            raise RuntimeError(f'Could not log in as {username}.')
+        for endpoint, url in targets:
+            if url is None:
+                results['skipped'].append(endpoint)
+                continue
+            client.get(url).close() # Warm caches and templates before timing
+            latencies, counts, statuses = [], [], set()
+            for _ in range(iterations):
+                queries[0] = 0
+                started = time.perf_counter()
+                response = client.get(url)
+                response.get_data()
+                latencies.append(time.perf_counter() - started)
+                response.close()
+                counts.append(queries[0])
+                statuses.add(response.status_code)
+            results['routes'][endpoint] = {
+                'url': url,
+                'status': sorted(statuses),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+                'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+                'queries_per_request': round(sum(counts) / len(counts), 2),
+                'max_queries': max(counts),
+            }
+
+    errors = []
+
+    def guarded():
+        try:
+            drive()
+        except Exception as e: # Surface failures from the driver thread in the caller
+            errors.append(e)
+
+    event.listen(db.engine, 'before_cursor_execute', count_query)
+    try:
+        thread = threading.Thread(target=guarded, name='benchmark-driver')
+        thread.start()
+        thread.join()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_query)
+    if errors:
+        raise errors[0]
+    results['peak_rss_kb'] = peak_rss_kb()
+    return results
+
+def write_results(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
@@ -0,0 +1,281 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from app import db
+from app.models import BillingAdjustment, BillingJob, BillingRate, BillingRecord, BillingWatermark, Project, WorkReport
+
+def _in_effect(rate):
+    return db.and_(
+        rate.effective_from <= WorkReport.date,
+        db.or_(rate.effective_to == None, rate.effective_to >= WorkReport.date)
+    )
+
+def set_rate(project_id, employee_id, rate, effective_from, effective_to=None):
+    """Add a billing rate, closing an open-ended earlier rate; any other overlap raises ValueError."""
+    if effective_to and effective_to < effective_from:
+        raise ValueError('Rate end date cannot be before its start date.')
+    query = BillingRate.query.filter(
+        BillingRate.project_id == project_id,
+        BillingRate.employee_id == employee_id,
+        db.or_(BillingRate.effective_to == None, BillingRate.effective_to >= effective_from)
+    )
+    if effective_to:
+        query = query.filter(BillingRate.effective_from <= effective_to)
+    for existing in query:
+        if existing.effective_to is None and existing.effective_from < effective_from:
+            existing.effective_to = effective_from - timedelta(days=1)
+        else:
+            raise ValueError(f'Rate overlaps an existing rate starting {existing.effective_from}.')
+    billing_rate = BillingRate(project_id=project_id, employee_id=employee_id, rate=rate,
+                               effective_from=effective_from, effective_to=effective_to)
+    db.session.add(billing_rate)
+    return billing_rate
+
+def _adjust_record(session, record_id, hours, units, amount, reason):
+    """Add to a billing record in SQL and log the change as a BillingAdjustment.
+
+    Hours or units the record doesn't bill (NULL) stay NULL.
+    """
+    table = BillingRecord.__table__
+    session.connection().execute(table.update().where(table.c.id == record_id).values(
+        hours_billed=table.c.hours_billed + hours,
+        units_billed=table.c.units_billed + units,
+        amount=table.c.amount + amount
+    ))
+    session.add(BillingAdjustment(billing_record_id=record_id, adjustment_amount=amount, reason=reason))
+
+def generate_billing_records(project, start_date, end_date):
+    """Bill the project's work reports for a period, returning how many billing records were created or adjusted.
+
+    Reports are picked by billing state: never billed, billed to another record, or with hours, units or priced
+    amount different from what they were billed as. Their change is aggregated per employee, added to the
+    employee's existing record as a BillingAdjustment, or inserted as a new record, and exactly the reports read
+    are stamped with the values they were billed at, so one edited meanwhile is picked up next time. Reports
+    billed here that have moved to another project or period are credited back. Rerunning with no changes does
+    nothing.
+    """
+    if project.billing_method == 'Hourly':
+        quantity = WorkReport.hours_worked
+        default_rate = current_app.config['BILLING_DEFAULT_HOURLY_RATE']
+    elif project.billing_method == 'Count-Based':
+        quantity = WorkReport.units_completed
+        default_rate = current_app.config['BILLING_DEFAULT_UNIT_RATE']
+    else:
+        raise ValueError(f'Unsupported billing method: {project.billing_method}')
+
+    period = [BillingRecord.project_id == project.id, BillingRecord.start_date == start_date,
+              BillingRecord.end_date == end_date]
+    in_period = [WorkReport.project_id == project.id, WorkReport.date >= start_date, WorkReport.date <= end_date]
+    watermark = BillingWatermark.query.filter_by(project_id=project.id, start_date=start_date,
+                                                 end_date=end_date).first()
+    records = dict(db.session.query(BillingRecord.employee_id, BillingRecord.id).filter(*period))
+
+    # An employee-specific rate wins over the project default in effect on the same date
+    employee_rate = aliased(BillingRate)
+    project_rate = aliased(BillingRate)
+    amount = db.func.coalesce(quantity, 0) * db.func.coalesce(employee_rate.rate, project_rate.rate, default_rate)
+    record_id = db.select(BillingRecord.id).where(*period, BillingRecord.employee_id == WorkReport.employee_id)
+    # Locked until commit, so an edit waits rather than slipping between reading and stamping
+    query = db.session.query(
+        WorkReport.id, WorkReport.employee_id, WorkReport.billing_record_id, WorkReport.hours_worked,
+        WorkReport.units_completed, amount, WorkReport.billed_hours, WorkReport.billed_units, WorkReport.billed_amount,
+        WorkReport.modified_date
+    ).outerjoin(employee_rate, db.and_(
+        employee_rate.project_id == WorkReport.project_id,
+        employee_rate.employee_id == WorkReport.employee_id,
+        _in_effect(employee_rate)
+    )).outerjoin(project_rate, db.and_(
+        project_rate.project_id == WorkReport.project_id,
+        project_rate.employee_id == None,
+        _in_effect(project_rate)
+    )).filter(*in_period, db.or_(
+        WorkReport.billing_record_id == None,
+        WorkReport.billing_record_id != db.func.coalesce(record_id.scalar_subquery(), 0),
+        WorkReport.billed_hours.is_distinct_from(WorkReport.hours_worked),
+        WorkReport.billed_units.is_distinct_from(WorkReport.units_completed),
+        WorkReport.billed_amount.is_distinct_from(amount)
+    )).with_for_update(of=WorkReport)
+    if not watermark:
+        # Periods billed before billing state was tracked: keep those records as they are
+        query = query.filter(~record_id.exists())
+    rows = query.all()
+    moved = db.session.query(
+        WorkReport.id, WorkReport.billing_record_id, WorkReport.billed_hours, WorkReport.billed_units,
+        WorkReport.billed_amount
+    ).join(BillingRecord, BillingRecord.id == WorkReport.billing_record_id).filter(
+        *period, ~db.and_(*in_period)
+    ).with_for_update(of=WorkReport).all()
+    if not rows and not moved:
+        return 0
+
+    def add(totals, key, values, sign=1):
+        totals[key] = [total + sign * (value or 0) for total, value in zip(totals.get(key, (0, 0, 0)), values)]
+
+    # (hours, units, amount) to bill per employee, and to add to existing records
+    billed, changes, stamps = {}, {}, []
+    for (report_id, employee_id, billed_to, hours, units, report_amount,
+         billed_hours, billed_units, billed_amount, modified) in rows:
+        add(billed, employee_id, (hours, units, report_amount))
+        if billed_to is not None and billed_to != records.get(employee_id):
+            # Billed to another employee, project or period before it moved here
+            add(changes, billed_to, (billed_hours, billed_units, billed_amount), -1)
+        else:
+            add(billed, employee_id, (billed_hours, billed_units, billed_amount), -1)
+        stamps.append({'report_id': report_id, 'employee': employee_id, 'hours': hours, 'units': units,
+                       'amount': report_amount})
+    for report_id, billed_to, billed_hours, billed_units, billed_amount in moved:
+        add(changes, billed_to, (billed_hours, billed_units, billed_amount), -1)
+
+    new_records = []
+    for employee_id, (hours, units, amount_due) in billed.items():
+        if employee_id in records:
+            add(changes, records[employee_id], (hours, units, amount_due))
+        else:
+            new_records.append({
+                'project_id': project.id,
+                'employee_id': employee_id,
+                'start_date': start_date,
+                'end_date': end_date,
+                'hours_billed': hours if project.billing_method == 'Hourly' else None,
+                'units_billed': units if project.billing_method == 'Count-Based' else None,
+                'amount': amount_due,
+            })
+    adjusted = 0
+    for billed_to, (hours, units, amount_due) in changes.items():
+        if hours or units or amount_due:
+            _adjust_record(db.session, billed_to, hours, units, amount_due, 'Late or changed work reports')
+            adjusted += 1
+    if new_records:
+        db.session.execute(db.insert(BillingRecord), new_records)
+
+    # Stamp what each report was billed as, without touching modified_date
+    table = WorkReport.__table__
+    if stamps:
+        target = db.select(BillingRecord.id).where(*period, BillingRecord.employee_id == db.bindparam('employee'))
+        db.session.execute(table.update().where(table.c.id == db.bindparam('report_id')).values(
+            billing_record_id=target.scalar_subquery(),
+            billed_hours=db.bindparam('hours'),
+            billed_units=db.bindparam('units'),
+            billed_amount=db.bindparam('amount'),
+            modified_date=table.c.modified_date
+        ), stamps)
+    if moved:
+        db.session.execute(table.update().where(table.c.id.in_([row[0] for row in moved])).values(
+            billing_record_id=None, billed_hours=None, billed_units=None, billed_amount=None,
+            modified_date=table.c.modified_date
+        ))
+
+    newest = max((row[-1] for row in rows), default=None)
+    if watermark:
+        watermark.last_modified = max(watermark.last_modified, newest or watermark.last_modified)
+    else:
+        db.session.add(BillingWatermark(project_id=project.id, start_date=start_date, end_date=end_date,
+                                        last_modified=newest or datetime.utcnow()))
+    return len(new_records) + adjusted
+
+def _credit_deleted_reports(session, flush_context, instances):
+    for report in session.deleted:
+        if isinstance(report, WorkReport) and report.billing_record_id is not None:
+            _adjust_record(session, report.billing_record_id, -(report.billed_hours or 0),
+                           -(report.billed_units or 0), -(report.billed_amount or 0), 'Work report deleted')
+
+def init_billing(app):
+    if not event.contains(Session, 'before_flush', _credit_deleted_reports):
+        event.listen(Session, 'before_flush', _credit_deleted_reports)
+
+def start_billing_job(start_date, end_date):
+    """Bill every active project for the period on a background thread; a job already running for it is reused.
+
+    Pending or Running jobs older than BILLING_JOB_TIMEOUT seconds are taken to have died with their worker
+    (a restart, say) and are marked Failed so the period can be billed again. Two requests racing past the
+    lookup both try to claim the period's active_period; the loser rolls back and gets the winner's job.
+    """
+    now = datetime.utcnow()
+    BillingJob.query.filter(
+        BillingJob.start_date == start_date,
+        BillingJob.end_date == end_date,
+        BillingJob.status.in_(['Pending', 'Running']),
+        BillingJob.created_date < now - timedelta(seconds=current_app.config['BILLING_JOB_TIMEOUT'])
+    ).update({BillingJob.status: 'Failed', BillingJob.error: 'Abandoned: the job did not finish in time',
+              BillingJob.finished_date: now, BillingJob.active_period: None}, synchronize_session=False)
+    job = _active_job(start_date, end_date)
+    if job:
+        return job
+    job = BillingJob(start_date=start_date, end_date=end_date, status='Pending',
+                     active_period=f'{start_date.isoformat()}/{end_date.isoformat()}')
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # If the other job has already finished, the period is free to claim again
+        return _active_job(start_date, end_date) or start_billing_job(start_date, end_date)
+    app = current_app._get_current_object()
+    threading.Thread(target=run_billing_job, args=(app, job.id), name=f'billing-job-{job.id}', daemon=True).start()
+    return job
+
+def _active_job(start_date, end_date):
+    return BillingJob.query.filter(
+        BillingJob.start_date == start_date,
+        BillingJob.end_date == end_date,
+        BillingJob.status.in_(['Pending', 'Running'])
+    ).first()
+
+def run_billing_job(app, job_id):
+    with app.app_context():
+        try:
+            return _run_billing_job(app, job_id)
+        except Exception as e:
+            # A job left Running would be handed back by start_billing_job until it timed out
+            app.logger.exception('Billing job %s failed', job_id)
+            db.session.rollback()
+            BillingJob.query.filter_by(id=job_id).update({
+                BillingJob.status: 'Failed', BillingJob.error: f'{type(e).__name__}: {e}',
+                BillingJob.finished_date: datetime.utcnow(), BillingJob.active_period: None
+            })
+            db.session.commit()
+            return 'Failed'
+
+def _run_billing_job(app, job_id):
+    job = db.session.get(BillingJob, job_id)
+    project_ids = [project_id for (project_id,) in db.session.query(Project.id).filter_by(is_active=True)]
+    job.status = 'Running'
+    job.total_projects = len(project_ids)
+    db.session.commit()
+
+    start_date, end_date = job.start_date, job.end_date
+    with ThreadPoolExecutor(max_workers=app.config['BILLING_JOB_WORKERS']) as pool:
+        errors = [error for error in pool.map(
+            lambda project_id: _bill_project(app, job_id, project_id, start_date, end_date), project_ids
+        ) if error]
+
+    db.session.refresh(job)
+    job.status = 'Failed' if errors else 'Completed'
+    job.error = '\n'.join(errors) or None
+    job.finished_date = datetime.utcnow()
+    job.active_period = None
+    db.session.commit()
+    return job.status
+
+def _bill_project(app, job_id, project_id, start_date, end_date):
+    # Each worker runs in its own app context, and so its own session and connection
+    with app.app_context():
+        try:
+            count = generate_billing_records(db.session.get(Project, project_id), start_date, end_date)
+            BillingJob.query.filter_by(id=job_id).update({
+                BillingJob.completed_projects: BillingJob.completed_projects + 1,
+                BillingJob.records_created: BillingJob.records_created + count,
+            })
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            BillingJob.query.filter_by(id=job_id).update({
+                BillingJob.completed_projects: BillingJob.completed_projects + 1,
+                BillingJob.failed_projects: BillingJob.failed_projects + 1,
+            })
+            db.session.commit()
+            return f'Project {project_id}: {e}'
@@ -0,0 +1,89 @@
+import calendar
+from collections import namedtuple
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import or_
+from app.models import CalendarEvent
+
+RECURRENCES = ('daily', 'weekly', 'monthly', 'yearly')
+
+# One concrete instance of an event inside a window; for one-off events start/end equal the event's own
+Occurrence = namedtuple('Occurrence', ['event', 'start_date', 'end_date'])
+
+def validate_event(event):
+    if event.end_date < event.start_date:
+        raise ValueError('End date cannot be before start date.')
+    max_days = current_app.config['CALENDAR_MAX_EVENT_DAYS']
+    if event.end_date - event.start_date > timedelta(days=max_days):
+        raise ValueError(f'Events cannot span more than {max_days} days.')
+    if event.recurrence is not None:
+        if event.recurrence not in RECURRENCES:
+            raise ValueError('Unknown recurrence.')
+        if not event.recurrence_interval or event.recurrence_interval < 1:
+            raise ValueError('Recurrence interval must be at least 1.')
+        if event.recurrence_until is not None and event.recurrence_until < event.start_date:
+            raise ValueError('Repeat-until date cannot be before the first occurrence.')
+
+def _add_months(moment, months):
+    month_index = moment.month - 1 + months
+    year, month = moment.year + month_index // 12, month_index % 12 + 1
+    # Clamp to the end of shorter months, so Jan 31 repeats on Feb 28/29
+    return moment.replace(year=year, month=month, day=min(moment.day, calendar.monthrange(year, month)[1]))
+
+def occurrences(event, window_start, window_end):
+    """Yield the occurrences of event that overlap [window_start, window_end], without walking
+    the repetitions before the window."""
+    duration = event.end_date - event.start_date
+    if event.recurrence is None:
+        if event.start_date <= window_end and event.end_date >= window_start:
+            yield Occurrence(event, event.start_date, event.end_date)
+        return
+
+    # Earliest start whose occurrence can still reach into the window
+    earliest = window_start - duration
+    until = event.recurrence_until
+    if event.recurrence in ('daily', 'weekly'):
+        step = timedelta(days=event.recurrence_interval * (7 if event.recurrence == 'weekly' else 1))
+        n = max(0, -((event.start_date - earliest) // step))
+        nth = lambda n: event.start_date + n * step
+    else:
+        months = event.recurrence_interval * (12 if event.recurrence == 'yearly' else 1)
+        elapsed = (earliest.year - event.start_date.year) * 12 + earliest.month - event.start_date.month
+        n = max(0, elapsed // months - 1)
+        nth = lambda n: _add_months(event.start_date, n * months)
+        while nth(n) < earliest:
+            n += 1
+
+    start = nth(n)
+    while start <= window_end and (until is None or start <= until):
+        yield Occurrence(event, start, start + duration)
+        n += 1
+        start = nth(n)
+
+def events_in_window(window_start, window_end, event_types=None):
+    """All occurrences overlapping the window, ordered by start.
+
+    One-off events are fetched with a bounded range on ix_calendar_event_start_end: an event cannot start
+    more than CALENDAR_MAX_EVENT_DAYS before the window and still overlap it. Recurring events are stored
+    as a single rule row and expanded here. event_types optionally restricts the event types returned.
+    """
+    max_span = timedelta(days=current_app.config['CALENDAR_MAX_EVENT_DAYS'])
+    one_off = CalendarEvent.query.filter(
+        CalendarEvent.start_date >= window_start - max_span,
+        CalendarEvent.start_date <= window_end,
+        CalendarEvent.end_date >= window_start,
+        CalendarEvent.recurrence.is_(None)
+    )
+    rules = CalendarEvent.query.filter(
+        CalendarEvent.recurrence.isnot(None),
+        CalendarEvent.start_date <= window_end,
+        or_(CalendarEvent.recurrence_until.is_(None), CalendarEvent.recurrence_until >= window_start - max_span)
+    )
+    if event_types:
+        one_off = one_off.filter(CalendarEvent.event_type.in_(event_types))
+        rules = rules.filter(CalendarEvent.event_type.in_(event_types))
+    found = [Occurrence(event, event.start_date, event.end_date) for event in one_off]
+    for rule in rules:
+        found.extend(occurrences(rule, window_start, window_end))
+    found.sort(key=lambda occurrence: (occurrence.start_date, occurrence.event.id))
+    return found
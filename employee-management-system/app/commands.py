@@ -0,0 +1,179 @@
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from app import db
+from app.models import Attendance, BillingJob, OpenShift, Project
+from app.billing import generate_billing_records, run_billing_job
+from app.imports import import_work_reports
+from app.archive import archive_attendance
+from app.search import rebuild_search_indexes
+from app.rollups import rebuild_rollup
+from app.passwords import PasswordCheckBusy, password_policy
+from app.benchmark import percentile, run_benchmark, write_results
+from app.seed import seed_database
+
+attendance_cli = AppGroup('attendance', help='Attendance maintenance commands.')
+billing_cli = AppGroup('billing', help='Billing commands.')
+import_cli = AppGroup('import', help='Bulk data import commands.')
+reports_cli = AppGroup('reports', help='Work report maintenance commands.')
+auth_cli = AppGroup('auth', help='Authentication commands.')
+bench_cli = AppGroup('bench', help='Benchmark commands.')
+search_cli = AppGroup('search', help='Full-text search commands.')
+
+@attendance_cli.command('sync-open-shifts')
+def sync_open_shifts():
+    """Rebuild the open shift table from attendance rows with no clock-out."""
+    OpenShift.query.delete()
+    # Keep only the latest open row per employee, matching what clock_out would close
+    latest = db.session.query(
+        Attendance.employee_id, db.func.max(Attendance.clock_in_time).label('clock_in_time')
+    ).filter(Attendance.clock_out_time == None).group_by(Attendance.employee_id).subquery()
+    rows = db.session.query(Attendance).join(
+        latest,
+        (Attendance.employee_id == latest.c.employee_id) & (Attendance.clock_in_time == latest.c.clock_in_time)
+    ).filter(Attendance.clock_out_time == None).all()
+    seen = set()
+    for attendance in rows:
+        if attendance.employee_id in seen:
+            continue
+        seen.add(attendance.employee_id)
+        db.session.add(OpenShift(employee_id=attendance.employee_id, attendance_id=attendance.id, clock_in_time=attendance.clock_in_time))
+    db.session.commit()
+    click.echo(f'{len(seen)} open shifts restored.')
+
+@attendance_cli.command('archive')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Archive shifts from months before the one containing this date.')
+@click.option('--months', type=int, default=None, help='Months kept in attendance (default ATTENDANCE_ARCHIVE_MONTHS).')
+def archive_attendance_command(before, months):
+    """Move closed shifts older than the retention horizon into the attendance archive."""
+    if before is None:
+        months = current_app.config['ATTENDANCE_ARCHIVE_MONTHS'] if months is None else months
+        today = datetime.utcnow()
+        year, month = divmod(today.year * 12 + today.month - 1 - months, 12)
+        before = datetime(year, month + 1, 1)
+    moved = archive_attendance(before, echo=click.echo)
+    click.echo(f'{moved} shifts archived from before {before:%Y-%m}.')
+
+@billing_cli.command('generate')
+@click.option('--project-id', type=int, required=True)
+@click.option('--start', 'start_date', type=click.DateTime(formats=['%Y-%m-%d']), required=True)
+@click.option('--end', 'end_date', type=click.DateTime(formats=['%Y-%m-%d']), required=True)
+def generate_billing(project_id, start_date, end_date):
+    """Generate billing records for one project and period."""
+    project = db.session.get(Project, project_id)
+    if not project:
+        raise click.ClickException(f'Project {project_id} not found.')
+    try:
+        count = generate_billing_records(project, start_date.date(), end_date.date())
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    click.echo(f'{count} billing records generated for {project.name}.')
+
+@billing_cli.command('generate-all')
+@click.option('--start', 'start_date', type=click.DateTime(formats=['%Y-%m-%d']), required=True)
+@click.option('--end', 'end_date', type=click.DateTime(formats=['%Y-%m-%d']), required=True)
+def generate_all_billing(start_date, end_date):
+    """Bill every active project for a period using the billing job worker pool."""
+    job = BillingJob(start_date=start_date.date(), end_date=end_date.date(), status='Pending')
+    db.session.add(job)
+    db.session.commit()
+    status = run_billing_job(current_app._get_current_object(), job.id)
+    db.session.refresh(job)
+    click.echo(f'Billing job #{job.id} {status.lower()}: {job.records_created} records for {job.completed_projects} projects.')
+    if job.error:
+        raise click.ClickException(job.error)
+
+@import_cli.command('work-reports')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_work_reports_command(path):
+    """Import work reports from a CSV file."""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        try:
+            result = import_work_reports(f)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    for line, message in result.errors:
+        click.echo(f'Line {line}: {message}', err=True)
+    click.echo(f'Imported {result.imported} work reports, rejected {result.rejected} rows.')
+
+@reports_cli.command('rebuild-rollup')
+def rebuild_rollup_command():
+    """Recompute the daily work report rollup from scratch."""
+    count = rebuild_rollup()
+    db.session.commit()
+    click.echo(f'{count} rollup rows rebuilt.')
+
+@search_cli.command('rebuild')
+def rebuild_search_command():
+    """Reindex all work report descriptions and messages for full-text search."""
+    rebuild_search_indexes(db.session.connection())
+    db.session.commit()
+    click.echo('Search indexes rebuilt.')
+
+@auth_cli.command('bench-login')
+@click.option('--concurrency', default=16, show_default=True, help='Simultaneous logins.')
+@click.option('--logins', default=200, show_default=True, help='Password checks per mode.')
+def bench_login(concurrency, logins):
+    """Time password verification under concurrent logins, inline and through the bounded pool."""
+    policy = password_policy()
+    password_hash = policy.hash('benchmark-password')
+    click.echo(f'Policy {policy.prefix} with {current_app.config["PASSWORD_VERIFY_WORKERS"]} verify workers, '
+               f'{concurrency} concurrent logins')
+
+    for mode, check in (('inline', policy.verify), ('pooled', policy.verify_pooled)):
+        busy = []
+
+        def login(_):
+            started = time.perf_counter()
+            try:
+                check(password_hash, 'benchmark-password')
+            except PasswordCheckBusy:
+                busy.append(1)
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as clients:
+            latencies = list(clients.map(login, range(logins)))
+        elapsed = time.perf_counter() - started
+        click.echo(f'{mode}: {logins / elapsed:.1f} logins/s, '
+                   f'p50 {percentile(latencies, 0.5) * 1000:.1f} ms, p95 {percentile(latencies, 0.95) * 1000:.1f} ms, '
+                   f'p99 {percentile(latencies, 0.99) * 1000:.1f} ms, rejected busy {len(busy)}')
+
+@click.command('seed')
+@click.option('--employees', default=100, show_default=True, help='Employees to create.')
+@click.option('--years', default=1, show_default=True, help='Years of history to generate.')
+@click.option('--projects', type=int, help='Projects to create (default: one per 50 employees, at least 5).')
+@click.option('--seed', 'random_seed', default=42, show_default=True, help='Random seed, for repeatable datasets.')
+@with_appcontext
+def seed_command(employees, years, projects, random_seed):
+    """Fill an empty database with synthetic data for benchmarking."""
+    started = time.perf_counter()
+    try:
+        counts = seed_database(employees, years, projects, random_seed, echo=click.echo)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for table, count in sorted(counts.items()):
+        click.echo(f'{table}: {count}')
+    click.echo(f'Seeded in {time.perf_counter() - started:.1f}s.')
+
+@bench_cli.command('routes')
+@click.option('--iterations', default=20, show_default=True, help='Timed requests per route.')
+@click.option('--output', default='bench_results.json', show_default=True, type=click.Path(dir_okay=False))
+@click.option('--label', help='Name for this run, such as a git commit, stored in the results.')
+@click.option('--username', default='benchmark', show_default=True, help='Admin to log in as; created if missing.')
+@click.option('--password', default='benchmark', show_default=True)
+def bench_routes(iterations, output, label, username, password):
+    """Time every GET route and write p50/p95/p99 latency, queries per request and peak RSS as JSON."""
+    results = run_benchmark(current_app._get_current_object(), username, password, iterations, label)
+    write_results(results, output)
+    for endpoint, route in sorted(results['routes'].items()):
+        click.echo(f'{endpoint}: p50 {route["p50_ms"]} ms, p95 {route["p95_ms"]} ms, p99 {route["p99_ms"]} ms, '
+                   f'{route["queries_per_request"]} queries, status {route["status"]}')
+    if results['skipped']:
+        click.echo(f'Skipped (no rows to address): {", ".join(results["skipped"])}')
+    click.echo(f'Peak RSS {results["peak_rss_kb"]} KB. Results written to {output}.')
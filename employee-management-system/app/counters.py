@@ -0,0 +1,84 @@
+import threading
+import time
+from datetime import datetime, time as day_start, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import Attendance, Employee, LeaveRequest, OpenShift, Project
+
+# Which models' writes make each dashboard counter stale
+COUNTER_MODELS = {
+    'total_active_employees': (Employee,),
+    'pending_leave_requests': (LeaveRequest,),
+    'active_projects': (Project,),
+    'clocked_in_today': (Attendance, OpenShift),
+}
+
+class CounterCache:
+    """Per-process TTL cache for the dashboard counters, invalidated when a session commits a related write."""
+
+    def __init__(self):
+        self._values = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, name, compute, ttl):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._values.get(name)
+            generation = self._generation
+        if entry and entry[1] > now:
+            return entry[0]
+        value = compute()
+        with self._lock:
+            # Don't cache a value computed while an invalidation was happening
+            if generation == self._generation:
+                self._values[name] = (value, now + ttl)
+        return value
+
+    def invalidate(self, names):
+        with self._lock:
+            self._generation += 1
+            for name in names:
+                self._values.pop(name, None)
+
+def _clocked_in_today():
+    today = datetime.combine(datetime.utcnow().date(), day_start.min)
+    return OpenShift.query.filter(
+        OpenShift.clock_in_time >= today,
+        OpenShift.clock_in_time < today + timedelta(days=1)
+    ).count()
+
+COUNTERS = {
+    'total_active_employees': lambda: Employee.query.filter_by(is_active=True).count(),
+    'pending_leave_requests': lambda: LeaveRequest.query.filter_by(status='Pending').count(),
+    'active_projects': lambda: Project.query.filter_by(is_active=True).count(),
+    'clocked_in_today': _clocked_in_today,
+}
+
+def dashboard_counters():
+    ttl = current_app.config['DASHBOARD_CACHE_TTL']
+    cache = current_app.extensions['counter_cache']
+    return {name: cache.get(name, compute, ttl) for name, compute in COUNTERS.items()}
+
+def _track_writes(session, flush_context, instances):
+    touched = session.info.setdefault('touched_models', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        touched.add(type(obj))
+
+def _invalidate_on_commit(session):
+    touched = session.info.pop('touched_models', None)
+    if touched and has_app_context() and 'counter_cache' in current_app.extensions:
+        current_app.extensions['counter_cache'].invalidate([
+            name for name, models in COUNTER_MODELS.items() if any(issubclass(t, models) for t in touched)
+        ])
+
+def _forget_writes(session):
+    session.info.pop('touched_models', None)
+
+def init_dashboard_counters(app):
+    app.extensions['counter_cache'] = CounterCache()
+    if not event.contains(Session, 'before_flush', _track_writes):
+        event.listen(Session, 'before_flush', _track_writes)
+        event.listen(Session, 'after_commit', _invalidate_on_commit)
+        event.listen(Session, 'after_rollback', _forget_writes)
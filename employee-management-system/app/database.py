@@ -0,0 +1,63 @@
+from functools import wraps
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+
+# Bind key of the optional read replica behind REPORTS_DATABASE_URL
+REPLICA_BIND = 'reports'
+
+def engine_options(config, url):
+    """SQLAlchemy engine options for `url` from the DB_* settings.
+
+    SQLite gets none: there is no server to drop idle connections, and recycling the static pool of an
+    in-memory database would discard the database itself.
+    """
+    if str(url).startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'connect_args': {'connect_timeout': config['DB_CONNECT_TIMEOUT']},
+    }
+
+def configure_engines(app):
+    """Fill SQLALCHEMY_ENGINE_OPTIONS and the replica bind from app config; call before db.init_app.
+
+    Options set explicitly in SQLALCHEMY_ENGINE_OPTIONS win over the DB_* settings.
+    """
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {**engine_options(config, config['SQLALCHEMY_DATABASE_URI']),
+                                           **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+    replica_url = config.get('REPORTS_DATABASE_URL')
+    if replica_url:
+        config['SQLALCHEMY_BINDS'] = {**config.get('SQLALCHEMY_BINDS', {}),
+                                      REPLICA_BIND: {'url': replica_url, **engine_options(config, replica_url)}}
+
+    # Cleared when a request starts rather than at teardown, which runs before a streamed export is generated
+    @app.before_request
+    def read_from_primary():
+        g.pop('read_replica', None)
+
+def read_replica(view):
+    """Run a read-only view's GET requests against the read replica when one is configured.
+
+    Place it below @login_required so the logged-in user is still loaded from the primary. Flushes and
+    INSERT/UPDATE/DELETE statements always go to the primary; replica reads may lag behind recent writes.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica bind while a @read_replica view is handling the request."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and has_request_context() and g.get('read_replica')
+                and REPLICA_BIND in self._db.engines and not getattr(clause, 'is_dml', False)):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,151 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Employee, User
+
+def query_words(query):
+    """Lowercase words of a typeahead query; each must prefix some token of a match."""
+    return (query or '').lower().split()[:8]
+
+class PrefixIndex:
+    """Immutable index of lowercase tokens, kept sorted so each prefix is one bisect plus a short scan.
+
+    Records are (id, tokens, private_tokens, payload); private tokens only match when asked for, e.g. emails for
+    logged-in users. A multi-word query scans the word with the fewest matching tokens and keeps the ids
+    whose tokens start with every other word too. `version` is the directory generation the index was built from.
+    """
+
+    def __init__(self, records, version):
+        self.version = version
+        self._keys = []
+        self._tokens = {}
+        self._payloads = {}
+        for id, tokens, private_tokens, payload in records:
+            entries = {(token.lower(), False) for token in tokens if token}
+            entries |= {(token.lower(), True) for token in private_tokens if token}
+            self._tokens[id] = tuple(entries)
+            self._payloads[id] = payload
+            self._keys.extend((token, id, private) for token, private in entries)
+        self._keys.sort()
+        self._by_name = sorted(self._payloads.values(), key=lambda payload: (payload['name'].lower(), payload['id']))
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def search(self, query, limit, include_private=False, accept=None):
+        """Up to `limit` payloads matching every word of `query` by prefix, ordered by the matched token.
+
+        An empty query lists records by name. `accept(payload)` can reject records, e.g. inactive employees.
+        """
+        words = query_words(query)
+        if not words:
+            return [payload for payload in self._by_name if accept is None or accept(payload)][:limit]
+
+        # Every token with the prefix sorts between (word,) and (word + '\uffff',)
+        ranges = {word: (bisect_left(self._keys, (word,)), bisect_left(self._keys, (word + '\uffff',)))
+                  for word in words}
+        first = min(ranges, key=lambda word: ranges[word][1] - ranges[word][0])
+        others = [word for word in words if word != first]
+        results, seen = [], set()
+        position, end = ranges[first]
+        while position < end and len(results) < limit:
+            token, id, private = self._keys[position]
+            position += 1
+            if id in seen or (private and not include_private):
+                continue
+            seen.add(id)
+            tokens = [token for token, private in self._tokens[id] if include_private or not private]
+            if all(any(token.startswith(word) for token in tokens) for word in others):
+                payload = self._payloads[id]
+                if accept is None or accept(payload):
+                    results.append(payload)
+        return results
+
+class DirectoryIndex:
+    """Per-process holder of the PrefixIndex built by `load_records`, rebuilt on the first search after it goes
+    stale. Commits that touch the indexed model make it stale at once; the TTL bounds how long another
+    process's changes can go unnoticed."""
+
+    def __init__(self, load_records, ttl):
+        self.load_records = load_records
+        self.ttl = ttl
+        self._index = None
+        self._expires = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def current(self):
+        index = self._index
+        if index is not None and index.version == self._generation and time.monotonic() < self._expires:
+            return index
+        with self._lock:
+            # Another request may have rebuilt it while this one waited
+            index = self._index
+            if index is None or index.version != self._generation or time.monotonic() >= self._expires:
+                # Rows read while a commit invalidates are tagged with the old generation and rebuilt next time
+                generation = self._generation
+                index = PrefixIndex(self.load_records(), generation)
+                self._index, self._expires = index, time.monotonic() + self.ttl
+        return index
+
+    def invalidate(self):
+        # No lock: a commit shouldn't wait for a rebuild, and one that is running is discarded next time anyway
+        self._generation += 1
+
+def employee_records():
+    # Columns only: materialising every Employee would cost more than building the index
+    rows = db.session.query(Employee.id, Employee.first_name, Employee.last_name, Employee.email, Employee.department,
+                            Employee.is_active)
+    for id, first_name, last_name, email, department, is_active in rows:
+        yield (id, f'{first_name} {last_name} {department}'.split(), [email],
+               {'id': id, 'name': f'{first_name} {last_name}', 'email': email, 'department': department,
+                'is_active': bool(is_active)})
+
+def user_records():
+    for id, username in db.session.query(User.id, User.username):
+        yield id, [username], [], {'id': id, 'name': username}
+
+def search_employees(query, limit, active_only=True, include_email=False):
+    """Employees matching a typeahead query by first or last name, department or (with `include_email`) email."""
+    index = current_app.extensions['directory']['employees'].current()
+    accept = (lambda payload: payload['is_active']) if active_only else None
+    results = index.search(query, limit, include_private=include_email, accept=accept)
+    if not include_email:
+        results = [{key: value for key, value in payload.items() if key != 'email'} for payload in results]
+    return results, index.version
+
+def search_users(query, limit):
+    """Admin users whose username starts with the query."""
+    index = current_app.extensions['directory']['users'].current()
+    return index.search(query, limit), index.version
+
+DIRECTORY_MODELS = {Employee: 'employees', User: 'users'}
+
+def _track_directory(session, flush_context, instances):
+    changed = {DIRECTORY_MODELS[type(obj)] for obj in (*session.new, *session.deleted) if type(obj) in DIRECTORY_MODELS}
+    changed |= {DIRECTORY_MODELS[type(obj)] for obj in session.dirty
+                if type(obj) in DIRECTORY_MODELS and session.is_modified(obj, include_collections=False)}
+    if changed:
+        session.info.setdefault('directory_changes', set()).update(changed)
+
+def _invalidate_on_commit(session):
+    changed = session.info.pop('directory_changes', None)
+    if changed and has_app_context() and 'directory' in current_app.extensions:
+        for name in changed:
+            current_app.extensions['directory'][name].invalidate()
+
+def _forget_directory(session):
+    session.info.pop('directory_changes', None)
+
+def init_directory(app):
+    ttl = app.config['DIRECTORY_INDEX_TTL']
+    app.extensions['directory'] = {'employees': DirectoryIndex(employee_records, ttl),
+                                   'users': DirectoryIndex(user_records, ttl)}
+    if not event.contains(Session, 'before_flush', _track_directory):
+        event.listen(Session, 'before_flush', _track_directory)
+        event.listen(Session, 'after_commit', _invalidate_on_commit)
+        event.listen(Session, 'after_rollback', _forget_directory)
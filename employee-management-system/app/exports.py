@@ -0,0 +1,54 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from flask import Response, abort, current_app, stream_with_context
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def export_response(query, fieldnames, fmt, filename):
+    """Stream a column query as CSV or NDJSON.
+
+    Rows are fetched in EXPORT_BATCH_SIZE chunks from a server-side cursor and written out per chunk, so memory
+    stays flat however many rows match and the first bytes go out before the query has finished.
+    """
+    if fmt not in ('csv', 'ndjson'):
+        abort(400, 'Export format must be csv or ndjson')
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    rows = query.yield_per(batch_size)
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fieldnames)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        for i, row in enumerate(rows, 1):
+            writer.writerow(['' if value is None else value.isoformat() if isinstance(value, (date, datetime)) else value
+                             for value in row])
+            if i % batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def generate_ndjson():
+        chunk = []
+        for row in rows:
+            chunk.append(json.dumps(dict(zip(fieldnames, row)), default=_json_default))
+            if len(chunk) == batch_size:
+                yield '\n'.join(chunk) + '\n'
+                chunk = []
+        if chunk:
+            yield '\n'.join(chunk) + '\n'
+
+    if fmt == 'csv':
+        body, mimetype = generate_csv(), 'text/csv'
+    else:
+        body, mimetype = generate_ndjson(), 'application/x-ndjson'
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'})
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from flask_login import UserMixin, user_logged_out
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import User
+
+class CachedUser(UserMixin):
+    """Detached copy of a User's identity fields, safe to share between requests and threads.
+
+    Views that need the ORM object (to change the password, say) should load it with User.query.get(current_user.id).
+    """
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+
+class IdentityCache:
+    """Per-process LRU of CachedUser by id with a TTL. Commits that touch a User evict it immediately;
+    the TTL bounds how long another process's changes can go unnoticed."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def load(self, user_id, ttl):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+            generation = self._generation
+        user = User.query.get(user_id)
+        if user is None:
+            return None
+        identity = CachedUser(user)
+        with self._lock:
+            # Don't cache a row read while an invalidation was happening
+            if generation == self._generation:
+                self._entries[user_id] = (identity, now + ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+def load_identity(user_id):
+    ttl = current_app.config['LOGIN_CACHE_TTL']
+    if ttl <= 0:
+        return User.query.get(user_id)
+    return current_app.extensions['identity_cache'].load(user_id, ttl)
+
+def _track_users(session, flush_context, instances):
+    user_ids = {obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User)}
+    if user_ids:
+        session.info.setdefault('touched_users', set()).update(user_ids)
+
+def _invalidate_on_commit(session):
+    user_ids = session.info.pop('touched_users', None)
+    if user_ids and has_app_context() and 'identity_cache' in current_app.extensions:
+        current_app.extensions['identity_cache'].invalidate(user_ids)
+
+def _forget_users(session):
+    session.info.pop('touched_users', None)
+
+def _forget_on_logout(app, user):
+    app.extensions['identity_cache'].invalidate([user.id])
+
+def init_identity_cache(app):
+    app.extensions['identity_cache'] = IdentityCache(app.config['LOGIN_CACHE_SIZE'])
+    user_logged_out.connect(_forget_on_logout, app)
+    if not event.contains(Session, 'before_flush', _track_users):
+        event.listen(Session, 'before_flush', _track_users)
+        event.listen(Session, 'after_commit', _invalidate_on_commit)
+        event.listen(Session, 'after_rollback', _forget_users)
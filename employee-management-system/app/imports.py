@@ -0,0 +1,97 @@
+import csv
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models import Employee, Project, WorkReport
+from app.rollups import apply_rollup_deltas, rollup_deltas
+
+WORK_REPORT_COLUMNS = ['employee_email', 'project_name', 'date', 'hours_worked', 'units_completed', 'description']
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.errors = [] # (line number, message), capped at IMPORT_MAX_ERRORS
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < current_app.config['IMPORT_MAX_ERRORS']:
+            self.errors.append((line, message))
+
+def _parse_row(row, employees, projects):
+    employee_id = employees.get((row.get('employee_email') or '').strip().lower())
+    if not employee_id:
+        raise ValueError(f"Unknown employee {row.get('employee_email')!r}")
+    project = projects.get((row.get('project_name') or '').strip())
+    if not project:
+        raise ValueError(f"Unknown project {row.get('project_name')!r}")
+    project_id, billing_method, is_active = project
+    if not is_active:
+        raise ValueError(f"Project {row['project_name']!r} is not active")
+
+    try:
+        report_date = datetime.strptime((row.get('date') or '').strip(), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Invalid date {row.get('date')!r}, expected YYYY-MM-DD")
+    hours_worked = (row.get('hours_worked') or '').strip()
+    units_completed = (row.get('units_completed') or '').strip()
+    if billing_method == 'Hourly' and not hours_worked:
+        raise ValueError('Hours worked is required for hourly projects')
+    if billing_method == 'Count-Based' and not units_completed:
+        raise ValueError('Units completed is required for count-based projects')
+    try:
+        hours_worked = float(hours_worked) if hours_worked else None
+        units_completed = int(units_completed) if units_completed else None
+    except ValueError:
+        raise ValueError('Hours worked and units completed must be numbers')
+
+    return {
+        'employee_id': employee_id,
+        'project_id': project_id,
+        'date': report_date,
+        'hours_worked': hours_worked,
+        'units_completed': units_completed,
+        'description': row.get('description') or None,
+    }
+
+def import_work_reports(lines):
+    """Import work reports from an iterable of CSV lines with a WORK_REPORT_COLUMNS header.
+
+    The file is read one row at a time and valid rows are inserted IMPORT_BATCH_SIZE at a time, each batch in its
+    own transaction. Invalid rows are recorded in the result and skipped.
+    """
+    result = ImportResult()
+    reader = csv.DictReader(lines)
+    missing = set(WORK_REPORT_COLUMNS[:3]) - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+    # One lookup each for the whole file
+    employees = {email.lower(): employee_id for email, employee_id in db.session.query(Employee.email, Employee.id)}
+    projects = {
+        name: (project_id, billing_method, is_active)
+        for name, project_id, billing_method, is_active
+        in db.session.query(Project.name, Project.id, Project.billing_method, Project.is_active)
+    }
+
+    batch_size = current_app.config['IMPORT_BATCH_SIZE']
+    table = WorkReport.__table__
+    batch = []
+    for row in reader:
+        try:
+            batch.append(_parse_row(row, employees, projects))
+        except ValueError as e:
+            result.reject(reader.line_num, str(e))
+            continue
+        if len(batch) == batch_size:
+            db.session.execute(table.insert(), batch)
+            apply_rollup_deltas(rollup_deltas(batch))
+            db.session.commit()
+            result.imported += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+        apply_rollup_deltas(rollup_deltas(batch))
+        db.session.commit()
+        result.imported += len(batch)
+    return result
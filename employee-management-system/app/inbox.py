@@ -0,0 +1,164 @@
+from datetime import datetime
+from sqlalchemy import and_, case, event, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import db
+from app.models import BroadcastTotal, Employee, Mailbox, Message, MessageReceipt, User
+
+# Broadcasts are stored once (recipient_id NULL) and merged into every inbox at read time, so
+# sending one costs a single row however many employees there are. Direct messages count
+# towards the recipient's Mailbox.unread_count; unread broadcasts are the running BroadcastTotal
+# less Mailbox.broadcasts_read, which counts those read, sent by the owner or sent before the
+# account was created (up to broadcasts_seen_id).
+
+def sent_query(owner_id, is_admin):
+    return Message.query.filter(Message.sender_id == owner_id, Message.is_sender_admin == is_admin)
+
+def inbox_query(owner_id, is_admin):
+    # Both branches are ranges of ix_message_recipient_timestamp
+    return Message.query.filter(or_(
+        and_(Message.recipient_id == owner_id, Message.is_recipient_admin == is_admin),
+        Message.recipient_id.is_(None)
+    ))
+
+def readable_by(owner_id, is_admin):
+    # can_read as a filter, for queries that select messages some other way
+    return or_(
+        and_(Message.sender_id == owner_id, Message.is_sender_admin == is_admin),
+        and_(Message.recipient_id == owner_id, Message.is_recipient_admin == is_admin),
+        Message.recipient_id.is_(None)
+    )
+
+def _bump(owner_id, is_admin, **deltas):
+    values = {getattr(Mailbox, name): getattr(Mailbox, name) + delta for name, delta in deltas.items()}
+    if Mailbox.query.filter_by(owner_id=owner_id, is_admin=is_admin).update(values, synchronize_session=False):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(Mailbox(owner_id=owner_id, is_admin=is_admin, **deltas))
+    except IntegrityError:
+        # Created concurrently; apply the update to that row instead
+        Mailbox.query.filter_by(owner_id=owner_id, is_admin=is_admin).update(values, synchronize_session=False)
+
+def _count_broadcast(message_id):
+    last_id = case((BroadcastTotal.last_id < message_id, message_id), else_=BroadcastTotal.last_id)
+    BroadcastTotal.query.filter_by(id=1).update({BroadcastTotal.count: BroadcastTotal.count + 1,
+                                                 BroadcastTotal.last_id: last_id}, synchronize_session=False)
+
+def _mailbox(owner_id, is_admin):
+    # From the identity map when this request has already loaded it
+    return db.session.get(Mailbox, (owner_id, is_admin))
+
+def _own_broadcast(message, owner_id, is_admin):
+    return message.recipient_id is None and (message.sender_id, message.is_sender_admin) == (owner_id, is_admin)
+
+def open_mailboxes(connection, owners):
+    """Create the mailboxes of new accounts, given as (owner_id, is_admin), with earlier broadcasts counted as read.
+
+    A mailbox can already exist when messages were addressed to the id before the account did; it keeps its
+    direct messages but has its broadcasts reset the same way.
+    """
+    table = Mailbox.__table__
+    broadcasts, last_id = connection.execute(
+        db.select(BroadcastTotal.count, BroadcastTotal.last_id).where(BroadcastTotal.id == 1)
+    ).first() or (0, 0)
+    existing = set(connection.execute(db.select(table.c.owner_id, table.c.is_admin).where(or_(*(
+        and_(table.c.owner_id == owner_id, table.c.is_admin == is_admin) for owner_id, is_admin in owners
+    ))))) if owners else set()
+    for owner_id, is_admin in existing:
+        connection.execute(table.update().where(table.c.owner_id == owner_id, table.c.is_admin == is_admin)
+                           .values(broadcasts_read=broadcasts, broadcasts_seen_id=last_id))
+    missing = [{'owner_id': owner_id, 'is_admin': is_admin, 'unread_count': 0, 'broadcasts_read': broadcasts,
+                'broadcasts_seen_id': last_id}
+               for owner_id, is_admin in owners if (owner_id, is_admin) not in existing]
+    if missing:
+        connection.execute(table.insert(), missing)
+
+def send_message(sender_id, is_sender_admin, recipient_id, is_recipient_admin, body, subject=None, attachment=None,
+                 attachment_path=None):
+    """Store a message and count it as unread for a direct recipient, or in the broadcast total. The caller
+    commits."""
+    message = Message(
+        sender_id=sender_id,
+        recipient_id=recipient_id,
+        is_sender_admin=is_sender_admin,
+        is_recipient_admin=is_recipient_admin if recipient_id is not None else None,
+        subject=subject,
+        body=body,
+        attachment=attachment,
+        attachment_path=attachment_path
+    )
+    db.session.add(message)
+    if recipient_id is not None:
+        _bump(recipient_id, is_recipient_admin, unread_count=1)
+    else:
+        # The total records the id, so it is needed now
+        db.session.flush()
+        _count_broadcast(message.id)
+        # Your own broadcasts are never unread
+        _bump(sender_id, is_sender_admin, broadcasts_read=1)
+    return message
+
+def mark_read(message, owner_id, is_admin):
+    """Record that owner has read message. Returns False if it was already read."""
+    if message.recipient_id is not None and (message.recipient_id, message.is_recipient_admin) != (owner_id, is_admin):
+        raise ValueError('This message was not sent to you.')
+    mailbox = _mailbox(owner_id, is_admin)
+    if message.recipient_id is None and mailbox and message.id <= mailbox.broadcasts_seen_id:
+        # Counted as read when the mailbox was opened
+        return False
+    try:
+        with db.session.begin_nested():
+            db.session.add(MessageReceipt(message_id=message.id, reader_id=owner_id, is_reader_admin=is_admin,
+                                          read_at=datetime.utcnow()))
+    except IntegrityError:
+        return False
+    if _own_broadcast(message, owner_id, is_admin):
+        # Counted as read when it was sent
+        pass
+    elif message.recipient_id is None:
+        _bump(owner_id, is_admin, broadcasts_read=1)
+    else:
+        _bump(owner_id, is_admin, unread_count=-1)
+    return True
+
+def can_read(message, owner_id, is_admin):
+    if message.is_sender_admin == is_admin and message.sender_id == owner_id:
+        return True
+    return message.recipient_id is None or (message.recipient_id, message.is_recipient_admin) == (owner_id, is_admin)
+
+def unread_count(owner_id, is_admin):
+    mailbox = _mailbox(owner_id, is_admin)
+    total = db.session.get(BroadcastTotal, 1)
+    broadcasts = total.count if total else 0
+    direct, broadcasts_read = (mailbox.unread_count, mailbox.broadcasts_read) if mailbox else (0, 0)
+    return direct + max(broadcasts - broadcasts_read, 0)
+
+def read_message_ids(messages, owner_id, is_admin):
+    """Which of a page of messages owner has already read, in one query; their own broadcasts and those sent
+    before their account count as read."""
+    ids = [message.id for message in messages]
+    if not ids:
+        return set()
+    seen_id = db.select(Mailbox.broadcasts_seen_id).where(
+        Mailbox.owner_id == owner_id, Mailbox.is_admin == is_admin
+    ).scalar_subquery()
+    receipts = db.select(MessageReceipt.message_id).where(
+        MessageReceipt.message_id.in_(ids),
+        MessageReceipt.reader_id == owner_id,
+        MessageReceipt.is_reader_admin == is_admin
+    )
+    earlier = db.select(Message.id).where(Message.id.in_(ids), Message.recipient_id.is_(None), Message.id <= seen_id)
+    return set(db.session.scalars(receipts.union(earlier))) | {
+        message.id for message in messages if _own_broadcast(message, owner_id, is_admin)
+    }
+
+def _open_new_mailboxes(session, flush_context):
+    # New rows have their ids by now; session.new still lists them until the flush completes
+    owners = [(obj.id, isinstance(obj, User)) for obj in session.new if isinstance(obj, (User, Employee))]
+    if owners:
+        open_mailboxes(session.connection(), owners)
+
+def init_inbox(app):
+    if not event.contains(Session, 'after_flush', _open_new_mailboxes):
+        event.listen(Session, 'after_flush', _open_new_mailboxes)
@@ -0,0 +1,71 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+from app import db
+from app.calendar_events import events_in_window
+from app.models import CalendarEvent, LeaveRequest
+
+def leave_conflicts(leave_requests):
+    """Map each request id to descriptions of approved leave and holidays it overlaps.
+
+    Checks a whole page with one approved-leave query, bounded to the page's employees and date span
+    (served by ix_leave_request_overlap), plus the holiday lookup for that span. Holidays are only expanded
+    for CALENDAR_MAX_WINDOW_DAYS from the earliest start, so one far-off request cannot expand recurring
+    events over years; holidays beyond that are not flagged.
+    """
+    if not leave_requests:
+        return {}
+    first_day = min(r.start_date for r in leave_requests)
+    last_day = max(r.end_date for r in leave_requests)
+    approved = defaultdict(list)
+    for leave in LeaveRequest.query.filter(
+        LeaveRequest.employee_id.in_({r.employee_id for r in leave_requests}),
+        LeaveRequest.status == 'Approved',
+        LeaveRequest.start_date <= last_day,
+        LeaveRequest.end_date >= first_day
+    ):
+        approved[leave.employee_id].append(leave)
+    holiday_end = min(last_day, first_day + timedelta(days=current_app.config['CALENDAR_MAX_WINDOW_DAYS']))
+    holidays = events_in_window(datetime.combine(first_day, time.min), datetime.combine(holiday_end, time.max),
+                                event_types=('Holiday',))
+
+    conflicts = {}
+    for request in leave_requests:
+        found = [f'Overlaps approved {leave.leave_type} leave {leave.start_date} to {leave.end_date}'
+                 for leave in approved[request.employee_id]
+                 if leave.id != request.id and leave.start_date <= request.end_date and leave.end_date >= request.start_date]
+        found += [f'Holiday: {holiday.event.title} ({holiday.start_date.date()})'
+                  for holiday in holidays
+                  if holiday.start_date.date() <= request.end_date and holiday.end_date.date() >= request.start_date]
+        if found:
+            conflicts[request.id] = found
+    return conflicts
+
+def decide_leave_requests(request_ids, status, admin_id, admin_notes=None):
+    """Approve or reject the pending requests among request_ids in the caller's transaction.
+
+    Approved leave is added to the calendar with one multi-row insert. Returns the requests that changed;
+    ids that are unknown or already decided are skipped. The caller commits.
+    """
+    if status not in ('Approved', 'Rejected'):
+        raise ValueError('Status must be Approved or Rejected.')
+    leave_requests = LeaveRequest.query.options(joinedload(LeaveRequest.employee)).filter(
+        LeaveRequest.id.in_(request_ids), LeaveRequest.status == 'Pending'
+    ).with_for_update().all()
+    for leave_request in leave_requests:
+        leave_request.status = status
+        if admin_notes:
+            leave_request.admin_notes = admin_notes
+
+    if status == 'Approved' and leave_requests:
+        db.session.execute(insert(CalendarEvent), [{
+            'title': f'{r.employee.first_name} {r.employee.last_name} - {r.leave_type} leave',
+            'start_date': datetime.combine(r.start_date, time.min),
+            'end_date': datetime.combine(r.end_date, time(23, 59)),
+            'event_type': 'Leave',
+            'created_by': admin_id,
+            'leave_request_id': r.id,
+        } for r in leave_requests])
+    return leave_requests
@@ -1,20 +1,21 @@
 from datetime import datetime
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-
-db = SQLAlchemy()
+from sqlalchemy import event
+from app import db
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    # scrypt hashes run to 162 characters
+    password_hash = db.Column(db.String(255), nullable=False)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        from app.passwords import hash_password
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        from app.passwords import verify_password
+        return verify_password(self.password_hash, password)
 
 class Employee(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -30,6 +31,37 @@ class Attendance(db.Model):
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
     clock_in_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     clock_out_time = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (
+        db.Index('ix_attendance_employee_clock_in', 'employee_id', 'clock_in_time'),
+        db.Index('ix_attendance_clock_in', 'clock_in_time'),
+        db.Index('ix_attendance_open', 'clock_out_time', 'employee_id'),
+    )
+
+class OpenShift(db.Model):
+    # One row per employee who is currently clocked in, maintained by clock_in/clock_out
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), primary_key=True)
+    attendance_id = db.Column(db.Integer, db.ForeignKey('attendance.id'), unique=True, nullable=False)
+    clock_in_time = db.Column(db.DateTime, nullable=False, index=True)
+    attendance = db.relationship('Attendance', lazy=True)
+
+class AttendanceArchive(db.Model):
+    # Closed shifts moved out of attendance by `flask attendance archive`, keeping their attendance ids.
+    # Stored compressed on MySQL; rarely read, and then by clock-in range
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    clock_in_time = db.Column(db.DateTime, nullable=False)
+    clock_out_time = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        db.Index('ix_attendance_archive_employee_clock_in', 'employee_id', 'clock_in_time'),
+        db.Index('ix_attendance_archive_clock_in', 'clock_in_time'),
+        {'mysql_row_format': 'COMPRESSED'},
+    )
+
+class AttendanceArchiveMonth(db.Model):
+    # One row per month of clock-ins that has been archived, with how many shifts moved
+    month = db.Column(db.Date, primary_key=True)
+    shift_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -47,6 +79,42 @@ class WorkReport(db.Model):
     hours_worked = db.Column(db.Float, nullable=True)
     units_completed = db.Column(db.Integer, nullable=True)
     description = db.Column(db.Text, nullable=True)
+    modified_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # What this report was last billed as; null until a billing run picks it up
+    billing_record_id = db.Column(db.Integer, db.ForeignKey('billing_record.id'), nullable=True)
+    billed_hours = db.Column(db.Float, nullable=True)
+    billed_units = db.Column(db.Integer, nullable=True)
+    billed_amount = db.Column(db.Float, nullable=True)
+    employee = db.relationship('Employee', backref=db.backref('work_reports', lazy='dynamic'), lazy=True)
+    billing_record = db.relationship('BillingRecord', backref=db.backref('work_reports', lazy='dynamic'), lazy=True)
+    __table_args__ = (
+        db.Index('ix_work_report_project_modified', 'project_id', 'modified_date'),
+        db.Index('ix_work_report_project_date', 'project_id', 'date'),
+        db.Index('ix_work_report_employee_date', 'employee_id', 'date'),
+        db.Index('ix_work_report_date', 'date', 'id'),
+        db.Index('ix_work_report_billing_record', 'billing_record_id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'employee_id': self.employee_id,
+            'project_id': self.project_id,
+            'date': self.date.isoformat(),
+            'hours_worked': self.hours_worked,
+            'units_completed': self.units_completed,
+            'description': self.description
+        }
+
+class WorkReportDailyRollup(db.Model):
+    # Totals per employee, project and day, kept in step with work_report by app.rollups
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    total_hours = db.Column(db.Float, nullable=False, default=0)
+    total_units = db.Column(db.Integer, nullable=False, default=0)
+    report_count = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.Index('ix_work_report_rollup_project_date', 'project_id', 'date'),)
 
 class LeaveRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -57,6 +125,24 @@ class LeaveRequest(db.Model):
     status = db.Column(db.String(64), default='Pending') # Pending, Approved, Rejected
     request_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     admin_notes = db.Column(db.Text, nullable=True)
+    employee = db.relationship('Employee', backref=db.backref('leave_requests', lazy='dynamic'), lazy=True)
+    __table_args__ = (
+        db.Index('ix_leave_request_overlap', 'employee_id', 'status', 'start_date', 'end_date'),
+        db.Index('ix_leave_request_status_requested', 'status', 'request_date'),
+        db.Index('ix_leave_request_requested', 'request_date', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'employee_id': self.employee_id,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat(),
+            'leave_type': self.leave_type,
+            'status': self.status,
+            'request_date': self.request_date.isoformat(),
+            'admin_notes': self.admin_notes
+        }
 
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -67,7 +153,61 @@ class Message(db.Model):
     subject = db.Column(db.String(256), nullable=True)
     body = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    attachment_path = db.Column(db.String(256), nullable=True)
+    attachment_path = db.Column(db.String(256), nullable=True) # Original filename of the attachment
+    attachment_id = db.Column(db.Integer, db.ForeignKey('attachment.id'), nullable=True)
+    attachment = db.relationship('Attachment', lazy=True)
+    __table_args__ = (
+        db.Index('ix_message_recipient_timestamp', 'recipient_id', 'is_recipient_admin', 'timestamp'),
+        db.Index('ix_message_sender_timestamp', 'sender_id', 'is_sender_admin', 'timestamp'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sender_id': self.sender_id,
+            'is_sender_admin': self.is_sender_admin,
+            'recipient_id': self.recipient_id,
+            'is_recipient_admin': self.is_recipient_admin,
+            'subject': self.subject,
+            'body': self.body,
+            'timestamp': self.timestamp.isoformat(),
+            'attachment_path': self.attachment_path,
+            'attachment_id': self.attachment_id
+        }
+
+class Attachment(db.Model):
+    # Stored once per distinct content; the blob lives on disk under its SHA-256
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(128), nullable=False)
+    created_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class MessageReceipt(db.Model):
+    # One row per reader per message they have opened; broadcasts get one per reader too
+    message_id = db.Column(db.Integer, db.ForeignKey('message.id', ondelete='CASCADE'), primary_key=True)
+    reader_id = db.Column(db.Integer, primary_key=True)
+    is_reader_admin = db.Column(db.Boolean, primary_key=True)
+    read_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class Mailbox(db.Model):
+    # Unread counters per recipient, maintained by app.inbox
+    owner_id = db.Column(db.Integer, primary_key=True)
+    is_admin = db.Column(db.Boolean, primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    broadcasts_read = db.Column(db.Integer, nullable=False, default=0)
+    # Broadcasts up to this id were sent before the account existed and count as read
+    broadcasts_seen_id = db.Column(db.Integer, nullable=False, default=0)
+
+class BroadcastTotal(db.Model):
+    # A single row counting every broadcast sent, maintained by app.inbox
+    id = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+
+# The row exists from the start, so counting a broadcast is always a single UPDATE
+event.listen(BroadcastTotal.__table__, 'after_create',
+             lambda table, connection, **kw: connection.execute(table.insert().values(id=1, count=0, last_id=0)))
 
 class CalendarEvent(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -78,6 +218,28 @@ class CalendarEvent(db.Model):
     event_type = db.Column(db.String(64), nullable=False) # 'Company Event', 'Holiday', 'Leave'
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # Null for system-generated events (e.g., holidays)
     user = db.relationship('User', backref='calendar_events', lazy=True)
+    leave_request_id = db.Column(db.Integer, db.ForeignKey('leave_request.id'), nullable=True) # Set for approved leave
+    # Recurring events are one row holding the rule; occurrences are expanded per window by app.calendar_events
+    recurrence = db.Column(db.String(16), nullable=True) # None, 'daily', 'weekly', 'monthly' or 'yearly'
+    recurrence_interval = db.Column(db.Integer, nullable=False, default=1)
+    recurrence_until = db.Column(db.DateTime, nullable=True) # Last possible occurrence start; null repeats forever
+    __table_args__ = (
+        db.Index('ix_calendar_event_start_end', 'start_date', 'end_date'),
+        db.Index('ix_calendar_event_recurrence', 'recurrence', 'start_date'),
+    )
+
+    def to_dict(self, start_date=None, end_date=None):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'start_date': (start_date or self.start_date).isoformat(),
+            'end_date': (end_date or self.end_date).isoformat(),
+            'event_type': self.event_type,
+            'recurrence': self.recurrence,
+            'recurrence_interval': self.recurrence_interval if self.recurrence else None,
+            'recurrence_until': self.recurrence_until.isoformat() if self.recurrence_until else None
+        }
 
 class BillingRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -91,13 +253,68 @@ class BillingRecord(db.Model):
     generated_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     project = db.relationship('Project', backref='billing_records', lazy=True)
     employee = db.relationship('Employee', backref='billing_records', lazy=True)
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'employee_id', 'start_date', 'end_date', name='uq_billing_record_period'),
+        db.Index('ix_billing_record_generated', 'generated_date', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'employee_id': self.employee_id,
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat(),
+            'hours_billed': self.hours_billed,
+            'units_billed': self.units_billed,
+            'amount': self.amount,
+            'generated_date': self.generated_date.isoformat()
+        }
+
+class BillingWatermark(db.Model):
+    # Marks a project and period as billed from work report state; last_modified is the newest report billed
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    last_modified = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (db.UniqueConstraint('project_id', 'start_date', 'end_date', name='uq_billing_watermark_period'),)
+
+class BillingJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(64), nullable=False, default='Pending') # Pending, Running, Completed, Failed
+    total_projects = db.Column(db.Integer, nullable=False, default=0)
+    completed_projects = db.Column(db.Integer, nullable=False, default=0)
+    failed_projects = db.Column(db.Integer, nullable=False, default=0)
+    records_created = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_date = db.Column(db.DateTime, nullable=True)
+    # The billed period while the job is Pending or Running, NULL once it finishes, so that
+    # only one active job per period can exist however many requests start one at once
+    active_period = db.Column(db.String(32), nullable=True)
+    __table_args__ = (db.UniqueConstraint('active_period', name='uq_billing_job_active_period'),)
+
+class BillingRate(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=True) # Null for the project-wide default rate
+    rate = db.Column(db.Float, nullable=False) # Per hour for Hourly projects, per unit for Count-Based
+    effective_from = db.Column(db.Date, nullable=False)
+    effective_to = db.Column(db.Date, nullable=True) # Null while the rate is current
+    project = db.relationship('Project', backref='billing_rates', lazy=True)
+    employee = db.relationship('Employee', backref='billing_rates', lazy=True)
+    __table_args__ = (db.Index('ix_billing_rate_lookup', 'project_id', 'employee_id', 'effective_from'),)
 
 class BillingAdjustment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     billing_record_id = db.Column(db.Integer, db.ForeignKey('billing_record.id'), nullable=False)
-    admin_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    admin_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # Null for adjustments made by a billing rerun
     adjustment_amount = db.Column(db.Float, nullable=False)
     reason = db.Column(db.Text, nullable=True)
     adjustment_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     billing_record = db.relationship('BillingRecord', backref='adjustments', lazy=True)
-    admin = db.relationship('User', backref='billing_adjustments', lazy=True)
\ No newline at end of file
+    admin = db.relationship('User', backref='billing_adjustments', lazy=True)
+    __table_args__ = (db.Index('ix_billing_adjustment_record', 'billing_record_id'),)
\ No newline at end of file
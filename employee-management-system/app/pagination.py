@@ -0,0 +1,46 @@
+import base64
+import json
+from flask import abort, current_app, request, url_for
+from app import db
+
+def encode_cursor(value, row_id):
+    payload = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value, row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor, column):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        python_type = column.type.python_type
+        if hasattr(python_type, 'fromisoformat'):
+            return python_type.fromisoformat(value), int(row_id)
+        return python_type(value), int(row_id)
+    except (ValueError, TypeError):
+        abort(400, 'Invalid page cursor')
+
+def page_size():
+    per_page = request.args.get('per_page', type=int) or current_app.config['PAGE_SIZE']
+    return max(1, min(per_page, current_app.config['MAX_PAGE_SIZE']))
+
+def keyset_paginate(query, sort_column, id_column, cursor=None, per_page=None):
+    """Return one page of query, newest first on (sort_column, id_column), and the cursor for the next page.
+
+    Each page seeks past the previous page's last row instead of using OFFSET, so deep pages cost the same as the first.
+    """
+    per_page = per_page or page_size()
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort_column)
+        query = query.filter(db.or_(sort_column < value, db.and_(sort_column == value, id_column < row_id)))
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(getattr(rows[-1], sort_column.key), getattr(rows[-1], id_column.key))
+    return rows, next_cursor
+
+def page_url(cursor, param='cursor'):
+    """URL of the current view with the same filters and the given cursor, or None when there is no such page."""
+    if not cursor:
+        return None
+    args = request.args.to_dict()
+    args[param] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+from app import bcrypt
+
+BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
+
+class PasswordCheckBusy(Exception):
+    """Raised when the verification pool's queue is full or a check times out; the login should be retried shortly."""
+
+class PasswordPolicy:
+    """Hashes new passwords with the configured algorithm and cost, verifies any supported hash, and runs
+    verification on a bounded thread pool. bcrypt, scrypt and PBKDF2 all release the GIL while hashing, so
+    pooled checks use other cores and cannot starve the worker's request threads."""
+
+    def __init__(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.bcrypt_rounds = app.config['PASSWORD_BCRYPT_ROUNDS']
+        if self.method == 'bcrypt':
+            self.prefix = f'$2b${self.bcrypt_rounds:02d}$'
+        else:
+            # Let werkzeug fill in its default parameters, then compare stored hashes against the full method string
+            self.prefix = generate_password_hash('', method=self.method).split('$', 1)[0] + '$'
+        workers = app.config['PASSWORD_VERIFY_WORKERS']
+        self.timeout = app.config['PASSWORD_VERIFY_TIMEOUT']
+        self._slots = threading.BoundedSemaphore(workers + app.config['PASSWORD_VERIFY_QUEUE'])
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-verify')
+
+    def hash(self, password):
+        if self.method == 'bcrypt':
+            return bcrypt.generate_password_hash(password, self.bcrypt_rounds).decode('utf-8')
+        return generate_password_hash(password, method=self.method)
+
+    @staticmethod
+    def verify(password_hash, password):
+        if password_hash.startswith(BCRYPT_PREFIXES):
+            return bcrypt.check_password_hash(password_hash, password)
+        return check_password_hash(password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return not password_hash.startswith(self.prefix)
+
+    def verify_pooled(self, password_hash, password):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordCheckBusy('Too many logins in progress.')
+        try:
+            future = self._executor.submit(self.verify, password_hash, password)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot stays taken until the hash finishes, even when the login gives up waiting on it
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            raise PasswordCheckBusy('Password check timed out.')
+
+def password_policy():
+    return current_app.extensions['password_policy']
+
+def hash_password(password):
+    return password_policy().hash(password)
+
+def verify_password(password_hash, password):
+    return PasswordPolicy.verify(password_hash, password)
+
+def init_password_policy(app):
+    app.extensions['password_policy'] = PasswordPolicy(app)
@@ -0,0 +1,149 @@
+import atexit
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Attendance, OpenShift
+
+class Punch:
+    __slots__ = ('action', 'employee_id', 'timestamp', 'done', 'result')
+
+    def __init__(self, action, employee_id):
+        self.action = action
+        self.employee_id = int(employee_id)
+        self.timestamp = datetime.utcnow()
+        self.done = threading.Event()
+        self.result = None
+
+def apply_punches(punches):
+    """Stage a batch of punches in the session, in arrival order, and return one (body, status) per punch."""
+    employee_ids = {punch.employee_id for punch in punches}
+    open_shifts = {
+        shift.employee_id: shift
+        for shift in OpenShift.query.options(joinedload(OpenShift.attendance)).filter(OpenShift.employee_id.in_(employee_ids))
+    }
+    results = []
+    for punch in punches:
+        shift = open_shifts.get(punch.employee_id)
+        if punch.action == 'clock_in':
+            if shift:
+                results.append(({'status': 'error', 'message': 'Already clocked in'}, 400))
+                continue
+            attendance = Attendance(employee_id=punch.employee_id, clock_in_time=punch.timestamp)
+            shift = OpenShift(employee_id=punch.employee_id, attendance=attendance, clock_in_time=punch.timestamp)
+            db.session.add_all([attendance, shift])
+            open_shifts[punch.employee_id] = shift
+            results.append(({'status': 'success', 'message': 'Clocked in successfully'}, 200))
+        else:
+            if not shift:
+                results.append(({'status': 'error', 'message': 'No active clock-in found'}, 400))
+                continue
+            shift.attendance.clock_out_time = punch.timestamp
+            if shift in db.session.new:
+                db.session.expunge(shift)
+            else:
+                db.session.delete(shift)
+            del open_shifts[punch.employee_id]
+            results.append(({'status': 'success', 'message': 'Clocked out successfully'}, 200))
+    return results
+
+class PunchQueue:
+    """In-process queue that commits punches in batches every N ms or M events."""
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config['ATTENDANCE_FLUSH_INTERVAL_MS'] / 1000.0
+        self.max_events = app.config['ATTENDANCE_FLUSH_MAX_EVENTS']
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        self.flush_count = 0
+        self.flushed_events = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def submit(self, action, employee_id):
+        punch = Punch(action, employee_id)
+        with self._cond:
+            if self._thread is None:
+                # Started lazily so each forked worker gets its own flusher
+                self._thread = threading.Thread(target=self._run, name='punch-queue', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+            self._pending.append(punch)
+            if len(self._pending) >= self.max_events:
+                self._cond.notify()
+        return punch
+
+    def depth(self):
+        return len(self._pending)
+
+    def metrics(self):
+        return {
+            'queue_depth': self.depth(),
+            'flush_count': self.flush_count,
+            'flushed_events': self.flushed_events,
+            'last_flush_ms': round(self.last_flush_ms, 3),
+            'max_flush_ms': round(self.max_flush_ms, 3),
+            'avg_flush_ms': round(self.total_flush_ms / self.flush_count, 3) if self.flush_count else 0.0,
+        }
+
+    def drain(self):
+        """Flush everything queued so far on the calling thread."""
+        while self._pending:
+            self._flush(self._take_batch())
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.drain()
+
+    def _take_batch(self):
+        with self._cond:
+            return [self._pending.popleft() for _ in range(min(self.max_events, len(self._pending)))]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopped or len(self._pending) >= self.max_events, timeout=self.interval)
+                if self._stopped:
+                    return
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        with self._flush_lock, self.app.app_context():
+            start = time.perf_counter()
+            try:
+                results = apply_punches(batch)
+                db.session.commit()
+            except Exception:
+                # Another worker raced us on an open shift; retry one punch per transaction
+                db.session.rollback()
+                results = []
+                for punch in batch:
+                    try:
+                        [result] = apply_punches([punch])
+                        db.session.commit()
+                        results.append(result)
+                    except Exception:
+                        db.session.rollback()
+                        results.append(({'status': 'error', 'message': 'Could not record punch'}, 500))
+            finally:
+                db.session.remove()
+            elapsed = (time.perf_counter() - start) * 1000
+        self.flush_count += 1
+        self.flushed_events += len(batch)
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self.total_flush_ms += elapsed
+        for punch, result in zip(batch, results):
+            punch.result = result
+            punch.done.set()
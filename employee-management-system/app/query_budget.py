@@ -0,0 +1,42 @@
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+def query_budget(max_queries, **per_method):
+    """Declare the most SQL statements a view may issue per request, including loading the logged-in user.
+
+    Keyword arguments override the budget for one HTTP method, e.g. ``query_budget(5, POST=12)``.
+    """
+    def decorator(view):
+        view.query_budget = dict(per_method, default=max_queries)
+        return view
+    return decorator
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_count' in g:
+        g.query_count += 1
+
+def init_query_budget(app):
+    if not event.contains(Engine, 'before_cursor_execute', _count_query):
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+
+    @app.before_request
+    def start_query_count():
+        g.query_count = 0
+
+    @app.after_request
+    def check_query_budget(response):
+        view = current_app.view_functions.get(request.endpoint)
+        budgets = getattr(view, 'query_budget', {})
+        budget = budgets.get(request.method, budgets.get('default'))
+        if app.debug or app.testing:
+            response.headers['X-Query-Count'] = str(g.query_count)
+        if budget is not None and g.query_count > budget:
+            message = f'{request.endpoint} issued {g.query_count} queries, budget is {budget}'
+            if app.config['QUERY_BUDGET_ENFORCE']:
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+        return response
@@ -0,0 +1,130 @@
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from app.models import WorkReport, WorkReportDailyRollup
+
+KEY_FIELDS = ('employee_id', 'project_id', 'date')
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+def rollup_deltas(rows, sign=1, deltas=None):
+    """Fold work report dicts into {(employee_id, project_id, date): [hours, units, count]} deltas."""
+    deltas = deltas if deltas is not None else defaultdict(lambda: [0.0, 0, 0])
+    for row in rows:
+        delta = deltas[(row['employee_id'], row['project_id'], _day(row['date']))]
+        delta[0] += sign * (row['hours_worked'] or 0)
+        delta[1] += sign * (row['units_completed'] or 0)
+        delta[2] += sign
+    return deltas
+
+def _key_matches(table, row):
+    return db.and_(*(table.c[field] == row[field] for field in KEY_FIELDS))
+
+def _upsert_row_by_row(connection, table, rows):
+    # Portable fallback for databases without an upsert: UPDATE each key, INSERT the ones that matched nothing
+    for row in rows:
+        updated = connection.execute(table.update().where(_key_matches(table, row)).values(
+            total_hours=table.c.total_hours + row['total_hours'],
+            total_units=table.c.total_units + row['total_units'],
+            report_count=table.c.report_count + row['report_count']
+        ))
+        if updated.rowcount == 0:
+            connection.execute(table.insert(), row)
+
+def apply_rollup_deltas(deltas, connection=None):
+    """Add deltas to the rollup table, with one upsert statement where the database has one."""
+    rows = [
+        {'employee_id': employee_id, 'project_id': project_id, 'date': day,
+         'total_hours': hours, 'total_units': units, 'report_count': count}
+        for (employee_id, project_id, day), (hours, units, count) in deltas.items()
+        if hours or units or count
+    ]
+    if not rows:
+        return
+    connection = connection or db.session.connection()
+    table = WorkReportDailyRollup.__table__
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        stmt = stmt.on_duplicate_key_update(
+            total_hours=table.c.total_hours + stmt.inserted.total_hours,
+            total_units=table.c.total_units + stmt.inserted.total_units,
+            report_count=table.c.report_count + stmt.inserted.report_count
+        )
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=list(KEY_FIELDS), set_={
+            'total_hours': table.c.total_hours + stmt.excluded.total_hours,
+            'total_units': table.c.total_units + stmt.excluded.total_units,
+            'report_count': table.c.report_count + stmt.excluded.report_count,
+        })
+    else:
+        stmt = None
+    if stmt is None:
+        _upsert_row_by_row(connection, table, rows)
+    else:
+        connection.execute(stmt, rows)
+    emptied = [row for row in rows if row['report_count'] < 0]
+    if emptied:
+        # Only the keys that lost reports can have dropped to zero
+        connection.execute(table.delete().where(
+            table.c.report_count <= 0, db.or_(*(_key_matches(table, row) for row in emptied))
+        ))
+
+def _snapshot(report, history=False):
+    row = {}
+    for field in KEY_FIELDS + ('hours_worked', 'units_completed'):
+        if history:
+            added, unchanged, deleted = inspect(report).attrs[field].history
+            values = deleted or unchanged or added
+            row[field] = values[0] if values else None
+        else:
+            row[field] = getattr(report, field)
+    return row
+
+def _capture_old_values(session, flush_context, instances):
+    # Old values have to be read before the flush overwrites or deletes them
+    old = [_snapshot(obj, history=True) for obj in session.dirty if isinstance(obj, WorkReport) and session.is_modified(obj)]
+    old += [_snapshot(obj) for obj in session.deleted if isinstance(obj, WorkReport)]
+    if old:
+        session.info.setdefault('rollup_old', []).extend(old)
+
+def _apply_flush(session, flush_context):
+    deltas = rollup_deltas(session.info.pop('rollup_old', []), sign=-1)
+    # New rows have their defaults (such as date) filled in by now
+    new = [_snapshot(obj) for obj in session.new if isinstance(obj, WorkReport)]
+    new += [_snapshot(obj) for obj in session.dirty if isinstance(obj, WorkReport) and session.is_modified(obj)]
+    rollup_deltas(new, deltas=deltas)
+    apply_rollup_deltas(deltas, session.connection())
+
+def _forget_flush(session):
+    session.info.pop('rollup_old', None)
+
+def rebuild_rollup():
+    """Recompute the whole rollup table from work_report in one INSERT ... SELECT."""
+    table = WorkReportDailyRollup.__table__
+    db.session.execute(table.delete())
+    db.session.execute(table.insert().from_select(
+        ['employee_id', 'project_id', 'date', 'total_hours', 'total_units', 'report_count'],
+        db.select(
+            WorkReport.employee_id, WorkReport.project_id, WorkReport.date,
+            db.func.coalesce(db.func.sum(WorkReport.hours_worked), 0),
+            db.func.coalesce(db.func.sum(WorkReport.units_completed), 0),
+            db.func.count(WorkReport.id)
+        ).group_by(WorkReport.employee_id, WorkReport.project_id, WorkReport.date)
+    ))
+    return db.session.query(WorkReportDailyRollup).count()
+
+def init_rollups(app):
+    if not event.contains(Session, 'before_flush', _capture_old_values):
+        event.listen(Session, 'before_flush', _capture_old_values)
+        event.listen(Session, 'after_flush', _apply_flush)
+        event.listen(Session, 'after_rollback', _forget_flush)
@@ -1,22 +1,41 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, Response, render_template, redirect, url_for, flash, request, jsonify, current_app, abort
 from flask_login import login_user, logout_user, login_required, current_user
-from .models import BillingRecord, BillingAdjustment
-from app.models import Employee, User, Attendance, Project, WorkReport, LeaveRequest, Message, CalendarEvent, db
-from datetime import datetime
+from .models import BillingRecord, BillingAdjustment, BillingRate, BillingJob
+from .billing import generate_billing_records, set_rate, start_billing_job
+from .pagination import keyset_paginate, page_size, page_url
+from .query_budget import query_budget
+from .database import read_replica
+from .exports import export_response
+from .imports import import_work_reports
+from .counters import dashboard_counters
+from .attendance_stream import attendance_snapshot, event_stream, last_clock_out_times, open_shift_times
+from .timesheets import build_timesheets
+from .archive import attendance_history
+from .search import SEARCH_TYPES, message_matches, ranked_page, search_terms, work_report_matches
+from .directory import search_employees, search_users
+from .calendar_events import events_in_window, validate_event
+from .passwords import PasswordCheckBusy, password_policy
+from .leave import decide_leave_requests, leave_conflicts
+from .attachments import attachment_response, store_attachment
+from .inbox import can_read, inbox_query, mark_read, read_message_ids, readable_by, send_message, sent_query, unread_count
+import io
+from sqlalchemy.orm import contains_eager, joinedload
+from app.models import Employee, User, Attendance, OpenShift, Project, WorkReport, WorkReportDailyRollup, LeaveRequest, Message, CalendarEvent, db
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
 
 main = Blueprint('main', __name__)
 
 @main.route('/')
 def welcome():
-    active_employees = Employee.query.filter_by(is_active=True).all()
-    return render_template('welcome.html', employees=active_employees)
+    # Names are looked up as they are typed through /api/employees/search
+    return render_template('welcome.html')
 
 @main.route('/employee/<int:employee_id>')
 def employee_dashboard(employee_id):
     employee = Employee.query.get_or_404(employee_id)
     # Check if the employee is currently clocked in
-    latest_attendance = Attendance.query.filter_by(employee_id=employee.id).order_by(Attendance.clock_in_time.desc()).first()
-    is_clocked_in = latest_attendance and latest_attendance.clock_out_time is None
+    is_clocked_in = OpenShift.query.get(employee.id) is not None
     
     # Get assigned projects for the employee (assuming a many-to-many relationship or a simple assignment for now)
     # For now, let's assume all active projects are available to all employees for work reporting
@@ -27,6 +46,15 @@ def employee_dashboard(employee_id):
                            is_clocked_in=is_clocked_in,
                            projects=assigned_projects)
 
+@main.route('/employee/<int:employee_id>/calendar')
+@query_budget(3)
+def employee_calendar(employee_id):
+    employee = Employee.query.get_or_404(employee_id)
+    window_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    occurrences = events_in_window(window_start, window_start + timedelta(days=60),
+                                   event_types=('Company Event', 'Holiday'))
+    return render_template('employee_calendar.html', employee=employee, occurrences=occurrences)
+
 @main.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     if current_user.is_authenticated:
@@ -34,9 +62,18 @@ def admin_login():
 
     if request.method == 'POST':
         username = request.form.get('username')
-        password = request.form.get('password')
+        password = request.form.get('password', '')
         user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        policy = password_policy()
+        try:
+            valid = user is not None and policy.verify_pooled(user.password_hash, password)
+        except PasswordCheckBusy:
+            flash('The server is busy, please try again in a moment.')
+            return render_template('admin_login.html'), 503
+        if valid:
+            if policy.needs_rehash(user.password_hash):
+                user.password_hash = policy.hash(password)
+                db.session.commit()
             login_user(user)
             return redirect(url_for('main.admin_dashboard'))
         else:
@@ -44,23 +81,11 @@ def admin_login():
     return render_template('admin_login.html')
 
 @main.route('/admin/dashboard')
+@query_budget(5)
 @login_required
 def admin_dashboard():
-    total_active_employees = Employee.query.filter_by(is_active=True).count()
-    pending_leave_requests = LeaveRequest.query.filter_by(status='Pending').count()
-    active_projects = Project.query.filter_by(is_active=True).count()
-    
-    today = datetime.utcnow().date()
-    clocked_in_today = Attendance.query.filter(
-        db.func.date(Attendance.clock_in_time) == today,
-        Attendance.clock_out_time == None
-    ).count()
-
-    return render_template('admin_dashboard.html',
-                           total_active_employees=total_active_employees,
-                           pending_leave_requests=pending_leave_requests,
-                           active_projects=active_projects,
-                           clocked_in_today=clocked_in_today)
+    # Served from a short-lived cache that commits touching these tables invalidate
+    return render_template('admin_dashboard.html', **dashboard_counters())
 
 @main.route('/logout')
 @login_required
@@ -74,9 +99,22 @@ def clock_in():
     if not employee_id:
         return jsonify({'status': 'error', 'message': 'Employee ID is required'}), 400
 
+    if 'punch_queue' in current_app.extensions:
+        return queued_punch('clock_in', employee_id)
+
+    if OpenShift.query.get(employee_id):
+        return jsonify({'status': 'error', 'message': 'Already clocked in'}), 400
+
     attendance = Attendance(employee_id=employee_id, clock_in_time=datetime.utcnow())
     db.session.add(attendance)
-    db.session.commit()
+    db.session.flush()
+    # The open shift row is keyed by employee, so a concurrent second clock-in fails here
+    db.session.add(OpenShift(employee_id=employee_id, attendance_id=attendance.id, clock_in_time=attendance.clock_in_time))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': 'Already clocked in'}), 400
     return jsonify({'status': 'success', 'message': 'Clocked in successfully'})
 
 @main.route('/api/attendance/clock_out', methods=['POST'])
@@ -85,43 +123,196 @@ def clock_out():
     if not employee_id:
         return jsonify({'status': 'error', 'message': 'Employee ID is required'}), 400
 
-    latest_attendance = Attendance.query.filter_by(employee_id=employee_id, clock_out_time=None).order_by(Attendance.clock_in_time.desc()).first()
+    if 'punch_queue' in current_app.extensions:
+        return queued_punch('clock_out', employee_id)
+
+    open_shift = OpenShift.query.get(employee_id)
 
-    if latest_attendance:
-        latest_attendance.clock_out_time = datetime.utcnow()
+    if open_shift:
+        open_shift.attendance.clock_out_time = datetime.utcnow()
+        db.session.delete(open_shift)
         db.session.commit()
         return jsonify({'status': 'success', 'message': 'Clocked out successfully'})
     else:
         return jsonify({'status': 'error', 'message': 'No active clock-in found'}), 400
 
+def queued_punch(action, employee_id):
+    try:
+        employee_id = int(employee_id)
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Employee ID must be an integer'}), 400
+    punch = current_app.extensions['punch_queue'].submit(action, employee_id)
+    if current_app.config['ATTENDANCE_ACK_MODE'] == 'enqueue':
+        return jsonify({'status': 'success', 'message': 'Punch queued'}), 202
+    if not punch.done.wait(current_app.config['ATTENDANCE_ACK_TIMEOUT']):
+        return jsonify({'status': 'error', 'message': 'Timed out waiting for punch to be recorded'}), 503
+    body, status_code = punch.result
+    return jsonify(body), status_code
+
+@main.route('/api/attendance/queue_metrics', methods=['GET'])
+def attendance_queue_metrics():
+    punch_queue = current_app.extensions.get('punch_queue')
+    if not punch_queue:
+        return jsonify({'enabled': False})
+    return jsonify(dict(punch_queue.metrics(), enabled=True))
+
 @main.route('/api/attendance/status/<int:employee_id>', methods=['GET'])
 def attendance_status(employee_id):
-    latest_attendance = Attendance.query.filter_by(employee_id=employee_id).order_by(Attendance.clock_in_time.desc()).first()
-
-    if latest_attendance and latest_attendance.clock_out_time is None:
+    if OpenShift.query.get(employee_id):
         return jsonify({'status': 'Clocked In'})
     else:
         return jsonify({'status': 'Clocked Out'})
 
+@main.route('/api/attendance/stream', methods=['GET'])
+@query_budget(4)
+def attendance_stream():
+    # One employee's status is public like /api/attendance/status; the whole floor needs a login
+    employee_id = request.args.get('employee_id', type=int)
+    if employee_id is None and not current_user.is_authenticated:
+        return jsonify({'status': 'error', 'message': 'Log in to follow all employees, or pass employee_id.'}), 401
+
+    app = current_app._get_current_object()
+    hub = app.extensions['attendance_hub']
+
+    def load_snapshot():
+        with app.app_context():
+            try:
+                return attendance_snapshot(employee_id)
+            finally:
+                db.session.remove()
+
+    def sync():
+        with app.app_context():
+            try:
+                hub.sync(open_shift_times, last_clock_out_times)
+            finally:
+                db.session.remove()
+
+    # Catch up with other processes first, so the hub knows the open shifts the snapshot starts from
+    if hub.sync_due():
+        hub.sync(open_shift_times, last_clock_out_times)
+    # A reconnecting client that the hub can replay for skips the snapshot
+    last_id = hub.parse_event_id(request.headers.get('Last-Event-ID'))
+    snapshot = None
+    if last_id is None:
+        last_id = hub.last_id
+        snapshot = attendance_snapshot(employee_id)
+    stream = event_stream(hub, load_snapshot, last_id, app.config['ATTENDANCE_STREAM_KEEPALIVE'],
+                          snapshot=snapshot, employee_id=employee_id, sync=sync)
+    return Response(stream, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @main.route('/admin/attendance')
+@query_budget(2)
 @login_required
 def view_attendance():
-    employees = Employee.query.filter_by(is_active=True).all()
+    rows = db.session.query(Employee.id, Employee.first_name, Employee.last_name, OpenShift.clock_in_time).outerjoin(
+        OpenShift, OpenShift.employee_id == Employee.id
+    ).filter(Employee.is_active == True).all()
     attendance_data = []
-    for employee in employees:
-        latest_attendance = Attendance.query.filter_by(employee_id=employee.id).order_by(Attendance.clock_in_time.desc()).first()
-        status = 'Clocked Out'
-        clock_in = None
-        if latest_attendance and latest_attendance.clock_out_time is None:
-            status = 'Clocked In'
-            clock_in = latest_attendance.clock_in_time
+    for employee_id, first_name, last_name, clock_in in rows:
         attendance_data.append({
-            'employee_name': f"{employee.first_name} {employee.last_name}",
-            'status': status,
+            'employee_id': employee_id,
+            'employee_name': f"{first_name} {last_name}",
+            'status': 'Clocked In' if clock_in else 'Clocked Out',
             'clock_in_time': clock_in
         })
     return render_template('admin_attendance.html', attendance_data=attendance_data)
 
+@main.route('/api/timesheets', methods=['GET'])
+@query_budget(3)
+@login_required
+@read_replica
+def api_timesheets():
+    # start_date/end_date are inclusive and default to the current week so far
+    today = datetime.utcnow().date()
+    try:
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') \
+            else today - timedelta(days=today.weekday())
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else today
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Dates must be YYYY-MM-DD.'}), 400
+    if end_date < start_date:
+        return jsonify({'status': 'error', 'message': 'start_date must not be after end_date.'}), 400
+    max_days = current_app.config['TIMESHEET_MAX_DAYS']
+    if (end_date - start_date).days + 1 > max_days:
+        return jsonify({'status': 'error', 'message': f'A timesheet cannot cover more than {max_days} days.'}), 400
+
+    timesheets = build_timesheets(start_date, end_date, employee_ids=request.args.getlist('employee_id', type=int),
+                                  max_shift_hours=current_app.config['TIMESHEET_MAX_SHIFT_HOURS'],
+                                  crosscheck=request.args.get('crosscheck') in ('1', 'true'),
+                                  tolerance_hours=current_app.config['TIMESHEET_TOLERANCE_HOURS'])
+    return jsonify({'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(), 'employees': timesheets})
+
+@main.route('/admin/attendance/export')
+@login_required
+@read_replica
+def export_attendance():
+    employee_id = request.args.get('employee_id', type=int)
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+    # Archived shifts are included whenever the range reaches back far enough
+    history = attendance_history(
+        start=datetime.strptime(start_date_str, '%Y-%m-%d') if start_date_str else None,
+        end=datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1) if end_date_str else None,
+        employee_ids=[employee_id] if employee_id else None,
+    ).subquery()
+    query = db.session.query(
+        history.c.id, history.c.employee_id, Employee.first_name, Employee.last_name,
+        history.c.clock_in_time, history.c.clock_out_time
+    ).join(Employee, Employee.id == history.c.employee_id)
+
+    return export_response(query.order_by(history.c.id),
+                           ['id', 'employee_id', 'first_name', 'last_name', 'clock_in_time', 'clock_out_time'],
+                           request.args.get('format', 'csv'), 'attendance')
+
+@main.route('/admin/employees')
+@query_budget(2)
+@login_required
+def manage_employees():
+    employees, next_cursor = keyset_paginate(Employee.query, Employee.id, Employee.id, request.args.get('cursor'))
+    return render_template('admin_employees.html', employees=employees, next_url=page_url(next_cursor))
+
+@main.route('/admin/employees/add', methods=['POST'])
+@login_required
+def add_employee():
+    first_name = request.form.get('first_name')
+    last_name = request.form.get('last_name')
+    email = request.form.get('email')
+    department = request.form.get('department')
+    is_active = 'is_active' in request.form
+
+    if not first_name or not last_name or not email or not department:
+        flash('Name, email, and department are required.', 'danger')
+        return redirect(url_for('main.manage_employees'))
+
+    db.session.add(Employee(first_name=first_name, last_name=last_name, email=email, department=department, is_active=is_active))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        flash('An employee with that email already exists.', 'danger')
+        return redirect(url_for('main.manage_employees'))
+    flash('Employee added successfully!', 'success')
+    return redirect(url_for('main.manage_employees'))
+
+@main.route('/admin/employees/edit/<int:employee_id>', methods=['POST'])
+@login_required
+def edit_employee(employee_id):
+    employee = Employee.query.get_or_404(employee_id)
+    employee.first_name = request.form.get('first_name')
+    employee.last_name = request.form.get('last_name')
+    employee.email = request.form.get('email')
+    employee.department = request.form.get('department')
+    employee.is_active = 'is_active' in request.form
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        flash('An employee with that email already exists.', 'danger')
+        return redirect(url_for('main.manage_employees'))
+    flash('Employee updated successfully!', 'success')
+    return redirect(url_for('main.manage_employees'))
+
 @main.route('/admin/projects')
 @login_required
 def manage_projects():
@@ -139,187 +330,468 @@ def add_project():
     if not name or not billing_method:
         flash('Project name and billing method are required.', 'danger')
         return redirect(url_for('main.manage_projects'))
-    
-    @main.route('/employee/<int:employee_id>/work_report', methods=['GET', 'POST'])
-    def submit_work_report(employee_id):
-        employee = Employee.query.get_or_404(employee_id)
-        projects = Project.query.filter_by(is_active=True).all()
-    
-        if request.method == 'POST':
-            project_id = request.form.get('project_id')
-            description = request.form.get('description')
-            hours_worked = request.form.get('hours_worked')
-            units_completed = request.form.get('units_completed')
-    
-            project = Project.query.get(project_id)
-            if not project:
-                flash('Invalid project selected.', 'danger')
-                return redirect(url_for('main.submit_work_report', employee_id=employee.id))
-    
-            if project.billing_method == 'Hourly' and not hours_worked:
-                flash('Hours worked is required for hourly projects.', 'danger')
-                return redirect(url_for('main.submit_work_report', employee_id=employee.id))
-            elif project.billing_method == 'Count-Based' and not units_completed:
-                flash('Units completed is required for count-based projects.', 'danger')
-                return redirect(url_for('main.submit_work_report', employee_id=employee.id))
-    
-            work_report = WorkReport(
-                employee_id=employee.id,
-                project_id=project.id,
-                description=description,
-                hours_worked=float(hours_worked) if hours_worked else None,
-                units_completed=int(units_completed) if units_completed else None
-            )
-            db.session.add(work_report)
-            db.session.commit()
-            flash('Work report submitted successfully!', 'success')
-            return redirect(url_for('main.employee_dashboard', employee_id=employee.id))
-    
-        return render_template('employee_work_report.html', employee=employee, projects=projects)
-    
-    @main.route('/admin/work_reports', methods=['GET'])
-    @login_required
-    def view_work_reports():
-        employees = Employee.query.all()
-        projects = Project.query.all()
-    
-        employee_id = request.args.get('employee_id', type=int)
-        project_id = request.args.get('project_id', type=int)
-        start_date_str = request.args.get('start_date')
-        end_date_str = request.args.get('end_date')
-    
-        query = WorkReport.query.join(Employee).join(Project)
-    
-        if employee_id:
-            query = query.filter(WorkReport.employee_id == employee_id)
-        if project_id:
-            query = query.filter(WorkReport.project_id == project_id)
-        if start_date_str:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            query = query.filter(WorkReport.date >= start_date)
-        if end_date_str:
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            query = query.filter(WorkReport.date <= end_date)
-    
-        work_reports = query.order_by(WorkReport.date.desc()).all()
-    
-        return render_template('admin_work_reports.html',
-                               work_reports=work_reports,
-                               employees=employees,
-                               projects=projects)
-    
-    @main.route('/employee/<int:employee_id>/leave_request', methods=['GET', 'POST'])
-    def submit_leave_request(employee_id):
-        employee = Employee.query.get_or_404(employee_id)
-    
-        if request.method == 'POST':
-            start_date_str = request.form.get('start_date')
-            end_date_str = request.form.get('end_date')
-            leave_type = request.form.get('leave_type')
-    
-            if not start_date_str or not end_date_str or not leave_type:
-                flash('All fields are required for leave request.', 'danger')
-                return redirect(url_for('main.submit_leave_request', employee_id=employee.id))
-    
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-    
-            if start_date > end_date:
-                flash('Start date cannot be after end date.', 'danger')
-                return redirect(url_for('main.submit_leave_request', employee_id=employee.id))
-    
-            leave_request = LeaveRequest(
-                employee_id=employee.id,
-                start_date=start_date,
-                end_date=end_date,
-                leave_type=leave_type,
-                status='Pending'
-            )
-            db.session.add(leave_request)
-            db.session.commit()
-            flash('Leave request submitted successfully!', 'success')
-            return redirect(url_for('main.employee_dashboard', employee_id=employee.id))
-    
-        return render_template('employee_leave_request.html', employee=employee)
-    
-    @main.route('/admin/leave_requests')
-    @login_required
-    def manage_leave_requests():
-        leave_requests = LeaveRequest.query.join(Employee).order_by(LeaveRequest.request_date.desc()).all()
-        return render_template('admin_leave_requests.html', leave_requests=leave_requests)
-    
-    @main.route('/admin/leave_requests/approve/<int:request_id>', methods=['POST'])
-    @login_required
-    def approve_leave_request(request_id):
-        leave_request = LeaveRequest.query.get_or_404(request_id)
-        leave_request.status = 'Approved'
+
+    new_project = Project(name=name, description=description, billing_method=billing_method, is_active=is_active)
+    db.session.add(new_project)
+    db.session.commit()
+    flash('Project added successfully!', 'success')
+    return redirect(url_for('main.manage_projects'))
+
+@main.route('/employee/<int:employee_id>/work_report', methods=['GET', 'POST'])
+def submit_work_report(employee_id):
+    employee = Employee.query.get_or_404(employee_id)
+    projects = Project.query.filter_by(is_active=True).all()
+
+    if request.method == 'POST':
+        project_id = request.form.get('project_id')
+        description = request.form.get('description')
+        hours_worked = request.form.get('hours_worked')
+        units_completed = request.form.get('units_completed')
+
+        project = Project.query.get(project_id)
+        if not project:
+            flash('Invalid project selected.', 'danger')
+            return redirect(url_for('main.submit_work_report', employee_id=employee.id))
+
+        if project.billing_method == 'Hourly' and not hours_worked:
+            flash('Hours worked is required for hourly projects.', 'danger')
+            return redirect(url_for('main.submit_work_report', employee_id=employee.id))
+        elif project.billing_method == 'Count-Based' and not units_completed:
+            flash('Units completed is required for count-based projects.', 'danger')
+            return redirect(url_for('main.submit_work_report', employee_id=employee.id))
+
+        work_report = WorkReport(
+            employee_id=employee.id,
+            project_id=project.id,
+            description=description,
+            hours_worked=float(hours_worked) if hours_worked else None,
+            units_completed=int(units_completed) if units_completed else None
+        )
+        db.session.add(work_report)
         db.session.commit()
-        flash('Leave request approved.', 'success')
-        return redirect(url_for('main.manage_leave_requests'))
-    
-    @main.route('/admin/leave_requests/reject/<int:request_id>', methods=['POST'])
-    @login_required
-    def reject_leave_request(request_id):
-        leave_request = LeaveRequest.query.get_or_404(request_id)
-        leave_request.status = 'Rejected'
+        flash('Work report submitted successfully!', 'success')
+        return redirect(url_for('main.employee_dashboard', employee_id=employee.id))
+
+    return render_template('employee_work_report.html', employee=employee, projects=projects)
+
+def selected_employee():
+    # The filtered employee's name for the picker, which otherwise loads names as they are typed
+    employee_id = request.args.get('employee_id', type=int)
+    return db.session.get(Employee, employee_id) if employee_id else None
+
+def filter_work_reports(query, model=WorkReport):
+    # model is WorkReport or WorkReportDailyRollup; both carry employee_id, project_id and date
+    employee_id = request.args.get('employee_id', type=int)
+    project_id = request.args.get('project_id', type=int)
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+
+    if employee_id:
+        query = query.filter(model.employee_id == employee_id)
+    if project_id:
+        query = query.filter(model.project_id == project_id)
+    if start_date_str:
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        query = query.filter(model.date >= start_date)
+    if end_date_str:
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+        query = query.filter(model.date <= end_date)
+    return query
+
+def work_report_totals():
+    # Range totals come from the daily rollup rather than scanning work_report
+    hours, units, count = filter_work_reports(db.session.query(
+        db.func.coalesce(db.func.sum(WorkReportDailyRollup.total_hours), 0),
+        db.func.coalesce(db.func.sum(WorkReportDailyRollup.total_units), 0),
+        db.func.coalesce(db.func.sum(WorkReportDailyRollup.report_count), 0)
+    ), WorkReportDailyRollup).one()
+    return {'hours': hours, 'units': units, 'reports': count}
+
+@main.route('/admin/work_reports', methods=['GET'])
+@query_budget(5)
+@login_required
+@read_replica
+def view_work_reports():
+    projects = Project.query.all()
+
+    query = filter_work_reports(WorkReport.query.join(Employee).join(Project).options(
+        contains_eager(WorkReport.employee), contains_eager(WorkReport.project)))
+    work_reports, next_cursor = keyset_paginate(query, WorkReport.date, WorkReport.id, request.args.get('cursor'))
+
+    return render_template('admin_work_reports.html',
+                           work_reports=work_reports,
+                           selected_employee=selected_employee(),
+                           projects=projects,
+                           totals=work_report_totals(),
+                           next_url=page_url(next_cursor))
+
+@main.route('/admin/work_reports/export')
+@login_required
+@read_replica
+def export_work_reports():
+    query = db.session.query(
+        WorkReport.id, WorkReport.date, WorkReport.employee_id, Employee.first_name, Employee.last_name,
+        WorkReport.project_id, Project.name, WorkReport.hours_worked, WorkReport.units_completed, WorkReport.description
+    ).join(Employee, Employee.id == WorkReport.employee_id).join(Project, Project.id == WorkReport.project_id)
+    return export_response(filter_work_reports(query).order_by(WorkReport.id),
+                           ['id', 'date', 'employee_id', 'first_name', 'last_name', 'project_id', 'project_name',
+                            'hours_worked', 'units_completed', 'description'],
+                           request.args.get('format', 'csv'), 'work_reports')
+
+@main.route('/admin/work_reports/import', methods=['POST'])
+@login_required
+def import_work_reports_upload():
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Choose a CSV file to import.', 'danger')
+        return redirect(url_for('main.view_work_reports'))
+
+    try:
+        result = import_work_reports(io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''))
+    except (ValueError, UnicodeDecodeError) as e:
+        flash(f'Import failed: {e}', 'danger')
+        return redirect(url_for('main.view_work_reports'))
+
+    flash(f'Imported {result.imported} work reports, rejected {result.rejected} rows.',
+          'success' if not result.rejected else 'warning')
+    for line, message in result.errors[:20]:
+        flash(f'Line {line}: {message}', 'danger')
+    return redirect(url_for('main.view_work_reports'))
+
+@main.route('/api/work_reports', methods=['GET'])
+@query_budget(2)
+@login_required
+@read_replica
+def api_work_reports():
+    work_reports, next_cursor = keyset_paginate(filter_work_reports(WorkReport.query), WorkReport.date, WorkReport.id,
+                                                request.args.get('cursor'))
+    return jsonify({'items': [report.to_dict() for report in work_reports], 'next_cursor': next_cursor})
+
+def filter_messages(query):
+    # An employee matches messages they sent or received; dates apply to when the message was sent
+    employee_id = request.args.get('employee_id', type=int)
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+
+    if employee_id:
+        query = query.filter(db.or_(
+            db.and_(Message.sender_id == employee_id, Message.is_sender_admin == False),
+            db.and_(Message.recipient_id == employee_id, Message.is_recipient_admin == False)
+        ))
+    if start_date_str:
+        query = query.filter(Message.timestamp >= datetime.strptime(start_date_str, '%Y-%m-%d'))
+    if end_date_str:
+        query = query.filter(Message.timestamp < datetime.strptime(end_date_str, '%Y-%m-%d') + timedelta(days=1))
+    return query
+
+def search_results():
+    """Run the search described by the query string; returns (rows of (item, score), next page URL)."""
+    search_type = request.args.get('type', 'work_reports')
+    if search_type not in SEARCH_TYPES:
+        raise ValueError('type must be work_reports or messages.')
+    terms = search_terms(request.args.get('q'))
+    page = max(1, request.args.get('page', 1, type=int))
+    # Messages belong to no project, so a project filter leaves only work reports
+    if not terms or (search_type == 'messages' and request.args.get('project_id', type=int)):
+        return [], None
+
+    if search_type == 'work_reports':
+        matches = work_report_matches(terms)
+        query = filter_work_reports(db.session.query(WorkReport, matches.c.score).join(
+            matches, matches.c.id == WorkReport.id
+        ).join(Employee).join(Project).options(contains_eager(WorkReport.employee), contains_eager(WorkReport.project)))
+        rows, more = ranked_page(query, matches.c.score, WorkReport.id, page, page_size())
+    else:
+        matches = message_matches(terms)
+        # Only messages the reader could open, as read_message and message_attachment allow
+        query = filter_messages(db.session.query(Message, matches.c.score).join(
+            matches, matches.c.id == Message.id
+        ).filter(readable_by(*mailbox_owner())))
+        rows, more = ranked_page(query, matches.c.score, Message.id, page, page_size())
+    return rows, page_url(page + 1 if more else None, 'page')
+
+@main.route('/admin/search', methods=['GET'])
+@query_budget(4)
+@login_required
+@read_replica
+def admin_search():
+    try:
+        results, next_url = search_results()
+    except ValueError as e:
+        flash(str(e), 'danger')
+        results, next_url = [], None
+    return render_template('admin_search.html', results=results, next_url=next_url,
+                           search_type=request.args.get('type', 'work_reports'),
+                           selected_employee=selected_employee(), projects=Project.query.all())
+
+@main.route('/api/search', methods=['GET'])
+@query_budget(2)
+@login_required
+@read_replica
+def api_search():
+    try:
+        results, next_url = search_results()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({
+        'type': request.args.get('type', 'work_reports'),
+        'terms': search_terms(request.args.get('q')),
+        'items': [dict(item.to_dict(), score=score) for item, score in results],
+        'next_url': next_url,
+    })
+
+def directory_limit():
+    limit = request.args.get('limit', current_app.config['DIRECTORY_SEARCH_LIMIT'], type=int)
+    return max(1, min(limit, current_app.config['DIRECTORY_SEARCH_MAX_LIMIT']))
+
+@main.route('/api/employees/search', methods=['GET'])
+@query_budget(2)
+def api_employee_search():
+    # Public for the welcome page's name picker, which lists active employees without their emails
+    if current_user.is_authenticated:
+        items, version = search_employees(request.args.get('q'), directory_limit(),
+                                          active_only=request.args.get('active') == '1', include_email=True)
+    else:
+        items, version = search_employees(request.args.get('q'), directory_limit())
+    return jsonify({'version': version, 'items': items})
+
+@main.route('/api/users/search', methods=['GET'])
+@query_budget(2)
+@login_required
+def api_user_search():
+    items, version = search_users(request.args.get('q'), directory_limit())
+    return jsonify({'version': version, 'items': items})
+
+@main.route('/api/work_reports/summary', methods=['GET'])
+@query_budget(1)
+@login_required
+@read_replica
+def api_work_report_summary():
+    group_by = request.args.get('group_by', 'employee')
+    columns = {
+        'employee': [WorkReportDailyRollup.employee_id],
+        'project': [WorkReportDailyRollup.project_id],
+        'day': [WorkReportDailyRollup.date],
+        'employee_project': [WorkReportDailyRollup.employee_id, WorkReportDailyRollup.project_id],
+    }.get(group_by)
+    if columns is None:
+        return jsonify({'status': 'error', 'message': 'group_by must be employee, project, day or employee_project.'}), 400
+
+    query = filter_work_reports(db.session.query(
+        *columns,
+        db.func.sum(WorkReportDailyRollup.total_hours).label('hours'),
+        db.func.sum(WorkReportDailyRollup.total_units).label('units'),
+        db.func.sum(WorkReportDailyRollup.report_count).label('reports')
+    ), WorkReportDailyRollup).group_by(*columns).order_by(*columns)
+    items = []
+    for row in query:
+        item = row._asdict()
+        if 'date' in item:
+            item['date'] = item['date'].isoformat()
+        items.append(item)
+    return jsonify({'group_by': group_by, 'items': items})
+
+@main.route('/employee/<int:employee_id>/leave_request', methods=['GET', 'POST'])
+def submit_leave_request(employee_id):
+    employee = Employee.query.get_or_404(employee_id)
+
+    if request.method == 'POST':
+        start_date_str = request.form.get('start_date')
+        end_date_str = request.form.get('end_date')
+        leave_type = request.form.get('leave_type')
+
+        if not start_date_str or not end_date_str or not leave_type:
+            flash('All fields are required for leave request.', 'danger')
+            return redirect(url_for('main.submit_leave_request', employee_id=employee.id))
+
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+
+        if start_date > end_date:
+            flash('Start date cannot be after end date.', 'danger')
+            return redirect(url_for('main.submit_leave_request', employee_id=employee.id))
+
+        leave_request = LeaveRequest(
+            employee_id=employee.id,
+            start_date=start_date,
+            end_date=end_date,
+            leave_type=leave_type,
+            status='Pending'
+        )
+        db.session.add(leave_request)
         db.session.commit()
-        flash('Leave request rejected.', 'danger')
-        return redirect(url_for('main.manage_leave_requests'))
+        flash('Leave request submitted successfully!', 'success')
+        return redirect(url_for('main.employee_dashboard', employee_id=employee.id))
+
+    return render_template('employee_leave_request.html', employee=employee)
+
+@main.route('/admin/leave_requests')
+@query_budget(5)
+@login_required
+def manage_leave_requests():
+    query = LeaveRequest.query.join(Employee).options(contains_eager(LeaveRequest.employee))
+    status = request.args.get('status')
+    if status:
+        query = query.filter(LeaveRequest.status == status)
+    leave_requests, next_cursor = keyset_paginate(query, LeaveRequest.request_date, LeaveRequest.id, request.args.get('cursor'))
+    pending = [leave_request for leave_request in leave_requests if leave_request.status == 'Pending']
+    return render_template('admin_leave_requests.html', leave_requests=leave_requests, conflicts=leave_conflicts(pending),
+                           status=status, next_url=page_url(next_cursor))
+
+@main.route('/api/leave_requests', methods=['GET'])
+@query_budget(2)
+@login_required
+def api_leave_requests():
+    leave_requests, next_cursor = keyset_paginate(LeaveRequest.query, LeaveRequest.request_date, LeaveRequest.id,
+                                                  request.args.get('cursor'))
+    return jsonify({'items': [leave_request.to_dict() for leave_request in leave_requests], 'next_cursor': next_cursor})
+
+@main.route('/admin/leave_requests/approve/<int:request_id>', methods=['POST'])
+@login_required
+def approve_leave_request(request_id):
+    leave_request = LeaveRequest.query.get_or_404(request_id)
+    decide_leave_requests([leave_request.id], 'Approved', current_user.id)
+    db.session.commit()
+    flash('Leave request approved.', 'success')
+    return redirect(url_for('main.manage_leave_requests'))
+
+@main.route('/admin/leave_requests/reject/<int:request_id>', methods=['POST'])
+@login_required
+def reject_leave_request(request_id):
+    leave_request = LeaveRequest.query.get_or_404(request_id)
+    decide_leave_requests([leave_request.id], 'Rejected', current_user.id)
+    db.session.commit()
+    flash('Leave request rejected.', 'danger')
+    return redirect(url_for('main.manage_leave_requests'))
+
+@main.route('/admin/leave_requests/bulk', methods=['POST'])
+@login_required
+def bulk_decide_leave_requests():
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'status': 'error', 'message': 'Expected a JSON object.'}), 400
+        request_ids, action, admin_notes = data.get('ids') or [], data.get('action'), data.get('admin_notes')
+        if not isinstance(request_ids, list) or not all(type(i) is int for i in request_ids):
+            return jsonify({'status': 'error', 'message': 'ids must be a list of integers.'}), 400
+    else:
+        request_ids = request.form.getlist('request_ids', type=int)
+        action, admin_notes = request.form.get('action'), request.form.get('admin_notes')
+    request_ids = list(dict.fromkeys(request_ids))
+
+    status = {'approve': 'Approved', 'reject': 'Rejected'}.get(action)
+    if status is None or not request_ids:
+        message = 'Select at least one leave request and an action.'
+        if request.is_json:
+            return jsonify({'status': 'error', 'message': message}), 400
+        flash(message, 'danger')
+        return redirect(url_for('main.manage_leave_requests', status='Pending'))
+
+    decided = decide_leave_requests(request_ids, status, current_user.id, admin_notes)
+    db.session.commit()
+    message = f'{len(decided)} leave requests {status.lower()}; {len(request_ids) - len(decided)} were no longer pending.'
+    if request.is_json:
+        return jsonify({'status': 'success', 'message': message, 'ids': [r.id for r in decided]})
+    flash(message, 'success')
+    return redirect(url_for('main.manage_leave_requests', status='Pending'))
 
 @main.route('/messages', methods=['GET', 'POST'])
+@query_budget(6, POST=8)
 @login_required
 def messages():
+    owner_id, is_admin = mailbox_owner()
     if request.method == 'POST':
-        recipient_id = request.form.get('recipient_id')
-        is_recipient_admin = request.form.get('is_recipient_admin') == 'true'
+        recipient_type = request.form.get('recipient_type')
+        recipient_id = request.form.get('recipient_id', type=int)
+        if recipient_type:
+            is_recipient_admin = recipient_type == 'admin'
+            if recipient_type == 'broadcast':
+                recipient_id = None
+            elif recipient_id is None or db.session.get(User if is_recipient_admin else Employee, recipient_id) is None:
+                # Without an id the message would go out as a broadcast
+                flash('Choose a recipient from the suggestions.', 'danger')
+                return redirect(url_for('main.messages'))
+        else:
+            is_recipient_admin = request.form.get('is_recipient_admin') == 'true'
         subject = request.form.get('subject')
         body = request.form.get('body')
         attachment = request.files.get('attachment')
 
-        sender_id = current_user.id
-        is_sender_admin = True # Assuming only admins can send messages for now
-
-        attachment_path = None
-        if attachment:
-            # Save attachment to a secure location and store its path
-            # For simplicity, let's just store the filename for now
-            attachment_path = attachment.filename
-
-        message = Message(
-            sender_id=sender_id,
-            recipient_id=recipient_id if recipient_id else None,
-            is_sender_admin=is_sender_admin,
-            is_recipient_admin=is_recipient_admin if recipient_id else None,
-            subject=subject,
-            body=body,
-            attachment_path=attachment_path
-        )
-        db.session.add(message)
+        if not body:
+            flash('Message body is required.', 'danger')
+            return redirect(url_for('main.messages'))
+
+        stored = None
+        if attachment and attachment.filename:
+            stored = store_attachment(attachment)
+
+        send_message(owner_id, is_admin, recipient_id, is_recipient_admin, body, subject=subject,
+                     attachment=stored, attachment_path=attachment.filename if stored else None)
         db.session.commit()
         flash('Message sent successfully!', 'success')
         return redirect(url_for('main.messages'))
 
-    # For displaying messages
-    # Admin can see all messages, employees only messages to/from them
-    if current_user.is_authenticated: # Assuming current_user is an Admin
-        sent_messages = Message.query.filter_by(sender_id=current_user.id, is_sender_admin=True).order_by(Message.timestamp.desc()).all()
-        received_messages = Message.query.filter(
-            (Message.recipient_id == current_user.id and Message.is_recipient_admin == True) |
-            (Message.recipient_id == None) # Broadcast messages
-        ).order_by(Message.timestamp.desc()).all()
-    else: # Employee
-        # This part needs to be adjusted based on how employees are logged in and identified
-        # For now, let's assume employee_id is available in session or through a different login
-        employee_id = 1 # Placeholder for employee ID
-        sent_messages = Message.query.filter_by(sender_id=employee_id, is_sender_admin=False).order_by(Message.timestamp.desc()).all()
-        received_messages = Message.query.filter(
-            (Message.recipient_id == employee_id and Message.is_recipient_admin == False) |
-            (Message.recipient_id == None) # Broadcast messages
-        ).order_by(Message.timestamp.desc()).all()
-
-    users = User.query.all()
-    employees = Employee.query.all()
-    return render_template('messages.html', sent_messages=sent_messages, received_messages=received_messages, users=users, employees=employees)
+    sent_messages, next_sent_cursor = keyset_paginate(sent_query(owner_id, is_admin), Message.timestamp, Message.id,
+                                                      request.args.get('sent_cursor'))
+    received_messages, next_received_cursor = keyset_paginate(inbox_query(owner_id, is_admin), Message.timestamp, Message.id,
+                                                              request.args.get('received_cursor'))
+
+    return render_template('messages.html', sent_messages=sent_messages, received_messages=received_messages,
+                           read_ids=read_message_ids(received_messages, owner_id, is_admin),
+                           unread=unread_count(owner_id, is_admin),
+                           next_sent_url=page_url(next_sent_cursor, 'sent_cursor'),
+                           next_received_url=page_url(next_received_cursor, 'received_cursor'))
+
+def mailbox_owner():
+    # Only admins log in for now, so every mailbox here belongs to a User
+    return current_user.id, True
+
+@main.route('/messages/<int:message_id>/attachment')
+@login_required
+def message_attachment(message_id):
+    message = Message.query.get_or_404(message_id)
+    if not message.attachment_id or not can_read(message, *mailbox_owner()):
+        abort(404)
+    return attachment_response(message.attachment, message.attachment_path)
+
+@main.route('/messages/<int:message_id>/read', methods=['POST'])
+@login_required
+def read_message(message_id):
+    message = Message.query.get_or_404(message_id)
+    try:
+        mark_read(message, *mailbox_owner())
+    except ValueError as e:
+        if request.is_json:
+            return jsonify({'status': 'error', 'message': str(e)}), 403
+        flash(str(e), 'danger')
+        return redirect(url_for('main.messages'))
+    db.session.commit()
+    if request.is_json:
+        return jsonify({'status': 'success', 'unread': unread_count(*mailbox_owner())})
+    return redirect(url_for('main.messages'))
+
+@main.route('/api/messages', methods=['GET'])
+@query_budget(3)
+@login_required
+def api_messages():
+    owner_id, is_admin = mailbox_owner()
+    sent = request.args.get('box') == 'sent'
+    query = sent_query(owner_id, is_admin) if sent else inbox_query(owner_id, is_admin)
+    messages, next_cursor = keyset_paginate(query, Message.timestamp, Message.id, request.args.get('cursor'))
+    read_ids = set() if sent else read_message_ids(messages, owner_id, is_admin)
+    items = []
+    for message in messages:
+        item = message.to_dict()
+        if not sent:
+            item['read'] = message.id in read_ids
+        items.append(item)
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@main.route('/api/messages/unread_count', methods=['GET'])
+@query_budget(3)
+@login_required
+def api_unread_messages():
+    return jsonify({'unread': unread_count(*mailbox_owner())})
 
 @main.route('/admin/calendar', methods=['GET', 'POST'])
 @login_required
@@ -346,13 +818,57 @@ def manage_calendar_events():
             event_type=event_type,
             created_by=current_user.id
         )
+        try:
+            set_event_recurrence(event, request.form)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('main.manage_calendar_events'))
         db.session.add(event)
         db.session.commit()
         flash('Calendar event added successfully!', 'success')
         return redirect(url_for('main.manage_calendar_events'))
 
-    events = CalendarEvent.query.order_by(CalendarEvent.start_date.asc()).all()
-    return render_template('admin_calendar.html', events=events)
+    try:
+        window_start, window_end = calendar_window(default_days=90)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('main.manage_calendar_events'))
+    return render_template('admin_calendar.html', occurrences=events_in_window(window_start, window_end),
+                           window_start=window_start, window_end=window_end)
+
+def set_event_recurrence(event, form):
+    event.recurrence = form.get('recurrence') or None
+    event.recurrence_interval = form.get('recurrence_interval', type=int) or 1
+    until_str = form.get('recurrence_until')
+    event.recurrence_until = datetime.strptime(until_str, '%Y-%m-%d').replace(hour=23, minute=59) if until_str else None
+    validate_event(event)
+
+def calendar_window(default_days):
+    # from/to are inclusive dates; the window runs from midnight on from to the end of to
+    from_str, to_str = request.args.get('from'), request.args.get('to')
+    window_start = datetime.strptime(from_str, '%Y-%m-%d') if from_str else datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    window_end = (datetime.strptime(to_str, '%Y-%m-%d') if to_str else window_start + timedelta(days=default_days)) \
+        + timedelta(days=1) - timedelta(microseconds=1)
+    if window_end < window_start:
+        raise ValueError('from must not be after to.')
+    if window_end - window_start > timedelta(days=current_app.config['CALENDAR_MAX_WINDOW_DAYS']):
+        raise ValueError(f"The calendar window cannot exceed {current_app.config['CALENDAR_MAX_WINDOW_DAYS']} days.")
+    return window_start, window_end
+
+@main.route('/api/calendar', methods=['GET'])
+@query_budget(3)
+@login_required
+def api_calendar():
+    try:
+        window_start, window_end = calendar_window(default_days=30)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({
+        'from': window_start.isoformat(),
+        'to': window_end.isoformat(),
+        'items': [occurrence.event.to_dict(occurrence.start_date, occurrence.end_date)
+                  for occurrence in events_in_window(window_start, window_end)]
+    })
 
 @main.route('/admin/calendar/edit/<int:event_id>', methods=['GET', 'POST'])
 @login_required
@@ -364,6 +880,12 @@ def edit_calendar_event(event_id):
         event.start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%dT%H:%M')
         event.end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%dT%H:%M')
         event.event_type = request.form.get('event_type')
+        try:
+            set_event_recurrence(event, request.form)
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return redirect(url_for('main.edit_calendar_event', event_id=event_id))
         db.session.commit()
         flash('Calendar event updated successfully!', 'success')
         return redirect(url_for('main.manage_calendar_events'))
@@ -378,12 +900,6 @@ def delete_calendar_event(event_id):
     flash('Calendar event deleted successfully!', 'success')
     return redirect(url_for('main.manage_calendar_events'))
 
-    new_project = Project(name=name, description=description, billing_method=billing_method, is_active=is_active)
-    db.session.add(new_project)
-    db.session.commit()
-    flash('Project added successfully!', 'success')
-    return redirect(url_for('main.manage_projects'))
-
 @main.route('/admin/projects/edit/<int:project_id>', methods=['POST'])
 @login_required
 def edit_project(project_id):
@@ -406,7 +922,9 @@ def delete_project(project_id):
     return redirect(url_for('main.manage_projects'))
 
 @main.route('/admin/billing_records', methods=['GET', 'POST'])
+@query_budget(4, POST=12)
 @login_required
+@read_replica
 def manage_billing_records():
     if request.method == 'POST':
         project_id = request.form.get('project_id')
@@ -421,56 +939,121 @@ def manage_billing_records():
         start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
 
-        work_reports = WorkReport.query.filter(
-            WorkReport.project_id == project.id,
-            WorkReport.date >= start_date,
-            WorkReport.date <= end_date
-        ).all()
-
-        # Group work reports by employee
-        employee_work = {}
-        for report in work_reports:
-            if report.employee_id not in employee_work:
-                employee_work[report.employee_id] = {'hours': 0, 'units': 0}
-            employee_work[report.employee_id]['hours'] += (report.hours_worked if report.hours_worked else 0)
-            employee_work[report.employee_id]['units'] += (report.units_completed if report.units_completed else 0)
-
-        for employee_id, data in employee_work.items():
-            amount = 0
-            if project.billing_method == 'Hourly':
-                # Assuming a fixed hourly rate for now, or it could be stored in Employee/Project model
-                hourly_rate = 50 # Example rate
-                amount = data['hours'] * hourly_rate
-                billing_record = BillingRecord(
-                    project_id=project.id,
-                    employee_id=employee_id,
-                    start_date=start_date,
-                    end_date=end_date,
-                    hours_billed=data['hours'],
-                    units_billed=None,
-                    amount=amount
-                )
-            elif project.billing_method == 'Count-Based':
-                # Assuming a fixed unit rate for now
-                unit_rate = 5 # Example rate
-                amount = data['units'] * unit_rate
-                billing_record = BillingRecord(
-                    project_id=project.id,
-                    employee_id=employee_id,
-                    start_date=start_date,
-                    end_date=end_date,
-                    hours_billed=None,
-                    units_billed=data['units'],
-                    amount=amount
-                )
-            db.session.add(billing_record)
+        try:
+            count = generate_billing_records(project, start_date, end_date)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('main.manage_billing_records'))
         db.session.commit()
-        flash('Billing records generated successfully!', 'success')
+        flash(f'{count} billing records generated successfully!', 'success')
         return redirect(url_for('main.manage_billing_records'))
 
     projects = Project.query.all()
-    billing_records = BillingRecord.query.join(Project).join(Employee).order_by(BillingRecord.generated_date.desc()).all()
-    return render_template('admin_billing_records.html', projects=projects, billing_records=billing_records)
+    billing_rates = BillingRate.query.options(joinedload(BillingRate.project), joinedload(BillingRate.employee)).order_by(
+        BillingRate.project_id, BillingRate.effective_from.desc()).all()
+    query = BillingRecord.query.join(Project).join(Employee).options(
+        contains_eager(BillingRecord.project), contains_eager(BillingRecord.employee))
+    billing_records, next_cursor = keyset_paginate(query, BillingRecord.generated_date, BillingRecord.id, request.args.get('cursor'))
+    return render_template('admin_billing_records.html', projects=projects,
+                           billing_rates=billing_rates, billing_records=billing_records, next_url=page_url(next_cursor))
+
+@main.route('/admin/billing_records/export')
+@login_required
+@read_replica
+def export_billing_records():
+    query = db.session.query(
+        BillingRecord.id, BillingRecord.project_id, Project.name, BillingRecord.employee_id, Employee.first_name,
+        Employee.last_name, BillingRecord.start_date, BillingRecord.end_date, BillingRecord.hours_billed,
+        BillingRecord.units_billed, BillingRecord.amount, BillingRecord.generated_date
+    ).join(Project, Project.id == BillingRecord.project_id).join(Employee, Employee.id == BillingRecord.employee_id)
+
+    employee_id = request.args.get('employee_id', type=int)
+    project_id = request.args.get('project_id', type=int)
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+    if employee_id:
+        query = query.filter(BillingRecord.employee_id == employee_id)
+    if project_id:
+        query = query.filter(BillingRecord.project_id == project_id)
+    if start_date_str:
+        query = query.filter(BillingRecord.start_date >= datetime.strptime(start_date_str, '%Y-%m-%d').date())
+    if end_date_str:
+        query = query.filter(BillingRecord.end_date <= datetime.strptime(end_date_str, '%Y-%m-%d').date())
+
+    return export_response(query.order_by(BillingRecord.id),
+                           ['id', 'project_id', 'project_name', 'employee_id', 'first_name', 'last_name', 'start_date',
+                            'end_date', 'hours_billed', 'units_billed', 'amount', 'generated_date'],
+                           request.args.get('format', 'csv'), 'billing_records')
+
+@main.route('/api/billing_records', methods=['GET'])
+@query_budget(2)
+@login_required
+@read_replica
+def api_billing_records():
+    billing_records, next_cursor = keyset_paginate(BillingRecord.query, BillingRecord.generated_date, BillingRecord.id,
+                                                   request.args.get('cursor'))
+    return jsonify({'items': [record.to_dict() for record in billing_records], 'next_cursor': next_cursor})
+
+@main.route('/admin/billing_records/run_all', methods=['POST'])
+@login_required
+def run_billing_for_all_projects():
+    start_date_str = request.form.get('start_date')
+    end_date_str = request.form.get('end_date')
+
+    if not start_date_str or not end_date_str:
+        flash('Start date and end date are required to bill all projects.', 'danger')
+        return redirect(url_for('main.manage_billing_records'))
+
+    start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+    end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+    job = start_billing_job(start_date, end_date)
+    flash(f'Billing job #{job.id} is running. Progress: {url_for("main.billing_job_status", job_id=job.id)}', 'info')
+    return redirect(url_for('main.manage_billing_records'))
+
+@main.route('/api/billing/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def billing_job_status(job_id):
+    job = BillingJob.query.get_or_404(job_id)
+    return jsonify({
+        'id': job.id,
+        'status': job.status,
+        'start_date': job.start_date.isoformat(),
+        'end_date': job.end_date.isoformat(),
+        'total_projects': job.total_projects,
+        'completed_projects': job.completed_projects,
+        'failed_projects': job.failed_projects,
+        'records_created': job.records_created,
+        'progress': job.completed_projects / job.total_projects if job.total_projects else 0.0,
+        'error': job.error,
+        'created_date': job.created_date.isoformat(),
+        'finished_date': job.finished_date.isoformat() if job.finished_date else None
+    })
+
+@main.route('/admin/billing_rates/add', methods=['POST'])
+@login_required
+def add_billing_rate():
+    project_id = request.form.get('project_id', type=int)
+    employee_id = request.form.get('employee_id', type=int)
+    rate = request.form.get('rate', type=float)
+    effective_from_str = request.form.get('effective_from')
+    effective_to_str = request.form.get('effective_to')
+
+    if not project_id or rate is None or not effective_from_str:
+        flash('Project, rate, and effective from date are required.', 'danger')
+        return redirect(url_for('main.manage_billing_records'))
+
+    Project.query.get_or_404(project_id)
+    effective_from = datetime.strptime(effective_from_str, '%Y-%m-%d').date()
+    effective_to = datetime.strptime(effective_to_str, '%Y-%m-%d').date() if effective_to_str else None
+    try:
+        set_rate(project_id, employee_id, rate, effective_from, effective_to)
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), 'danger')
+        return redirect(url_for('main.manage_billing_records'))
+    db.session.commit()
+    flash('Billing rate added successfully!', 'success')
+    return redirect(url_for('main.manage_billing_records'))
 
 @main.route('/admin/billing_records/adjust/<int:record_id>', methods=['GET', 'POST'])
 @login_required
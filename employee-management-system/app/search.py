@@ -0,0 +1,121 @@
+import re
+from sqlalchemy import Float, Integer, event, select, text
+from sqlalchemy.dialects.mysql import match
+from app import db
+from app.models import Message, WorkReport
+
+SEARCH_TYPES = ('work_reports', 'messages')
+
+# External-content FTS5 tables over the text columns, kept in step by triggers so ORM writes, bulk inserts
+# and imports are all indexed. FTS5 stores only the inverted index; the text stays in the base table
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS work_report_fts USING fts5(description, content='work_report', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS work_report_fts_insert AFTER INSERT ON work_report BEGIN
+        INSERT INTO work_report_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS work_report_fts_delete AFTER DELETE ON work_report BEGIN
+        INSERT INTO work_report_fts(work_report_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS work_report_fts_update AFTER UPDATE OF description ON work_report BEGIN
+        INSERT INTO work_report_fts(work_report_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO work_report_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(subject, body, content='message', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS message_fts_insert AFTER INSERT ON message BEGIN
+        INSERT INTO message_fts(rowid, subject, body) VALUES (new.id, new.subject, new.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS message_fts_delete AFTER DELETE ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, subject, body) VALUES ('delete', old.id, old.subject, old.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS message_fts_update AFTER UPDATE OF subject, body ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, subject, body) VALUES ('delete', old.id, old.subject, old.body);
+        INSERT INTO message_fts(rowid, subject, body) VALUES (new.id, new.subject, new.body);
+    END""",
+]
+SQLITE_DROP = ['DROP TABLE IF EXISTS work_report_fts', 'DROP TABLE IF EXISTS message_fts']
+SQLITE_REBUILD = ["INSERT INTO work_report_fts(work_report_fts) VALUES ('rebuild')",
+                  "INSERT INTO message_fts(message_fts) VALUES ('rebuild')"]
+
+# InnoDB maintains FULLTEXT indexes itself on every write
+MYSQL_DDL = {
+    'work_report': 'ALTER TABLE work_report ADD FULLTEXT INDEX ix_work_report_description_fulltext (description)',
+    'message': 'ALTER TABLE message ADD FULLTEXT INDEX ix_message_fulltext (subject, body)',
+}
+MYSQL_REBUILD = ['OPTIMIZE TABLE work_report', 'OPTIMIZE TABLE message']
+
+def search_terms(query):
+    """Words of a free-text query, so user input never reaches the index's own query syntax."""
+    return re.findall(r'\w+', query or '')[:16]
+
+def _sqlite_matches(table, terms):
+    # Every term must appear; bm25 is lower for better matches
+    fts_query = ' '.join('"{}"'.format(term) for term in terms)
+    return text(f'SELECT rowid AS id, -bm25({table}) AS score FROM {table} WHERE {table} MATCH :query') \
+        .bindparams(query=fts_query).columns(id=Integer, score=Float).subquery(f'{table}_matches')
+
+def _mysql_matches(model, columns, terms):
+    relevance = match(*columns, against=' '.join(f'+{term}' for term in terms)).in_boolean_mode()
+    return select(model.id.label('id'), relevance.label('score')).where(relevance > 0).subquery()
+
+def _like_matches(model, columns, terms):
+    # Unindexed fallback for other databases: every term somewhere in the text, unranked
+    conditions = [db.or_(*(column.ilike(f'%{term}%') for column in columns)) for term in terms]
+    return select(model.id.label('id'), db.literal(0.0).label('score')).where(*conditions).subquery()
+
+def work_report_matches(terms):
+    """(id, score) of work reports whose description contains every term; higher scores rank first."""
+    dialect = db.session.get_bind(WorkReport).dialect.name
+    if dialect == 'sqlite':
+        return _sqlite_matches('work_report_fts', terms)
+    if dialect == 'mysql':
+        return _mysql_matches(WorkReport, [WorkReport.description], terms)
+    return _like_matches(WorkReport, [WorkReport.description], terms)
+
+def message_matches(terms):
+    """(id, score) of messages whose subject or body contains every term; higher scores rank first."""
+    dialect = db.session.get_bind(Message).dialect.name
+    if dialect == 'sqlite':
+        return _sqlite_matches('message_fts', terms)
+    if dialect == 'mysql':
+        return _mysql_matches(Message, [Message.subject, Message.body], terms)
+    return _like_matches(Message, [Message.subject, Message.body], terms)
+
+def ranked_page(query, score, id_column, page, per_page):
+    """One page of a ranked query and whether another follows.
+
+    Pages use OFFSET rather than a cursor: ranking scores every match anyway, and search is browsed a few
+    pages deep at most.
+    """
+    rows = query.order_by(score.desc(), id_column.desc()).offset((page - 1) * per_page).limit(per_page + 1).all()
+    return rows[:per_page], len(rows) > per_page
+
+def create_search_indexes(connection, tables=None):
+    """Create the full-text indexes; on MySQL only for `tables` (names) when given, i.e. freshly created ones."""
+    if connection.dialect.name == 'sqlite':
+        statements = SQLITE_DDL
+    elif connection.dialect.name == 'mysql':
+        statements = [ddl for table, ddl in MYSQL_DDL.items() if tables is None or table in tables]
+    else:
+        statements = []
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+def rebuild_search_indexes(connection):
+    """Reindex every row from the base tables, e.g. after restoring a dump taken without the index tables."""
+    statements = {'sqlite': SQLITE_REBUILD, 'mysql': MYSQL_REBUILD}.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+def _after_create(metadata, connection, tables=(), **kw):
+    create_search_indexes(connection, {table.name for table in tables})
+
+def _before_drop(metadata, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        for statement in SQLITE_DROP:
+            connection.exec_driver_sql(statement)
+
+def init_search():
+    # db.create_all() sets up the indexes too; migrations do the same for existing databases
+    if not event.contains(db.metadata, 'after_create', _after_create):
+        event.listen(db.metadata, 'after_create', _after_create)
+        event.listen(db.metadata, 'before_drop', _before_drop)
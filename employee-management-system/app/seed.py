@@ -0,0 +1,172 @@
+import random
+from datetime import datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import insert
+from app import db
+from app.billing import generate_billing_records
+from app.models import (Attendance, BillingRecord, BroadcastTotal, CalendarEvent, Employee, LeaveRequest, Mailbox,
+                        Message, OpenShift, Project, User, WorkReport)
+from app.rollups import rebuild_rollup
+
+FIRST_NAMES = ['Ada', 'Grace', 'Alan', 'Edsger', 'Barbara', 'Donald', 'Frances', 'John', 'Katherine', 'Linus',
+               'Margaret', 'Niklaus', 'Radia', 'Ken', 'Sophie', 'Tim', 'Yukihiro', 'Guido', 'Hedy', 'Dennis']
+LAST_NAMES = ['Lovelace', 'Hopper', 'Turing', 'Dijkstra', 'Liskov', 'Knuth', 'Allen', 'McCarthy', 'Johnson',
+              'Torvalds', 'Hamilton', 'Wirth', 'Perlman', 'Thompson', 'Wilson', 'Berners-Lee', 'Matsumoto',
+              'van Rossum', 'Lamarr', 'Ritchie']
+DEPARTMENTS = ['Engineering', 'Operations', 'Sales', 'Finance', 'Support', 'Warehouse']
+LEAVE_TYPES = ['Annual Leave', 'Sick Leave', 'Unpaid Leave', 'Other']
+HOLIDAYS = [("New Year's Day", 1, 1), ('Labour Day', 5, 1), ('Christmas Day', 12, 25), ('Boxing Day', 12, 26)]
+
+class _Writer:
+    """Buffers rows per table and writes them with multi-row Core inserts, one commit per batch."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, model, row):
+        rows = self.pending.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        for table_model in ([model] if model else list(self.pending)):
+            rows = self.pending.pop(table_model, [])
+            if rows:
+                db.session.execute(insert(table_model.__table__), rows)
+                db.session.commit()
+                self.counts[table_model.__tablename__] = self.counts.get(table_model.__tablename__, 0) + len(rows)
+
+def _workdays(start, end):
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+def seed_database(employees, years, projects=None, seed=42, echo=print):
+    """Fill an empty database with a deterministic synthetic workload for benchmarks.
+
+    Writes employees, projects, attendance, work reports, leave, messages, calendar rules and monthly billing for
+    the last `years` years with bulk inserts, then rebuilds the derived tables (open shifts, daily rollup,
+    mailbox counters) that the normal write paths would have maintained. Returns row counts per table.
+    """
+    if Employee.query.first() is not None:
+        raise ValueError('The database already has employees; seed an empty database.')
+    rng = random.Random(seed)
+    writer = _Writer(current_app.config['IMPORT_BATCH_SIZE'])
+    projects = projects or max(5, employees // 50)
+    today = datetime.utcnow().date()
+    first_day = today - timedelta(days=365 * years)
+
+    admin = User.query.filter_by(username='admin').first()
+    if admin is None:
+        admin = User(username='admin')
+        admin.set_password('admin')
+        db.session.add(admin)
+        db.session.commit()
+        echo('Created admin user "admin" with password "admin".')
+
+    for i in range(1, employees + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        writer.add(Employee, {'first_name': first, 'last_name': last,
+                              'email': f'{first}.{last}.{i}@example.com'.lower().replace(' ', ''),
+                              'department': rng.choice(DEPARTMENTS), 'is_active': rng.random() > 0.05})
+    for i in range(1, projects + 1):
+        writer.add(Project, {'name': f'Project {i}', 'description': f'Synthetic project {i}',
+                             'billing_method': 'Hourly' if i % 3 else 'Count-Based', 'is_active': i % 10 != 0})
+    writer.flush()
+    employee_ids = [row[0] for row in db.session.query(Employee.id).order_by(Employee.id)]
+    project_rows = db.session.query(Project.id, Project.billing_method).order_by(Project.id).all()
+    echo(f'{len(employee_ids)} employees and {len(project_rows)} projects.')
+
+    # Each employee works mostly on one home project, occasionally on another
+    home_project = {employee_id: rng.choice(project_rows) for employee_id in employee_ids}
+    modified = datetime.utcnow()
+    for day in _workdays(first_day, today - timedelta(days=1)):
+        if day.month != (day - timedelta(days=3)).month and day.month == 1:
+            echo(f'Generating attendance and work reports from {day}.')
+        for employee_id in employee_ids:
+            if rng.random() < 0.08:
+                continue
+            clock_in = datetime.combine(day, time(8)) + timedelta(minutes=rng.randrange(120))
+            hours = rng.choice([6, 7, 7.5, 8, 8, 8, 8.5, 9])
+            writer.add(Attendance, {'employee_id': employee_id, 'clock_in_time': clock_in,
+                                    'clock_out_time': clock_in + timedelta(hours=hours)})
+            project_id, billing_method = home_project[employee_id] if rng.random() < 0.9 else rng.choice(project_rows)
+            writer.add(WorkReport, {
+                'employee_id': employee_id, 'project_id': project_id, 'date': day,
+                'hours_worked': hours if billing_method == 'Hourly' else None,
+                'units_completed': rng.randrange(5, 60) if billing_method != 'Hourly' else None,
+                'description': 'Synthetic work', 'modified_date': modified,
+            })
+    # A share of the staff is clocked in right now
+    for employee_id in employee_ids:
+        if rng.random() < 0.3:
+            writer.add(Attendance, {'employee_id': employee_id, 'clock_out_time': None,
+                                    'clock_in_time': datetime.combine(today, time(8)) + timedelta(minutes=rng.randrange(120))})
+
+    for employee_id in employee_ids:
+        for _ in range(3 * years):
+            start = first_day + timedelta(days=rng.randrange(365 * years + 60))
+            status = 'Pending' if start > today else rng.choice(['Approved', 'Approved', 'Approved', 'Rejected'])
+            writer.add(LeaveRequest, {'employee_id': employee_id, 'start_date': start,
+                                      'end_date': start + timedelta(days=rng.randrange(1, 6)),
+                                      'leave_type': rng.choice(LEAVE_TYPES), 'status': status,
+                                      'request_date': datetime.combine(start - timedelta(days=rng.randrange(7, 60)), time(12))})
+
+    for week in range(52 * years):
+        writer.add(Message, {'sender_id': admin.id, 'is_sender_admin': True, 'recipient_id': None,
+                             'is_recipient_admin': None, 'subject': f'Weekly update {week + 1}',
+                             'body': 'Company news for the week.',
+                             'timestamp': datetime.combine(first_day + timedelta(weeks=week), time(9))})
+    for _ in range(5 * years * len(employee_ids)):
+        writer.add(Message, {'sender_id': admin.id, 'is_sender_admin': True, 'recipient_id': rng.choice(employee_ids),
+                             'is_recipient_admin': False, 'subject': 'Hello', 'body': 'A direct message.',
+                             'timestamp': datetime.combine(first_day + timedelta(days=rng.randrange(365 * years)), time(10))})
+
+    for title, month, day in HOLIDAYS:
+        writer.add(CalendarEvent, {'title': title, 'start_date': datetime(first_day.year, month, day),
+                                   'end_date': datetime(first_day.year, month, day, 23, 59), 'event_type': 'Holiday',
+                                   'recurrence': 'yearly', 'recurrence_interval': 1, 'created_by': None})
+    monday = first_day - timedelta(days=first_day.weekday())
+    writer.add(CalendarEvent, {'title': 'All hands', 'start_date': datetime.combine(monday, time(10)),
+                               'end_date': datetime.combine(monday, time(11)), 'event_type': 'Company Event',
+                               'recurrence': 'weekly', 'recurrence_interval': 1, 'created_by': admin.id})
+    writer.flush()
+
+    # Derived tables the ORM write paths would normally keep up to date
+    db.session.execute(insert(OpenShift).from_select(
+        ['employee_id', 'attendance_id', 'clock_in_time'],
+        db.select(Attendance.employee_id, Attendance.id, Attendance.clock_in_time).where(Attendance.clock_out_time.is_(None))
+    ))
+    db.session.execute(insert(Mailbox).from_select(
+        ['owner_id', 'is_admin', 'unread_count', 'broadcasts_read'],
+        db.select(Message.recipient_id, Message.is_recipient_admin, db.func.count(Message.id), db.literal(0))
+        .where(Message.recipient_id.isnot(None)).group_by(Message.recipient_id, Message.is_recipient_admin)
+    ))
+    broadcasts = db.select(Message.id).where(Message.recipient_id.is_(None)).subquery()
+    BroadcastTotal.query.filter_by(id=1).update({
+        BroadcastTotal.count: db.select(db.func.count()).select_from(broadcasts).scalar_subquery(),
+        BroadcastTotal.last_id: db.select(db.func.coalesce(db.func.max(broadcasts.c.id), 0)).scalar_subquery(),
+    }, synchronize_session=False)
+    # The admin sent every broadcast, and your own broadcasts are never unread
+    Mailbox.query.filter_by(owner_id=admin.id, is_admin=True).update(
+        {Mailbox.broadcasts_read: Mailbox.broadcasts_read + 52 * years}, synchronize_session=False)
+    rebuild_rollup()
+    db.session.commit()
+
+    month = first_day.replace(day=1)
+    while month < today.replace(day=1):
+        month_end = (month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        for project in Project.query.all():
+            generate_billing_records(project, month, month_end)
+        db.session.commit()
+        month = month_end + timedelta(days=1)
+
+    counts = dict(writer.counts)
+    counts['billing_record'] = BillingRecord.query.count()
+    counts['open_shift'] = OpenShift.query.count()
+    return counts
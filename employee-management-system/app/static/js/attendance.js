@@ -54,4 +54,24 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 
     updateAttendanceUI(); // Initial UI setup
+
+    // Follow punches made elsewhere (another kiosk, an admin) without polling
+    if (window.EventSource) {
+        const stream = new EventSource(`/api/attendance/stream?employee_id=${encodeURIComponent(employeeId)}`);
+        stream.addEventListener('snapshot', function(event) {
+            const employees = JSON.parse(event.data).employees;
+            if (employees.length) {
+                isCurrentlyClockedIn = employees[0].clocked_in;
+                updateAttendanceUI();
+            }
+        });
+        stream.addEventListener('clock_in', function() {
+            isCurrentlyClockedIn = true;
+            updateAttendanceUI();
+        });
+        stream.addEventListener('clock_out', function() {
+            isCurrentlyClockedIn = false;
+            updateAttendanceUI();
+        });
+    }
 });
\ No newline at end of file
@@ -0,0 +1,51 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const board = document.getElementById('attendanceBoard');
+    const liveStatus = document.getElementById('liveStatus');
+
+    function formatTime(isoTime) {
+        return isoTime ? isoTime.replace('T', ' ').slice(0, 19) : 'N/A';
+    }
+
+    function renderRow(row, clockedIn, clockInTime) {
+        const badge = row.querySelector('.status-badge');
+        badge.textContent = clockedIn ? 'Clocked In' : 'Clocked Out';
+        badge.classList.toggle('bg-success', clockedIn);
+        badge.classList.toggle('bg-danger', !clockedIn);
+        row.querySelector('.clock-in-time').textContent = clockedIn ? formatTime(clockInTime) : 'N/A';
+    }
+
+    function rowFor(employeeId) {
+        return board.querySelector(`tr[data-employee-id="${employeeId}"]`);
+    }
+
+    const stream = new EventSource('/api/attendance/stream');
+    stream.addEventListener('open', function() {
+        liveStatus.textContent = 'Live';
+        liveStatus.className = 'badge bg-success';
+    });
+    stream.addEventListener('error', function() {
+        liveStatus.textContent = 'Reconnecting';
+        liveStatus.className = 'badge bg-secondary';
+    });
+    stream.addEventListener('snapshot', function(event) {
+        for (const employee of JSON.parse(event.data).employees) {
+            const row = rowFor(employee.employee_id);
+            if (row) {
+                renderRow(row, employee.clocked_in, employee.clock_in_time);
+            }
+        }
+    });
+    stream.addEventListener('clock_in', function(event) {
+        const punch = JSON.parse(event.data);
+        const row = rowFor(punch.employee_id);
+        if (row) {
+            renderRow(row, true, punch.time);
+        }
+    });
+    stream.addEventListener('clock_out', function(event) {
+        const row = rowFor(JSON.parse(event.data).employee_id);
+        if (row) {
+            renderRow(row, false, null);
+        }
+    });
+});
@@ -0,0 +1,109 @@
+// Typeahead pickers: <div class="picker" data-source="/api/..."> holding a text input (.picker-query), an
+// optional hidden input that receives the chosen id, and a .picker-results list. With data-href the choice
+// navigates instead, {id} in the URL replaced by the chosen id. A form will not submit a picker whose text was
+// typed but never matched to a choice.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.picker').forEach(function(picker) {
+        const query = picker.querySelector('.picker-query');
+        const hidden = picker.querySelector('input[type="hidden"]');
+        const results = picker.querySelector('.picker-results');
+        let timer = null;
+        let request = 0;
+        let active = -1;
+
+        function close() {
+            results.innerHTML = '';
+            active = -1;
+        }
+
+        function choose(item) {
+            if (picker.dataset.href) {
+                window.location.href = picker.dataset.href.replace('{id}', item.id);
+                return;
+            }
+            query.value = item.name;
+            hidden.value = item.id;
+            query.setCustomValidity('');
+            close();
+        }
+
+        function render(items) {
+            close();
+            items.forEach(function(item) {
+                const option = document.createElement('button');
+                option.type = 'button';
+                option.className = 'list-group-item list-group-item-action';
+                option.textContent = item.name;
+                const details = [item.department, item.email].filter(Boolean).join(' · ');
+                if (details) {
+                    const small = document.createElement('small');
+                    small.className = 'text-muted ms-2';
+                    small.textContent = details;
+                    option.appendChild(small);
+                }
+                // mousedown fires before the input's blur closes the list
+                option.addEventListener('mousedown', function(event) {
+                    event.preventDefault();
+                    choose(item);
+                });
+                results.appendChild(option);
+            });
+        }
+
+        function lookup() {
+            const current = ++request;
+            const separator = picker.dataset.source.includes('?') ? '&' : '?';
+            fetch(picker.dataset.source + separator + 'q=' + encodeURIComponent(query.value.trim()))
+                .then(response => response.json())
+                .then(data => {
+                    // Ignore answers to keystrokes that have been typed over since
+                    if (current === request && document.activeElement === query) {
+                        render(data.items || []);
+                    }
+                })
+                .catch(error => console.error('Error:', error));
+        }
+
+        function highlight(index) {
+            const options = results.children;
+            if (!options.length) {
+                return;
+            }
+            active = (index + options.length) % options.length;
+            Array.from(options).forEach((option, i) => option.classList.toggle('active', i === active));
+        }
+
+        query.addEventListener('input', function() {
+            if (hidden) {
+                hidden.value = '';
+            }
+            query.setCustomValidity('');
+            clearTimeout(timer);
+            timer = setTimeout(lookup, 150);
+        });
+        query.addEventListener('focus', lookup);
+        query.addEventListener('blur', close);
+        query.addEventListener('keydown', function(event) {
+            if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+                event.preventDefault();
+                highlight(active + (event.key === 'ArrowDown' ? 1 : -1));
+            } else if (event.key === 'Enter' && active >= 0) {
+                event.preventDefault();
+                results.children[active].dispatchEvent(new MouseEvent('mousedown'));
+            } else if (event.key === 'Escape') {
+                close();
+            }
+        });
+
+        // Only a named hidden input is submitted, e.g. the recipient picker of the chosen recipient type
+        if (hidden && hidden.form) {
+            hidden.form.addEventListener('submit', function(event) {
+                if (hidden.name && !hidden.value && query.value.trim()) {
+                    event.preventDefault();
+                    query.setCustomValidity('Choose one of the suggestions.');
+                    query.reportValidity();
+                }
+            });
+        }
+    });
+});
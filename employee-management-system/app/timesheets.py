@@ -0,0 +1,133 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from app import db
+from app.archive import attendance_history
+from app.models import WorkReportDailyRollup
+
+def _midnight(day):
+    return datetime.combine(day, datetime.min.time())
+
+def fetch_shifts(window_start, window_end, max_shift, employee_ids=None):
+    """(employee_id, clock_in, clock_out) tuples for shifts that can reach into the window, hot or archived.
+
+    Only columns are fetched, over the clock-in indexes: a shift that counts must start no earlier than
+    `max_shift` before the window because longer ones are capped.
+    """
+    history = attendance_history(window_start - max_shift, window_end, employee_ids)
+    return [(employee_id, clock_in, clock_out) for _, employee_id, clock_in, clock_out in db.session.execute(history)]
+
+def worked_seconds(shifts, window_start, window_end, max_shift, now):
+    """Seconds worked per employee and calendar day, in one pass over each employee's shifts by clock-in.
+
+    Open shifts run until `now`, and every shift is capped at `max_shift` so a forgotten clock-out cannot add
+    unbounded hours. Overlapping shifts of one employee are merged so no time is counted twice. Time is
+    clipped to the window and split at midnight, so a night shift counts towards both days it touches.
+    Returns ({employee_id: {date: seconds}}, {employee_id: stats}), stats counting open, capped and
+    overlapping shifts and the overlapping seconds dropped.
+    """
+    by_employee = defaultdict(list)
+    for employee_id, clock_in, clock_out in shifts:
+        by_employee[employee_id].append((clock_in, clock_out))
+
+    days, stats = {}, {}
+    for employee_id, employee_shifts in by_employee.items():
+        employee_shifts.sort(key=lambda shift: shift[0])
+        employee_days = defaultdict(float)
+        counts = {'open_shifts': 0, 'capped_shifts': 0, 'overlapping_shifts': 0, 'overlap_seconds': 0.0}
+        merged_start = merged_end = None
+        intervals = []
+        for clock_in, clock_out in employee_shifts:
+            end = clock_out
+            if end is None:
+                counts['open_shifts'] += 1
+                end = now
+            if end - clock_in > max_shift:
+                counts['capped_shifts'] += 1
+                end = clock_in + max_shift
+            if end <= clock_in:
+                continue
+            if merged_end is not None and clock_in < merged_end:
+                counts['overlapping_shifts'] += 1
+                counts['overlap_seconds'] += (min(end, merged_end) - clock_in).total_seconds()
+                merged_end = max(merged_end, end)
+                continue
+            if merged_end is not None:
+                intervals.append((merged_start, merged_end))
+            merged_start, merged_end = clock_in, end
+        if merged_end is not None:
+            intervals.append((merged_start, merged_end))
+
+        for start, end in intervals:
+            start, end = max(start, window_start), min(end, window_end)
+            while start < end:
+                day = start.date()
+                if end.date() == day:
+                    employee_days[day] += (end - start).total_seconds()
+                    break
+                next_midnight = _midnight(day + timedelta(days=1))
+                employee_days[day] += (next_midnight - start).total_seconds()
+                start = next_midnight
+        if employee_days:
+            days[employee_id] = employee_days
+            stats[employee_id] = counts
+    return days, stats
+
+def reported_hours(start_date, end_date, employee_ids=None):
+    """WorkReport hours per employee and day, summed from the daily rollup."""
+    query = db.session.query(
+        WorkReportDailyRollup.employee_id, WorkReportDailyRollup.date, db.func.sum(WorkReportDailyRollup.total_hours)
+    ).filter(WorkReportDailyRollup.date >= start_date, WorkReportDailyRollup.date <= end_date)
+    if employee_ids:
+        query = query.filter(WorkReportDailyRollup.employee_id.in_(employee_ids))
+    reported = defaultdict(dict)
+    for employee_id, day, hours in query.group_by(WorkReportDailyRollup.employee_id, WorkReportDailyRollup.date):
+        if hours:
+            reported[employee_id][day] = hours
+    return reported
+
+def build_timesheets(start_date, end_date, employee_ids=None, max_shift_hours=24, crosscheck=False, tolerance_hours=0.25,
+                     now=None):
+    """Hours worked per employee per day and per ISO week (starting Monday) for the inclusive date range.
+
+    With `crosscheck`, each day also carries the WorkReport hours for it, and days where the two differ by
+    more than `tolerance_hours` are listed as discrepancies.
+    """
+    now = now or datetime.utcnow()
+    window_start, window_end = _midnight(start_date), _midnight(end_date + timedelta(days=1))
+    max_shift = timedelta(hours=max_shift_hours)
+    days, stats = worked_seconds(fetch_shifts(window_start, window_end, max_shift, employee_ids),
+                                 window_start, window_end, max_shift, now)
+    reported = reported_hours(start_date, end_date, employee_ids) if crosscheck else {}
+
+    timesheets = []
+    for employee_id in sorted(set(days) | set(reported)):
+        worked = {day: seconds / 3600 for day, seconds in days.get(employee_id, {}).items()}
+        employee_reported = reported.get(employee_id, {})
+        weeks = defaultdict(float)
+        day_rows, discrepancies = [], []
+        for day in sorted(set(worked) | set(employee_reported)):
+            hours = worked.get(day, 0.0)
+            weeks[day - timedelta(days=day.weekday())] += hours
+            row = {'date': day.isoformat(), 'hours': round(hours, 2)}
+            if crosscheck:
+                row['reported_hours'] = round(employee_reported.get(day, 0.0), 2)
+                if abs(hours - employee_reported.get(day, 0.0)) > tolerance_hours:
+                    discrepancies.append(day.isoformat())
+            day_rows.append(row)
+        counts = stats.get(employee_id, {'open_shifts': 0, 'capped_shifts': 0, 'overlapping_shifts': 0,
+                                         'overlap_seconds': 0.0})
+        timesheet = {
+            'employee_id': employee_id,
+            'total_hours': round(sum(worked.values()), 2),
+            'days': day_rows,
+            'weeks': [{'week_start': week.isoformat(), 'hours': round(hours, 2)} for week, hours in sorted(weeks.items())],
+            'open_shifts': counts['open_shifts'],
+            'capped_shifts': counts['capped_shifts'],
+            'overlapping_shifts': counts['overlapping_shifts'],
+            'overlap_hours': round(counts['overlap_seconds'] / 3600, 2),
+        }
+        if crosscheck:
+            timesheet['reported_hours'] = round(sum(employee_reported.values()), 2)
+            timesheet['discrepancies'] = discrepancies
+        timesheets.append(timesheet)
+    return timesheets
@@ -7,4 +7,96 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'a_very_secret_key_that_should_be_changed'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         f"mysql+pymysql://{os.environ.get('DATABASE_USER')}:{os.environ.get('DATABASE_PASSWORD')}@{os.environ.get('DATABASE_HOST')}/{os.environ.get('DATABASE_NAME')}"
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool per worker process for MySQL/PostgreSQL (SQLite ignores these). Connections are pinged on
+    # checkout and recycled before MySQL's wait_timeout closes them on the server side
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT') or 10)
+    # Optional read replica for report listings and exports; unset, they read from the primary
+    REPORTS_DATABASE_URL = os.environ.get('REPORTS_DATABASE_URL')
+
+    # Rows per page for the keyset-paginated admin lists and JSON endpoints
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE') or 50)
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE') or 500)
+    # Rows fetched from the server-side cursor per chunk when streaming an export
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)
+    # Rows inserted per transaction by the work report CSV import, and how many row errors are kept for the report
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE') or 5000)
+    IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS') or 1000)
+
+    # Raise instead of logging when a view exceeds its @query_budget; tests turn this on
+    QUERY_BUDGET_ENFORCE = os.environ.get('QUERY_BUDGET_ENFORCE', 'false').lower() == 'true'
+
+    # Used when a project has no BillingRate in effect for the billed date
+    BILLING_DEFAULT_HOURLY_RATE = float(os.environ.get('BILLING_DEFAULT_HOURLY_RATE') or 50)
+    BILLING_DEFAULT_UNIT_RATE = float(os.environ.get('BILLING_DEFAULT_UNIT_RATE') or 5)
+    # Projects billed concurrently by a background billing job, each on its own DB connection
+    BILLING_JOB_WORKERS = int(os.environ.get('BILLING_JOB_WORKERS') or 4)
+    # Seconds after which a Pending or Running billing job counts as dead and the period can be billed again
+    BILLING_JOB_TIMEOUT = int(os.environ.get('BILLING_JOB_TIMEOUT') or 3600)
+
+    # Seconds a dashboard counter may be served from cache; writes in this process invalidate it immediately
+    DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL') or 30)
+
+    # How new passwords are hashed: 'bcrypt' (cost PASSWORD_BCRYPT_ROUNDS) or a werkzeug method such as
+    # 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'. Weaker stored hashes are upgraded on the next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'bcrypt'
+    PASSWORD_BCRYPT_ROUNDS = int(os.environ.get('PASSWORD_BCRYPT_ROUNDS') or 12)
+    # Login password checks run on this many threads; beyond PASSWORD_VERIFY_QUEUE waiting checks, logins get a 503
+    PASSWORD_VERIFY_WORKERS = int(os.environ.get('PASSWORD_VERIFY_WORKERS') or 2)
+    PASSWORD_VERIFY_QUEUE = int(os.environ.get('PASSWORD_VERIFY_QUEUE') or 16)
+    PASSWORD_VERIFY_TIMEOUT = float(os.environ.get('PASSWORD_VERIFY_TIMEOUT') or 10)
+
+    # Seconds a logged-in user's identity is reused across requests instead of reloaded; 0 reloads every request.
+    # Changes committed in this process evict it at once, so the TTL only delays changes made by other processes
+    LOGIN_CACHE_TTL = float(os.environ.get('LOGIN_CACHE_TTL') or 60)
+    LOGIN_CACHE_SIZE = int(os.environ.get('LOGIN_CACHE_SIZE') or 1024)
+
+    # Content-addressed message attachments: where blobs live, the upload copy chunk size and how long
+    # clients may cache a download (blobs never change once written)
+    ATTACHMENT_DIR = os.environ.get('ATTACHMENT_DIR') or os.path.join(os.path.abspath(os.path.dirname(__file__)), 'attachments')
+    ATTACHMENT_CHUNK_SIZE = int(os.environ.get('ATTACHMENT_CHUNK_SIZE') or 64 * 1024)
+    ATTACHMENT_MAX_AGE = int(os.environ.get('ATTACHMENT_MAX_AGE') or 86400)
+    # Reject request bodies above this many bytes before they are parsed
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 100 * 1024 * 1024)
+
+    # Longest a single calendar event may last; bounds the index range scanned for a window
+    CALENDAR_MAX_EVENT_DAYS = int(os.environ.get('CALENDAR_MAX_EVENT_DAYS') or 366)
+    # Widest window /api/calendar will expand recurring events over
+    CALENDAR_MAX_WINDOW_DAYS = int(os.environ.get('CALENDAR_MAX_WINDOW_DAYS') or 731)
+
+    # Coalesce clock-in/clock-out writes into batched transactions during shift-change bursts
+    ATTENDANCE_GROUP_COMMIT = os.environ.get('ATTENDANCE_GROUP_COMMIT', 'false').lower() == 'true'
+    ATTENDANCE_FLUSH_INTERVAL_MS = int(os.environ.get('ATTENDANCE_FLUSH_INTERVAL_MS') or 50)
+    ATTENDANCE_FLUSH_MAX_EVENTS = int(os.environ.get('ATTENDANCE_FLUSH_MAX_EVENTS') or 500)
+    # 'flush' acknowledges a punch once it is committed; 'enqueue' acknowledges immediately
+    # and loses queued punches if the worker dies before the next flush
+    ATTENDANCE_ACK_MODE = os.environ.get('ATTENDANCE_ACK_MODE') or 'flush'
+    ATTENDANCE_ACK_TIMEOUT = float(os.environ.get('ATTENDANCE_ACK_TIMEOUT') or 10)
+    # Months of closed shifts `flask attendance archive` leaves in the attendance table
+    ATTENDANCE_ARCHIVE_MONTHS = int(os.environ.get('ATTENDANCE_ARCHIVE_MONTHS') or 24)
+
+    # /api/attendance/stream: punches kept for reconnecting or slow clients, and seconds between keepalives.
+    # Each open stream holds a worker; serve wallboards from a gevent worker (gunicorn -k gevent) so thousands
+    # of streams fit in one process. Punches committed by other processes reach streams within RESYNC seconds,
+    # at one open_shift query per process each time; 0 turns that off for single-process deployments
+    ATTENDANCE_STREAM_HISTORY = int(os.environ.get('ATTENDANCE_STREAM_HISTORY') or 1000)
+    ATTENDANCE_STREAM_KEEPALIVE = float(os.environ.get('ATTENDANCE_STREAM_KEEPALIVE') or 15)
+    ATTENDANCE_STREAM_RESYNC = float(os.environ.get('ATTENDANCE_STREAM_RESYNC') or 5)
+
+    # /api/timesheets: longest range per call, the most hours one shift can count (open or forgotten clock-outs
+    # are capped here) and how far attended and reported hours may differ before a day is flagged
+    TIMESHEET_MAX_DAYS = int(os.environ.get('TIMESHEET_MAX_DAYS') or 190)
+    TIMESHEET_MAX_SHIFT_HOURS = float(os.environ.get('TIMESHEET_MAX_SHIFT_HOURS') or 24)
+    TIMESHEET_TOLERANCE_HOURS = float(os.environ.get('TIMESHEET_TOLERANCE_HOURS') or 0.25)
+
+    # Typeahead pickers: seconds the in-memory employee/user prefix index is reused (changes committed in this
+    # process rebuild it at once, so the TTL only delays other processes' changes), and results per lookup
+    DIRECTORY_INDEX_TTL = float(os.environ.get('DIRECTORY_INDEX_TTL') or 300)
+    DIRECTORY_SEARCH_LIMIT = int(os.environ.get('DIRECTORY_SEARCH_LIMIT') or 10)
+    DIRECTORY_SEARCH_MAX_LIMIT = int(os.environ.get('DIRECTORY_SEARCH_MAX_LIMIT') or 50)
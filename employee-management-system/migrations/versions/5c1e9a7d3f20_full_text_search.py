@@ -0,0 +1,76 @@
+"""Full-text search
+
+Revision ID: 5c1e9a7d3f20
+Revises: 40ab59b527d2
+Create Date: 2026-10-18 06:20:41.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e9a7d3f20'
+down_revision = '40ab59b527d2'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE work_report_fts USING fts5(description, content='work_report', content_rowid='id')",
+    """CREATE TRIGGER work_report_fts_insert AFTER INSERT ON work_report BEGIN
+        INSERT INTO work_report_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    """CREATE TRIGGER work_report_fts_delete AFTER DELETE ON work_report BEGIN
+        INSERT INTO work_report_fts(work_report_fts, rowid, description) VALUES ('delete', old.id, old.description);
+    END""",
+    """CREATE TRIGGER work_report_fts_update AFTER UPDATE OF description ON work_report BEGIN
+        INSERT INTO work_report_fts(work_report_fts, rowid, description) VALUES ('delete', old.id, old.description);
+        INSERT INTO work_report_fts(rowid, description) VALUES (new.id, new.description);
+    END""",
+    "CREATE VIRTUAL TABLE message_fts USING fts5(subject, body, content='message', content_rowid='id')",
+    """CREATE TRIGGER message_fts_insert AFTER INSERT ON message BEGIN
+        INSERT INTO message_fts(rowid, subject, body) VALUES (new.id, new.subject, new.body);
+    END""",
+    """CREATE TRIGGER message_fts_delete AFTER DELETE ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, subject, body) VALUES ('delete', old.id, old.subject, old.body);
+    END""",
+    """CREATE TRIGGER message_fts_update AFTER UPDATE OF subject, body ON message BEGIN
+        INSERT INTO message_fts(message_fts, rowid, subject, body) VALUES ('delete', old.id, old.subject, old.body);
+        INSERT INTO message_fts(rowid, subject, body) VALUES (new.id, new.subject, new.body);
+    END""",
+    # Index the rows that are already there
+    "INSERT INTO work_report_fts(work_report_fts) VALUES ('rebuild')",
+    "INSERT INTO message_fts(message_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER work_report_fts_insert',
+    'DROP TRIGGER work_report_fts_delete',
+    'DROP TRIGGER work_report_fts_update',
+    'DROP TABLE work_report_fts',
+    'DROP TRIGGER message_fts_insert',
+    'DROP TRIGGER message_fts_delete',
+    'DROP TRIGGER message_fts_update',
+    'DROP TABLE message_fts',
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == 'mysql':
+        op.execute('ALTER TABLE work_report ADD FULLTEXT INDEX ix_work_report_description_fulltext (description)')
+        op.execute('ALTER TABLE message ADD FULLTEXT INDEX ix_message_fulltext (subject, body)')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == 'mysql':
+        op.execute('ALTER TABLE message DROP INDEX ix_message_fulltext')
+        op.execute('ALTER TABLE work_report DROP INDEX ix_work_report_description_fulltext')
@@ -0,0 +1,33 @@
+"""Widen user.password_hash for scrypt hashes
+
+Revision ID: 9e3b1c7a5d42
+Revises: 5c1e9a7d3f20
+Create Date: 2026-10-18 07:02:13.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3b1c7a5d42'
+down_revision = '5c1e9a7d3f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=128),
+               type_=sa.String(length=255),
+               existing_nullable=False)
+
+
+def downgrade():
+    # Hashes longer than 128 characters would not fit back; reset those passwords before downgrading
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=128),
+               existing_nullable=False)
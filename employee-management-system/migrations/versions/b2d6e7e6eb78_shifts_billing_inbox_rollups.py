@@ -0,0 +1,222 @@
+"""Open shifts, billing jobs, inbox and rollup tables
+
+Revision ID: b2d6e7e6eb78
+Revises: a0c4d2e1b3f5
+Create Date: 2026-10-18 05:39:47.582742
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2d6e7e6eb78'
+down_revision = 'a0c4d2e1b3f5'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL = [
+    # The latest open row per employee, which is the one clock_out closes
+    """INSERT INTO open_shift (employee_id, attendance_id, clock_in_time)
+       SELECT employee_id, id, clock_in_time FROM attendance
+       WHERE id IN (SELECT max(id) FROM attendance WHERE clock_out_time IS NULL GROUP BY employee_id)""",
+    """INSERT INTO work_report_daily_rollup (employee_id, project_id, date, total_hours, total_units, report_count)
+       SELECT employee_id, project_id, date, coalesce(sum(hours_worked), 0), coalesce(sum(units_completed), 0), count(id)
+       FROM work_report GROUP BY employee_id, project_id, date""",
+]
+
+# There was no read state before, so existing accounts start with everything read
+MAILBOX_BACKFILL = """INSERT INTO mailbox (owner_id, is_admin, unread_count, broadcasts_read)
+    SELECT id, {is_admin}, 0, (SELECT count(id) FROM message WHERE recipient_id IS NULL) FROM {owners}"""
+
+
+def upgrade():
+    op.create_table('attachment',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('content_type', sa.String(length=128), nullable=False),
+    sa.Column('created_date', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sha256')
+    )
+    op.create_table('billing_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=64), nullable=False),
+    sa.Column('total_projects', sa.Integer(), nullable=False),
+    sa.Column('completed_projects', sa.Integer(), nullable=False),
+    sa.Column('failed_projects', sa.Integer(), nullable=False),
+    sa.Column('records_created', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_date', sa.DateTime(), nullable=False),
+    sa.Column('finished_date', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('mailbox',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('is_admin', sa.Boolean(), nullable=False),
+    sa.Column('unread_count', sa.Integer(), nullable=False),
+    sa.Column('broadcasts_read', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('owner_id', 'is_admin')
+    )
+    op.create_table('billing_rate',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('employee_id', sa.Integer(), nullable=True),
+    sa.Column('rate', sa.Float(), nullable=False),
+    sa.Column('effective_from', sa.Date(), nullable=False),
+    sa.Column('effective_to', sa.Date(), nullable=True),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.ForeignKeyConstraint(['project_id'], ['project.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('billing_rate', schema=None) as batch_op:
+        batch_op.create_index('ix_billing_rate_lookup', ['project_id', 'employee_id', 'effective_from'], unique=False)
+
+    op.create_table('billing_watermark',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=False),
+    sa.Column('last_modified', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['project.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('project_id', 'start_date', 'end_date', name='uq_billing_watermark_period')
+    )
+    op.create_table('work_report_daily_rollup',
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('total_hours', sa.Float(), nullable=False),
+    sa.Column('total_units', sa.Integer(), nullable=False),
+    sa.Column('report_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.ForeignKeyConstraint(['project_id'], ['project.id'], ),
+    sa.PrimaryKeyConstraint('employee_id', 'project_id', 'date')
+    )
+    with op.batch_alter_table('work_report_daily_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_work_report_rollup_project_date', ['project_id', 'date'], unique=False)
+
+    op.create_table('message_receipt',
+    sa.Column('message_id', sa.Integer(), nullable=False),
+    sa.Column('reader_id', sa.Integer(), nullable=False),
+    sa.Column('is_reader_admin', sa.Boolean(), nullable=False),
+    sa.Column('read_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['message_id'], ['message.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('message_id', 'reader_id', 'is_reader_admin')
+    )
+    op.create_table('open_shift',
+    sa.Column('employee_id', sa.Integer(), nullable=False),
+    sa.Column('attendance_id', sa.Integer(), nullable=False),
+    sa.Column('clock_in_time', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['attendance_id'], ['attendance.id'], ),
+    sa.ForeignKeyConstraint(['employee_id'], ['employee.id'], ),
+    sa.PrimaryKeyConstraint('employee_id'),
+    sa.UniqueConstraint('attendance_id')
+    )
+    with op.batch_alter_table('open_shift', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_open_shift_clock_in_time'), ['clock_in_time'], unique=False)
+
+    with op.batch_alter_table('billing_adjustment', schema=None) as batch_op:
+        batch_op.alter_column('admin_id',
+               existing_type=sa.INTEGER(),
+               nullable=True)
+
+    with op.batch_alter_table('billing_record', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_billing_record_period', ['project_id', 'employee_id', 'start_date', 'end_date'])
+
+    # Existing events are single occurrences
+    with op.batch_alter_table('calendar_event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('leave_request_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('recurrence', sa.String(length=16), nullable=True))
+        batch_op.add_column(sa.Column('recurrence_interval', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.add_column(sa.Column('recurrence_until', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_calendar_event_recurrence', ['recurrence', 'start_date'], unique=False)
+        batch_op.create_index('ix_calendar_event_start_end', ['start_date', 'end_date'], unique=False)
+        batch_op.create_foreign_key('fk_calendar_event_leave_request_id', 'leave_request', ['leave_request_id'], ['id'])
+
+    with op.batch_alter_table('leave_request', schema=None) as batch_op:
+        batch_op.create_index('ix_leave_request_overlap', ['employee_id', 'status', 'start_date', 'end_date'], unique=False)
+        batch_op.create_index('ix_leave_request_status_requested', ['status', 'request_date'], unique=False)
+
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('attachment_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_message_recipient_timestamp', ['recipient_id', 'is_recipient_admin', 'timestamp'], unique=False)
+        batch_op.create_index('ix_message_sender_timestamp', ['sender_id', 'is_sender_admin', 'timestamp'], unique=False)
+        batch_op.create_foreign_key('fk_message_attachment_id', 'attachment', ['attachment_id'], ['id'])
+
+    # Existing reports count as modified now, so the next billing run picks them up
+    with op.batch_alter_table('work_report', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('modified_date', sa.DateTime(), nullable=False,
+                                      server_default=sa.text('CURRENT_TIMESTAMP')))
+        batch_op.add_column(sa.Column('billing_record_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('billed_hours', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('billed_units', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('billed_amount', sa.Float(), nullable=True))
+        batch_op.create_index('ix_work_report_project_modified', ['project_id', 'modified_date'], unique=False)
+        batch_op.create_foreign_key('fk_work_report_billing_record_id', 'billing_record', ['billing_record_id'], ['id'])
+
+    for statement in BACKFILL:
+        op.execute(statement)
+    quote = op.get_bind().dialect.identifier_preparer.quote
+    op.execute(MAILBOX_BACKFILL.format(is_admin=1, owners=quote('user')))
+    op.execute(MAILBOX_BACKFILL.format(is_admin=0, owners=quote('employee')))
+
+
+def downgrade():
+    with op.batch_alter_table('work_report', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_work_report_billing_record_id', type_='foreignkey')
+        batch_op.drop_index('ix_work_report_project_modified')
+        batch_op.drop_column('billed_amount')
+        batch_op.drop_column('billed_units')
+        batch_op.drop_column('billed_hours')
+        batch_op.drop_column('billing_record_id')
+        batch_op.drop_column('modified_date')
+
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_message_attachment_id', type_='foreignkey')
+        batch_op.drop_index('ix_message_sender_timestamp')
+        batch_op.drop_index('ix_message_recipient_timestamp')
+        batch_op.drop_column('attachment_id')
+
+    with op.batch_alter_table('leave_request', schema=None) as batch_op:
+        batch_op.drop_index('ix_leave_request_status_requested')
+        batch_op.drop_index('ix_leave_request_overlap')
+
+    with op.batch_alter_table('calendar_event', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_calendar_event_leave_request_id', type_='foreignkey')
+        batch_op.drop_index('ix_calendar_event_start_end')
+        batch_op.drop_index('ix_calendar_event_recurrence')
+        batch_op.drop_column('recurrence_until')
+        batch_op.drop_column('recurrence_interval')
+        batch_op.drop_column('recurrence')
+        batch_op.drop_column('leave_request_id')
+
+    with op.batch_alter_table('billing_record', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_billing_record_period', type_='unique')
+
+    with op.batch_alter_table('billing_adjustment', schema=None) as batch_op:
+        batch_op.alter_column('admin_id',
+               existing_type=sa.INTEGER(),
+               nullable=False)
+
+    with op.batch_alter_table('open_shift', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_open_shift_clock_in_time'))
+
+    op.drop_table('open_shift')
+    op.drop_table('message_receipt')
+    with op.batch_alter_table('work_report_daily_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_work_report_rollup_project_date')
+
+    op.drop_table('work_report_daily_rollup')
+    op.drop_table('billing_watermark')
+    with op.batch_alter_table('billing_rate', schema=None) as batch_op:
+        batch_op.drop_index('ix_billing_rate_lookup')
+
+    op.drop_table('billing_rate')
+    op.drop_table('mailbox')
+    op.drop_table('billing_job')
+    op.drop_table('attachment')
@@ -1,6 +1,8 @@
 import unittest
 import sys
 import os
+import tempfile
+import time
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 from app import create_app, db
 
@@ -13,8 +15,6 @@ class UserModelCase(unittest.TestCase):
         self.client = self.app.test_client()
         with self.app.app_context():
             db.create_all()
-            from app.models import User
-        self.User = User
 
     def tearDown(self):
         with self.app.app_context():
@@ -37,7 +37,7 @@ class UserModelCase(unittest.TestCase):
             db.session.add(u)
             db.session.commit()
 
-            response = self.client.post('/admin_login', data={
+            response = self.client.post('/admin/login', data={
                 'username': 'testuser',
                 'password': 'testpassword'
             }, follow_redirects=True)
@@ -56,83 +56,1564 @@ class UserModelCase(unittest.TestCase):
             db.session.add(u)
             db.session.commit()
 
-            response = self.client.get('/admin_dashboard', follow_redirects=True)
+            response = self.client.get('/admin/dashboard', follow_redirects=True)
             self.assertIn(b'Please log in to access this page.', response.data)
 
-            self.client.post('/admin_login', data={
+            self.client.post('/admin/login', data={
                 'username': 'testuser',
                 'password': 'testpassword'
             }, follow_redirects=True)
-            response = self.client.get('/admin_dashboard')
+            response = self.client.get('/admin/dashboard')
             self.assertEqual(response.status_code, 200)
             self.assertIn(b'Admin Dashboard', response.data)
 
-if __name__ == '__main__':
-    unittest.main()
+class AppTestCase(unittest.TestCase):
+    config = {}
 
-class UserModelCase(unittest.TestCase):
     def setUp(self):
-        self.app = create_app({
+        self.app = create_app(dict({
             'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
-            'TESTING': True
-        })
+            'TESTING': True,
+            'QUERY_BUDGET_ENFORCE': True,
+            'PASSWORD_BCRYPT_ROUNDS': 4
+        }, **self.config))
         self.client = self.app.test_client()
-        with self.app.app_context():
-            db.create_all()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
 
     def tearDown(self):
-        with self.app.app_context():
-            db.session.remove()
-            db.drop_all()
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
 
-    def test_password_hashing(self):
-        with self.app.app_context():
-            u = self.User(username='testuser')
-            u.set_password('testpassword')
-            self.assertFalse(u.check_password('wrongpassword'))
-            self.assertTrue(u.check_password('testpassword'))
+    def login(self):
+        from app.models import User
+        u = User(username='admin')
+        u.set_password('password')
+        db.session.add(u)
+        db.session.commit()
+        self.client.post('/admin/login', data={'username': 'admin', 'password': 'password'})
 
-    def test_login_logout(self):
-        with self.app.app_context():
-            # Create a test user
-            u = self.User(username='testuser')
-            u.set_password('testpassword')
-            db.session.add(u)
-            db.session.commit()
+    def add_employee(self, first_name='Ada', last_name='Lovelace', department='Engineering'):
+        from app.models import Employee
+        e = Employee(first_name=first_name, last_name=last_name,
+                     email=f'{first_name}.{last_name}@example.com'.lower(), department=department)
+        db.session.add(e)
+        db.session.commit()
+        return e
 
-            # Test login
-            response = self.client.post('/admin_login', data={
-                'username': 'testuser',
-                'password': 'testpassword'
-            }, follow_redirects=True)
-            self.assertEqual(response.status_code, 200)
-            self.assertIn(b'Admin Dashboard', response.data) # Assuming 'Admin Dashboard' is on the dashboard page
+    def add_project(self, name='Apollo', billing_method='Hourly'):
+        from app.models import Project
+        p = Project(name=name, billing_method=billing_method)
+        db.session.add(p)
+        db.session.commit()
+        return p
 
-            # Test logout
-            response = self.client.get('/logout', follow_redirects=True)
+    def add_report(self, employee, project, day, hours=None, units=None):
+        from app.models import WorkReport
+        db.session.add(WorkReport(employee_id=employee.id, project_id=project.id, date=day,
+                                  hours_worked=hours, units_completed=units))
+        db.session.commit()
+
+class AttendanceStatusCase(AppTestCase):
+    def test_clock_in_and_out_maintain_open_shift(self):
+        from app.models import Attendance, OpenShift
+        e = self.add_employee()
+        self.assertEqual(self.client.get(f'/api/attendance/status/{e.id}').json['status'], 'Clocked Out')
+
+        response = self.client.post('/api/attendance/clock_in', json={'employee_id': e.id})
+        self.assertEqual(response.json['status'], 'success')
+        self.assertEqual(self.client.get(f'/api/attendance/status/{e.id}').json['status'], 'Clocked In')
+        self.assertEqual(OpenShift.query.count(), 1)
+
+        response = self.client.post('/api/attendance/clock_in', json={'employee_id': e.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Attendance.query.count(), 1)
+
+        response = self.client.post('/api/attendance/clock_out', json={'employee_id': e.id})
+        self.assertEqual(response.json['status'], 'success')
+        self.assertEqual(OpenShift.query.count(), 0)
+        self.assertIsNotNone(Attendance.query.one().clock_out_time)
+        self.assertEqual(self.client.get(f'/api/attendance/status/{e.id}').json['status'], 'Clocked Out')
+
+    def test_attendance_board_shows_open_shifts(self):
+        working = self.add_employee('Grace', 'Hopper')
+        self.add_employee('Alan', 'Turing')
+        self.client.post('/api/attendance/clock_in', json={'employee_id': working.id})
+        self.login()
+        response = self.client.get('/admin/attendance')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Grace Hopper', response.data)
+        self.assertEqual(response.data.count(b'Clocked In'), 1)
+        self.assertEqual(response.data.count(b'Clocked Out'), 1)
+
+    def test_sync_open_shifts_command(self):
+        from datetime import datetime, timedelta
+        from app.models import Attendance, OpenShift
+        e = self.add_employee()
+        now = datetime.utcnow()
+        db.session.add(Attendance(employee_id=e.id, clock_in_time=now - timedelta(days=1), clock_out_time=now - timedelta(hours=16)))
+        db.session.add(Attendance(employee_id=e.id, clock_in_time=now))
+        db.session.commit()
+        result = self.app.test_cli_runner().invoke(args=['attendance', 'sync-open-shifts'])
+        self.assertIn('1 open shifts restored', result.output)
+        self.assertEqual(OpenShift.query.one().clock_in_time, now)
+
+class PunchQueueCase(AppTestCase):
+    config = {'ATTENDANCE_GROUP_COMMIT': True, 'ATTENDANCE_FLUSH_INTERVAL_MS': 10}
+
+    def test_clock_in_acknowledged_after_flush(self):
+        from app.models import OpenShift
+        e = self.add_employee()
+        response = self.client.post('/api/attendance/clock_in', json={'employee_id': e.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['status'], 'success')
+        self.assertEqual(OpenShift.query.count(), 1)
+        metrics = self.client.get('/api/attendance/queue_metrics').json
+        self.assertTrue(metrics['enabled'])
+        self.assertEqual(metrics['flushed_events'], 1)
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.app.extensions['punch_queue'].stop()
+
+    def test_non_numeric_employee_id_rejected(self):
+        response = self.client.post('/api/attendance/clock_in', json={'employee_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['status'], 'error')
+        self.assertEqual(self.app.extensions['punch_queue'].metrics()['flushed_events'], 0)
+        self.app.extensions['punch_queue'].stop()
+
+    def test_batch_applies_punches_in_order(self):
+        from app.models import Attendance, OpenShift
+        punch_queue = self.app.extensions['punch_queue']
+        a = self.add_employee('Grace', 'Hopper')
+        b = self.add_employee('Alan', 'Turing')
+        # Hold the flusher off so every punch lands in one batch
+        punch_queue._stopped = True
+        punches = [punch_queue.submit(action, employee_id) for action, employee_id in [
+            ('clock_in', a.id), ('clock_in', b.id), ('clock_in', a.id),
+            ('clock_out', a.id), ('clock_in', a.id), ('clock_out', b.id), ('clock_out', b.id),
+        ]]
+        punch_queue.drain()
+        self.assertEqual([p.result[1] for p in punches], [200, 200, 400, 200, 200, 200, 400])
+        self.assertEqual(punch_queue.flush_count, 1)
+        self.assertEqual(Attendance.query.count(), 3)
+        self.assertEqual([s.employee_id for s in OpenShift.query.all()], [a.id])
+
+    def test_failed_retry_commit_acknowledges_only_its_punch(self):
+        from unittest import mock
+        from app.models import OpenShift
+        punch_queue = self.app.extensions['punch_queue']
+        a, b, c = self.add_employee('Grace', 'Hopper'), self.add_employee('Alan', 'Turing'), self.add_employee()
+        punch_queue._stopped = True
+        punches = [punch_queue.submit('clock_in', employee.id) for employee in (a, b, c)]
+        real_commit = db.session.commit
+        # The batch commit fails, then the retry of the second punch does
+        failures = iter([True, False, True, False])
+        def commit():
+            if next(failures):
+                raise RuntimeError('commit failed')
+            real_commit()
+        with mock.patch.object(db.session, 'commit', side_effect=commit):
+            punch_queue.drain()
+        self.assertEqual([p.result[1] for p in punches], [200, 500, 200])
+        self.assertEqual(sorted(s.employee_id for s in OpenShift.query.all()), sorted([a.id, c.id]))
+
+class BillingEngineCase(AppTestCase):
+    def test_generate_applies_effective_rates(self):
+        from datetime import date
+        from app.billing import generate_billing_records, set_rate
+        from app.models import BillingRate, BillingRecord
+        project = self.add_project()
+        a = self.add_employee('Grace', 'Hopper')
+        b = self.add_employee('Alan', 'Turing')
+        set_rate(project.id, None, 40, date(2024, 1, 1))
+        set_rate(project.id, a.id, 60, date(2024, 1, 15))
+        set_rate(project.id, None, 45, date(2024, 2, 1))
+        db.session.commit()
+        self.assertEqual(BillingRate.query.filter_by(employee_id=None, rate=40).one().effective_to, date(2024, 1, 31))
+        with self.assertRaises(ValueError):
+            set_rate(project.id, None, 50, date(2024, 1, 10), date(2024, 1, 20))
+
+        self.add_report(a, project, date(2024, 1, 10), hours=2)
+        self.add_report(a, project, date(2024, 1, 20), hours=3)
+        self.add_report(b, project, date(2024, 2, 5), hours=1)
+        self.add_report(b, project, date(2024, 3, 5), hours=8)
+        self.assertEqual(generate_billing_records(project, date(2024, 1, 1), date(2024, 2, 29)), 2)
+        db.session.commit()
+        records = {r.employee_id: r for r in BillingRecord.query.all()}
+        self.assertEqual((records[a.id].hours_billed, records[a.id].amount), (5, 260))
+        self.assertEqual((records[b.id].hours_billed, records[b.id].amount), (1, 45))
+        self.assertIsNone(records[a.id].units_billed)
+
+    def test_cli_and_form_use_default_unit_rate(self):
+        from datetime import date
+        from app.models import BillingRecord
+        project = self.add_project('Gemini', 'Count-Based')
+        e = self.add_employee()
+        self.add_report(e, project, date(2024, 1, 10), units=7)
+        result = self.app.test_cli_runner().invoke(args=[
+            'billing', 'generate', '--project-id', str(project.id), '--start', '2024-01-01', '--end', '2024-01-31'])
+        self.assertIn('1 billing records generated', result.output)
+        record = BillingRecord.query.one()
+        self.assertEqual((record.units_billed, record.amount), (7, 35))
+
+        self.login()
+        response = self.client.post('/admin/billing_records', data={
+            'project_id': project.id, 'start_date': '2024-01-01', 'end_date': '2024-01-31'}, follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'billing records generated successfully', response.data)
+
+class BillingJobCase(AppTestCase):
+    # Worker threads need their own connections, which an in-memory database cannot share
+    config = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'ems_test_billing_jobs.db'),
+              'BILLING_JOB_WORKERS': 2}
+
+    def wait_for_job(self, job_id):
+        for _ in range(200):
+            # Requests share the test's session, so drop rows it loaded before the worker updated them
+            db.session.expire_all()
+            job = self.client.get(f'/api/billing/jobs/{job_id}').json
+            if job['status'] in ('Completed', 'Failed'):
+                return job
+            time.sleep(0.05)
+        self.fail('billing job did not finish')
+
+    def test_bill_all_projects_is_idempotent(self):
+        from datetime import date
+        from app.models import BillingJob, BillingRecord, Project, WorkReport
+        e = self.add_employee()
+        hourly = Project(name='Apollo', billing_method='Hourly')
+        counted = Project(name='Gemini', billing_method='Count-Based')
+        db.session.add_all([hourly, counted, Project(name='Mercury', billing_method='Hourly', is_active=False)])
+        db.session.commit()
+        db.session.add_all([
+            WorkReport(employee_id=e.id, project_id=hourly.id, date=date(2024, 1, 3), hours_worked=4),
+            WorkReport(employee_id=e.id, project_id=counted.id, date=date(2024, 1, 4), units_completed=10),
+        ])
+        db.session.commit()
+        self.login()
+
+        for expected_records in (2, 0):
+            self.client.post('/admin/billing_records/run_all', data={'start_date': '2024-01-01', 'end_date': '2024-01-31'})
+            job_id = BillingJob.query.order_by(BillingJob.id.desc()).first().id
+            job = self.wait_for_job(job_id)
+            self.assertEqual(job['status'], 'Completed')
+            self.assertEqual((job['total_projects'], job['completed_projects'], job['progress']), (2, 2, 1.0))
+            self.assertEqual(job['records_created'], expected_records)
+            self.assertEqual(BillingRecord.query.count(), 2)
+
+    def test_crashed_and_stale_jobs_do_not_block_the_period(self):
+        from datetime import date, datetime, timedelta
+        from unittest import mock
+        from app.billing import run_billing_job, start_billing_job
+        from app.models import BillingJob
+        self.add_project()
+        self.login()
+        job = BillingJob(start_date=date(2024, 1, 1), end_date=date(2024, 1, 31), status='Pending')
+        db.session.add(job)
+        db.session.commit()
+        with mock.patch('app.billing.ThreadPoolExecutor', side_effect=RuntimeError('worker pool gone')):
+            self.assertEqual(run_billing_job(self.app, job.id), 'Failed')
+        db.session.refresh(job)
+        self.assertEqual((job.status, job.error), ('Failed', 'RuntimeError: worker pool gone'))
+        self.assertIsNotNone(job.finished_date)
+
+        # A Running job whose worker died is given up on once it is older than the timeout
+        stuck = BillingJob(start_date=date(2024, 2, 1), end_date=date(2024, 2, 29), status='Running',
+                           created_date=datetime.utcnow() - timedelta(seconds=self.app.config['BILLING_JOB_TIMEOUT'] + 60))
+        db.session.add(stuck)
+        db.session.commit()
+        with self.app.test_request_context():
+            fresh = start_billing_job(date(2024, 2, 1), date(2024, 2, 29))
+        self.assertNotEqual(fresh.id, stuck.id)
+        self.assertEqual(self.wait_for_job(fresh.id)['status'], 'Completed')
+        db.session.refresh(stuck)
+        self.assertEqual(stuck.status, 'Failed')
+
+    def test_racing_submits_share_one_job(self):
+        from datetime import date
+        from unittest import mock
+        from app import billing
+        from app.models import BillingJob
+        self.add_project()
+        self.login()
+        start, end = date(2024, 3, 1), date(2024, 3, 31)
+        with self.app.test_request_context():
+            first = billing.start_billing_job(start, end)
+            # The second request checked for an active job before the first one was committed
+            with mock.patch.object(billing, '_active_job', side_effect=[None, first]), \
+                 mock.patch.object(billing.threading, 'Thread') as thread:
+                second = billing.start_billing_job(start, end)
+        self.assertEqual(second.id, first.id)
+        thread.assert_not_called()
+        self.assertEqual(BillingJob.query.filter_by(start_date=start, end_date=end).count(), 1)
+        self.assertEqual(self.wait_for_job(first.id)['status'], 'Completed')
+        db.session.refresh(first)
+        self.assertIsNone(first.active_period)
+
+class IncrementalBillingCase(AppTestCase):
+    def test_rerun_bills_only_late_and_changed_reports(self):
+        from datetime import date
+        from app.billing import generate_billing_records
+        from app.models import BillingAdjustment, BillingRecord, WorkReport
+        project = self.add_project()
+        a = self.add_employee('Grace', 'Hopper')
+        b = self.add_employee('Alan', 'Turing')
+        self.add_report(a, project, date(2024, 1, 10), hours=2)
+        self.add_report(a, project, date(2024, 1, 11), hours=3)
+        period = (project, date(2024, 1, 1), date(2024, 1, 31))
+        self.assertEqual(generate_billing_records(*period), 1)
+        db.session.commit()
+        report = WorkReport.query.filter_by(date=date(2024, 1, 10)).one()
+        modified = report.modified_date
+        self.assertEqual((report.billed_hours, report.billed_amount), (2, 100))
+        self.assertIsNotNone(report.billing_record_id)
+
+        self.assertEqual(generate_billing_records(*period), 0)
+        db.session.commit()
+        self.assertEqual(WorkReport.query.get(report.id).modified_date, modified)
+
+        report.hours_worked = 4
+        db.session.commit()
+        self.add_report(a, project, date(2024, 1, 12), hours=1)
+        self.add_report(b, project, date(2024, 1, 12), hours=5)
+        self.assertEqual(generate_billing_records(*period), 2)
+        db.session.commit()
+        record_a = BillingRecord.query.filter_by(employee_id=a.id).one()
+        self.assertEqual((record_a.hours_billed, record_a.amount), (8, 400))
+        self.assertEqual(BillingAdjustment.query.one().adjustment_amount, 150)
+        self.assertEqual(BillingRecord.query.filter_by(employee_id=b.id).one().amount, 250)
+        self.assertEqual(generate_billing_records(*period), 0)
+
+    def test_rerun_follows_billing_state_not_timestamps(self):
+        from datetime import date
+        from app.billing import generate_billing_records
+        from app.models import BillingRecord, WorkReport
+        project, other = self.add_project(), self.add_project('Gemini')
+        a = self.add_employee('Grace', 'Hopper')
+        b = self.add_employee('Alan', 'Turing')
+        for day in (10, 11, 12, 13):
+            self.add_report(a, project, date(2024, 1, day), hours=1)
+        period = (project, date(2024, 1, 1), date(2024, 1, 31))
+        generate_billing_records(*period)
+        db.session.commit()
+        amounts = lambda: {(r.project_id, r.employee_id): r.amount for r in BillingRecord.query.all()}
+        self.assertEqual(amounts(), {(project.id, a.id): 200})
+
+        table = WorkReport.__table__
+        reports = {r.date.day: r.id for r in WorkReport.query.all()}
+        # Edited with a modified_date no newer than the last run, as a late commit or whole-second clock can leave it
+        db.session.execute(table.update().where(table.c.id == reports[10]).values(
+            hours_worked=3, modified_date=table.c.modified_date))
+        db.session.execute(table.update().where(table.c.id == reports[11]).values(project_id=other.id))
+        db.session.execute(table.update().where(table.c.id == reports[12]).values(employee_id=b.id))
+        db.session.commit()
+        db.session.delete(WorkReport.query.get(reports[13]))
+        db.session.commit()
+        self.assertEqual(amounts(), {(project.id, a.id): 150})
+
+        generate_billing_records(*period)
+        generate_billing_records(other, date(2024, 1, 1), date(2024, 1, 31))
+        db.session.commit()
+        self.assertEqual(amounts(), {(project.id, a.id): 150, (project.id, b.id): 50, (other.id, a.id): 50})
+        self.assertEqual(generate_billing_records(*period), 0)
+
+class KeysetPaginationCase(AppTestCase):
+    config = {'PAGE_SIZE': 2}
+
+    def test_work_report_pages_follow_cursor_with_filters(self):
+        from datetime import date
+        project = self.add_project()
+        other = self.add_project('Gemini')
+        e = self.add_employee()
+        for day in (1, 2, 2, 3, 4):
+            self.add_report(e, project, date(2024, 1, day), hours=day)
+        self.add_report(e, other, date(2024, 1, 5), hours=9)
+        self.login()
+
+        seen = []
+        url = f'/api/work_reports?project_id={project.id}'
+        while url:
+            page = self.client.get(url).json
+            self.assertLessEqual(len(page['items']), 2)
+            seen.extend((item['date'], item['id']) for item in page['items'])
+            url = f'/api/work_reports?project_id={project.id}&cursor={page["next_cursor"]}' if page['next_cursor'] else None
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+        response = self.client.get(f'/admin/work_reports?project_id={project.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Next page', response.data)
+        self.assertIn(f'project_id={project.id}'.encode(), response.data)
+        self.assertEqual(self.client.get('/api/work_reports?cursor=garbage').status_code, 400)
+
+    def test_filters_extend_the_callers_query(self):
+        from datetime import date
+        from app.models import WorkReport
+        from app.routes import filter_work_reports
+        project, other = self.add_project(), self.add_project('Gemini')
+        e = self.add_employee()
+        for hours in (1, 3, 4):
+            self.add_report(e, project, date(2024, 1, hours), hours=hours)
+        self.add_report(e, other, date(2024, 1, 5), hours=9)
+        with self.app.test_request_context(f'/?project_id={project.id}&start_date=2024-01-02'):
+            query = filter_work_reports(WorkReport.query.filter(WorkReport.hours_worked > 3))
+            self.assertEqual([report.hours_worked for report in query], [4])
+
+    def test_other_lists_paginate(self):
+        from datetime import date
+        from app.models import LeaveRequest, Message
+        e = self.add_employee()
+        self.login()
+        for i in range(3):
+            db.session.add(LeaveRequest(employee_id=e.id, start_date=date(2024, 1, 1), end_date=date(2024, 1, 2), leave_type='Annual'))
+            db.session.add(Message(sender_id=1, is_sender_admin=True, body=f'message {i}'))
+        db.session.commit()
+        for url in ('/admin/leave_requests', '/messages'):
+            response = self.client.get(url)
             self.assertEqual(response.status_code, 200)
-            self.assertIn(b'Welcome', response.data) # Assuming 'Welcome' is on the welcome page after logout
+            self.assertIn(b'cursor=', response.data)
+        page = self.client.get('/api/leave_requests').json
+        self.assertEqual(len(page['items']), 2)
+        self.assertEqual(len(self.client.get(f'/api/leave_requests?cursor={page["next_cursor"]}').json['items']), 1)
+        self.assertEqual(len(self.client.get('/api/messages?box=sent&per_page=5').json['items']), 3)
+        self.assertEqual(self.client.get('/admin/billing_records').status_code, 200)
+        self.assertEqual(self.client.get('/api/billing_records').json, {'items': [], 'next_cursor': None})
 
-    def test_dashboard_access(self):
-        with self.app.app_context():
-            # Create a test user
-            u = self.User(username='testuser')
-            u.set_password('testpassword')
-            db.session.add(u)
+class QueryBudgetCase(AppTestCase):
+    def test_admin_lists_issue_constant_queries(self):
+        from datetime import date
+        from app.billing import generate_billing_records
+        from app.models import LeaveRequest
+        self.login()
+        for i in range(10):
+            e = self.add_employee('Employee', str(i))
+            p = self.add_project(f'Project {i}')
+            self.add_report(e, p, date(2024, 1, 1), hours=1)
+            db.session.add(LeaveRequest(employee_id=e.id, start_date=date(2024, 2, 1), end_date=date(2024, 2, 2), leave_type='Annual'))
+            generate_billing_records(p, date(2024, 1, 1), date(2024, 1, 31))
+        db.session.commit()
+        # Requests share the test's session; start them with an empty identity map so lazy loads hit the database
+        db.session.expunge_all()
+        # The filtered listing goes through filter_work_reports, which must keep the eager loads
+        for url, expected in (('/admin/work_reports', b'Employee 9'), ('/admin/work_reports?start_date=2024-01-01', b'Employee 9'),
+                              ('/admin/leave_requests', b'Employee 9'),
+                              ('/admin/billing_records', b'Project 9'), ('/admin/attendance', b'Employee 9')):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn(expected, response.data)
+            self.assertLessEqual(int(response.headers['X-Query-Count']), 5, url)
+
+    def test_exceeding_budget_fails(self):
+        from app.query_budget import QueryBudgetExceeded
+        self.login()
+        self.add_employee()
+        view = self.app.view_functions['main.view_attendance']
+        # View functions are shared by every app instance, so put the real budget back afterwards
+        self.addCleanup(setattr, view, 'query_budget', view.query_budget)
+        view.query_budget = {'default': 0}
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/admin/attendance')
+
+class ExportCase(AppTestCase):
+    config = {'EXPORT_BATCH_SIZE': 2}
+
+    def test_work_report_export_streams_filtered_rows(self):
+        import csv
+        import io
+        from datetime import date
+        project = self.add_project()
+        other = self.add_project('Gemini')
+        e = self.add_employee()
+        for day in range(1, 6):
+            self.add_report(e, project, date(2024, 1, day), hours=day)
+        self.add_report(e, other, date(2024, 1, 1), hours=1)
+        self.login()
+        response = self.client.get(f'/admin/work_reports/export?project_id={project.id}&start_date=2024-01-02')
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual([row['date'] for row in rows], ['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05'])
+        self.assertEqual(rows[0]['project_name'], 'Apollo')
+        self.assertEqual(rows[0]['units_completed'], '')
+
+    def test_attendance_and_billing_ndjson_export(self):
+        import json
+        from datetime import date
+        from app.billing import generate_billing_records
+        project = self.add_project()
+        e = self.add_employee()
+        self.add_report(e, project, date(2024, 1, 1), hours=2)
+        generate_billing_records(project, date(2024, 1, 1), date(2024, 1, 31))
+        db.session.commit()
+        self.client.post('/api/attendance/clock_in', json={'employee_id': e.id})
+        self.login()
+        lines = self.client.get('/admin/billing_records/export?format=ndjson').get_data(as_text=True).splitlines()
+        self.assertEqual(json.loads(lines[0])['amount'], 100)
+        lines = self.client.get(f'/admin/attendance/export?format=ndjson&employee_id={e.id}').get_data(as_text=True).splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIsNone(json.loads(lines[0])['clock_out_time'])
+        self.assertEqual(self.client.get('/admin/attendance/export?format=xml').status_code, 400)
+
+class WorkReportImportCase(AppTestCase):
+    config = {'IMPORT_BATCH_SIZE': 2}
+
+    CSV = (
+        'employee_email,project_name,date,hours_worked,units_completed,description\n'
+        'ada.lovelace@example.com,Apollo,2024-01-01,8,,Engines\n'
+        'ada.lovelace@example.com,Apollo,2024-01-02,,,No hours\n'
+        'ada.lovelace@example.com,Gemini,2024-01-02,,12,Widgets\n'
+        'nobody@example.com,Apollo,2024-01-03,8,,\n'
+        'ada.lovelace@example.com,Apollo,01/04/2024,8,,\n'
+        'ada.lovelace@example.com,Apollo,2024-01-05,7.5,,\n'
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.add_employee()
+        self.add_project('Apollo', 'Hourly')
+        self.add_project('Gemini', 'Count-Based')
+
+    def test_upload_imports_valid_rows_and_reports_errors(self):
+        import io
+        from app.models import WorkReport
+        self.login()
+        response = self.client.post('/admin/work_reports/import', data={
+            'file': (io.BytesIO(self.CSV.encode()), 'reports.csv')}, follow_redirects=True)
+        self.assertIn(b'Imported 3 work reports, rejected 3 rows.', response.data)
+        self.assertIn(b'Line 3: Hours worked is required for hourly projects', response.data)
+        self.assertIn(b'Line 5: Unknown employee', response.data)
+        self.assertEqual(sorted(r.hours_worked or r.units_completed for r in WorkReport.query), [7.5, 8, 12])
+
+    def test_cli_import(self):
+        from app.models import WorkReport
+        path = os.path.join(tempfile.mkdtemp(), 'reports.csv')
+        with open(path, 'w') as f:
+            f.write(self.CSV)
+        result = self.app.test_cli_runner().invoke(args=['import', 'work-reports', path])
+        self.assertIn('Imported 3 work reports, rejected 3 rows.', result.output)
+        self.assertIn('Line 6: Invalid date', result.output)
+        self.assertEqual(WorkReport.query.count(), 3)
+
+class DashboardCountersCase(AppTestCase):
+    def counters(self):
+        import re
+        response = self.client.get('/admin/dashboard')
+        self.assertEqual(response.status_code, 200)
+        return [int(n) for n in re.findall(rb'<h5 class="card-title">(\d+)</h5>', response.data)], int(response.headers['X-Query-Count'])
+
+    def test_counters_are_cached_and_invalidated_by_writes(self):
+        self.login()
+        e = self.add_employee()
+        self.add_project()
+        self.assertEqual(self.counters(), ([1, 0, 1, 0], 4))
+        self.assertEqual(self.counters(), ([1, 0, 1, 0], 0))
+
+        self.client.post('/api/attendance/clock_in', json={'employee_id': e.id})
+        self.client.post(f'/employee/{e.id}/leave_request', data={
+            'start_date': '2024-02-01', 'end_date': '2024-02-02', 'leave_type': 'Annual'})
+        self.assertEqual(self.counters(), ([1, 1, 1, 1], 2))
+
+        self.client.post('/admin/employees/add', data={
+            'first_name': 'Grace', 'last_name': 'Hopper', 'email': 'grace@example.com', 'department': 'Navy', 'is_active': 'on'})
+        self.client.post('/api/attendance/clock_out', json={'employee_id': e.id})
+        self.assertEqual(self.counters(), ([2, 1, 1, 0], 2))
+        self.assertIn(b'grace@example.com', self.client.get('/admin/employees').data)
+
+class WorkReportRollupCase(AppTestCase):
+    def rollup(self):
+        from app.models import WorkReportDailyRollup as R
+        return sorted((r.employee_id, r.project_id, r.date.isoformat(), r.total_hours, r.total_units, r.report_count)
+                      for r in R.query)
+
+    def test_rollup_follows_orm_writes_and_import(self):
+        from datetime import date
+        from app.models import WorkReport
+        from app.imports import import_work_reports
+        e = self.add_employee()
+        apollo = self.add_project('Apollo', 'Hourly')
+        gemini = self.add_project('Gemini', 'Count-Based')
+        self.add_report(e, apollo, date(2024, 1, 1), hours=8)
+        self.add_report(e, apollo, date(2024, 1, 1), hours=2)
+        self.add_report(e, gemini, date(2024, 1, 2), units=5)
+        self.assertEqual(self.rollup(), [(e.id, apollo.id, '2024-01-01', 10.0, 0, 2),
+                                         (e.id, gemini.id, '2024-01-02', 0.0, 5, 1)])
+
+        report = WorkReport.query.filter_by(hours_worked=2).one()
+        report.hours_worked = 3
+        report.date = date(2024, 1, 3)
+        db.session.commit()
+        db.session.delete(WorkReport.query.filter_by(project_id=gemini.id).one())
+        db.session.commit()
+        self.assertEqual(self.rollup(), [(e.id, apollo.id, '2024-01-01', 8.0, 0, 1),
+                                         (e.id, apollo.id, '2024-01-03', 3.0, 0, 1)])
+
+        import_work_reports(['employee_email,project_name,date,hours_worked,units_completed,description',
+                             'ada.lovelace@example.com,Apollo,2024-01-01,4,,'])
+        self.assertEqual(self.rollup()[0], (e.id, apollo.id, '2024-01-01', 12.0, 0, 2))
+
+    def test_databases_without_upsert_update_row_by_row(self):
+        from datetime import date
+        from unittest import mock
+        from app.models import WorkReport
+        e = self.add_employee()
+        apollo = self.add_project('Apollo', 'Hourly')
+        self.add_report(e, apollo, date(2024, 1, 2), hours=1)
+        with mock.patch.object(db.engine.dialect, 'name', 'other'):
+            self.add_report(e, apollo, date(2024, 1, 1), hours=8)
+            self.add_report(e, apollo, date(2024, 1, 1), hours=2)
+            db.session.delete(WorkReport.query.filter_by(hours_worked=8).one())
+            db.session.commit()
+            report = WorkReport.query.filter_by(hours_worked=2).one()
+            report.date = date(2024, 1, 3)
             db.session.commit()
+        self.assertEqual(self.rollup(), [(e.id, apollo.id, '2024-01-02', 1.0, 0, 1),
+                                         (e.id, apollo.id, '2024-01-03', 2.0, 0, 1)])
 
-            # Try to access dashboard without login (should redirect)
-            response = self.client.get('/admin_dashboard', follow_redirects=True)
-            self.assertIn(b'Please log in to access this page.', response.data) # Assuming flash message for login required
+    def test_rebuild_and_summary_api(self):
+        from datetime import date
+        from app.models import WorkReportDailyRollup
+        e = self.add_employee()
+        apollo = self.add_project('Apollo', 'Hourly')
+        self.add_report(e, apollo, date(2024, 1, 1), hours=8)
+        self.add_report(e, apollo, date(2024, 2, 1), hours=6)
+        expected = self.rollup()
+        WorkReportDailyRollup.query.delete()
+        db.session.commit()
 
-            # Login and then access dashboard
-            self.client.post('/admin_login', data={
-                'username': 'testuser',
-                'password': 'testpassword'
-            }, follow_redirects=True)
-            response = self.client.get('/admin_dashboard')
-            self.assertEqual(response.status_code, 200)
-            self.assertIn(b'Admin Dashboard', response.data)
+        result = self.app.test_cli_runner().invoke(args=['reports', 'rebuild-rollup'])
+        self.assertIn('2 rollup rows rebuilt.', result.output)
+        self.assertEqual(self.rollup(), expected)
+
+        self.login()
+        response = self.client.get('/api/work_reports/summary?group_by=project&start_date=2024-01-15')
+        self.assertEqual(response.json['items'], [{'project_id': apollo.id, 'hours': 6.0, 'units': 0, 'reports': 1}])
+        self.assertEqual(self.client.get('/api/work_reports/summary?group_by=nope').status_code, 400)
+        self.assertIn(b'Totals for this filter: 2 reports, 14.00 hours', self.client.get('/admin/work_reports').data)
+
+class InboxCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        from app.models import User
+        self.login()
+        self.admin = User.query.filter_by(username='admin').one()
+        self.other = User(username='other')
+        self.other.set_password('password')
+        db.session.add(self.other)
+        db.session.commit()
+
+    def send(self, recipient_type, recipient_id=None, body='Hello'):
+        data = {'recipient_type': recipient_type, 'body': body}
+        if recipient_id:
+            data['recipient_id'] = recipient_id
+        return self.client.post('/messages', data=data)
+
+    def test_inbox_only_shows_own_and_broadcast_messages(self):
+        from app.inbox import send_message
+        send_message(self.other.id, True, self.other.id, True, 'Not for admin')
+        send_message(self.other.id, True, self.admin.id, False, 'For employee with the same id')
+        db.session.commit()
+        self.send('admin', self.admin.id, 'Direct')
+        self.send('broadcast', body='Everyone')
+        self.send('employee', self.add_employee().id, body='To employee')
+
+        bodies = [m['body'] for m in self.client.get('/api/messages').json['items']]
+        self.assertEqual(bodies, ['Everyone', 'Direct'])
+        sent = [m['body'] for m in self.client.get('/api/messages?box=sent').json['items']]
+        self.assertEqual(sent, ['To employee', 'Everyone', 'Direct'])
+        from app.models import Message
+        self.assertIs(Message.query.filter_by(body='To employee').one().is_recipient_admin, False)
+
+    def test_direct_message_needs_an_existing_recipient(self):
+        from app.models import Message
+        # A name typed without picking a suggestion leaves recipient_id empty
+        for recipient_type, recipient_id in [('employee', None), ('admin', None), ('employee', 99), ('admin', 99)]:
+            response = self.send(recipient_type, recipient_id, body='Lost')
+            self.assertEqual(response.status_code, 302)
+            self.assertIn(b'Choose a recipient', self.client.get('/messages').data)
+        self.assertEqual(Message.query.filter_by(body='Lost').count(), 0)
+
+    def test_read_state_and_unread_counters(self):
+        from app.inbox import send_message
+        from app.models import Message
+        self.send('admin', self.admin.id, 'Direct')
+        send_message(self.other.id, True, None, None, 'Everyone')
+        db.session.commit()
+        # Your own broadcasts are never unread
+        self.send('broadcast', body='From admin')
+        self.assertEqual(self.client.get('/api/messages/unread_count').json['unread'], 2)
+
+        direct = Message.query.filter_by(body='Direct').one()
+        broadcast = Message.query.filter_by(body='Everyone').one()
+        self.assertEqual(self.client.post(f'/messages/{direct.id}/read', json={}).json['unread'], 1)
+        self.assertEqual(self.client.post(f'/messages/{direct.id}/read', json={}).json['unread'], 1)
+        self.client.post(f'/messages/{broadcast.id}/read')
+        self.assertEqual(self.client.get('/api/messages/unread_count').json['unread'], 0)
+        self.assertTrue(all(m['read'] for m in self.client.get('/api/messages').json['items']))
+
+        self.client.get('/logout')
+        self.client.post('/admin/login', data={'username': 'other', 'password': 'password'})
+        self.assertEqual(self.client.get('/api/messages/unread_count').json['unread'], 1)
+        self.assertEqual(self.client.post(f'/messages/{direct.id}/read', json={}).status_code, 403)
+
+    def test_new_accounts_start_with_earlier_broadcasts_read(self):
+        from app.inbox import unread_count
+        from app.models import User
+        for i in range(3):
+            self.send('broadcast', body=f'Before {i}')
+        newcomer = User(username='newcomer')
+        newcomer.set_password('password')
+        db.session.add(newcomer)
+        db.session.commit()
+        employee = self.add_employee()
+        self.assertEqual((unread_count(newcomer.id, True), unread_count(employee.id, False)), (0, 0))
+        self.send('broadcast', body='After')
+        self.assertEqual((unread_count(newcomer.id, True), unread_count(employee.id, False)), (1, 1))
+
+        # Reading an earlier broadcast changes nothing; the badge and the list agree
+        self.client.get('/logout')
+        self.client.post('/admin/login', data={'username': 'newcomer', 'password': 'password'})
+        from app.models import Message
+        before = Message.query.filter_by(body='Before 0').one()
+        self.client.post(f'/messages/{before.id}/read')
+        self.assertEqual(self.client.get('/api/messages/unread_count').json['unread'], 1)
+        unread = [m['body'] for m in self.client.get('/api/messages').json['items'] if not m['read']]
+        self.assertEqual(unread, ['After'])
+
+    def test_unread_count_queries_do_not_grow_with_broadcasts(self):
+        from app.inbox import send_message
+        for i in range(30):
+            send_message(self.other.id, True, None, None, f'Broadcast {i}')
+        db.session.commit()
+        response = self.client.get('/api/messages/unread_count')
+        self.assertEqual(response.json['unread'], 30)
+        statements = []
+        from sqlalchemy import event
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            self.client.get('/api/messages/unread_count')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertFalse([s for s in statements if 'count(' in s.lower()])
+
+    def test_inbox_queries_do_not_grow_with_volume(self):
+        from app.inbox import send_message
+        for i in range(30):
+            send_message(self.other.id, True, self.other.id, True, f'Noise {i}')
+        db.session.commit()
+        response = self.client.get('/messages')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(int(response.headers['X-Query-Count']), 8)
+
+class AttachmentCase(AppTestCase):
+    config = {'ATTACHMENT_CHUNK_SIZE': 4}
+
+    def setUp(self):
+        self.config = dict(self.config, ATTACHMENT_DIR=tempfile.mkdtemp())
+        super().setUp()
+        self.login()
+
+    def send(self, data, name='policy.pdf'):
+        import io
+        return self.client.post('/messages', data={'recipient_type': 'broadcast', 'body': 'See attached',
+                                                   'attachment': (io.BytesIO(data), name)})
+
+    def test_uploads_are_deduplicated_by_content(self):
+        import hashlib
+        from app.models import Attachment, Message
+        payload = b'%PDF-1.4 company policy'
+        self.send(payload)
+        self.send(payload, 'copy.pdf')
+        self.send(b'something else', 'other.txt')
+
+        self.assertEqual(Attachment.query.count(), 2)
+        first, second = Message.query.filter(Message.attachment_path.in_(['policy.pdf', 'copy.pdf'])).all()
+        self.assertEqual(first.attachment_id, second.attachment_id)
+        sha = hashlib.sha256(payload).hexdigest()
+        self.assertEqual(first.attachment.sha256, sha)
+        self.assertEqual(first.attachment.size, len(payload))
+        blobs = [f for _, _, files in os.walk(self.app.config['ATTACHMENT_DIR']) for f in files]
+        self.assertEqual(len(blobs), 2)
+        self.assertIn(sha, blobs)
+
+    def test_download_supports_etag_and_range(self):
+        from app.models import Message
+        self.send(b'0123456789')
+        message = Message.query.one()
+        url = f'/messages/{message.id}/attachment'
+
+        response = self.client.get(url)
+        self.assertEqual(response.data, b'0123456789')
+        self.assertIn('policy.pdf', response.headers['Content-Disposition'])
+        etag = response.headers['ETag']
+        self.assertIn(message.attachment.sha256, etag)
+        response.close()
+
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        partial = self.client.get(url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.data, b'2345')
+        self.assertEqual(partial.headers['Content-Range'], 'bytes 2-5/10')
+        partial.close()
+
+    def test_download_requires_access_to_the_message(self):
+        from app.inbox import send_message
+        from app.models import Attachment
+        attachment = Attachment(sha256='0' * 64, size=1, content_type='text/plain')
+        db.session.add(attachment)
+        message = send_message(99, True, 99, True, 'Private', attachment=attachment, attachment_path='x.txt')
+        db.session.commit()
+        self.assertEqual(self.client.get(f'/messages/{message.id}/attachment').status_code, 404)
+
+class CalendarCase(AppTestCase):
+    def add_event(self, title, start, end, **kwargs):
+        from app.models import CalendarEvent
+        event = CalendarEvent(title=title, start_date=start, end_date=end, event_type='Company Event', **kwargs)
+        db.session.add(event)
+        db.session.commit()
+        return event
+
+    def window(self, start, end):
+        response = self.client.get(f'/api/calendar?from={start}&to={end}')
+        self.assertEqual(response.status_code, 200)
+        return [(item['title'], item['start_date'][:10]) for item in response.json['items']]
+
+    def test_window_returns_overlapping_one_off_events(self):
+        from datetime import datetime
+        self.login()
+        self.add_event('Offsite', datetime(2024, 3, 30, 9), datetime(2024, 4, 2, 17))
+        self.add_event('Old', datetime(2023, 1, 1), datetime(2023, 1, 2))
+        self.add_event('Launch', datetime(2024, 4, 10, 9), datetime(2024, 4, 10, 10))
+        self.add_event('Later', datetime(2024, 5, 1), datetime(2024, 5, 1, 1))
+        self.assertEqual(self.window('2024-04-01', '2024-04-30'), [('Offsite', '2024-03-30'), ('Launch', '2024-04-10')])
+        self.assertEqual(self.client.get('/api/calendar?from=2024-05-01&to=2024-04-01').status_code, 400)
+        self.assertEqual(self.client.get('/api/calendar?from=2020-01-01&to=2024-01-01').status_code, 400)
+
+    def test_recurring_events_are_expanded_per_window(self):
+        from datetime import datetime
+        from app.models import CalendarEvent
+        self.login()
+        self.add_event('All hands', datetime(2020, 1, 6, 10), datetime(2020, 1, 6, 11), recurrence='weekly')
+        self.add_event('New year', datetime(2000, 1, 1), datetime(2000, 1, 1, 23), recurrence='yearly')
+        self.add_event('Payroll', datetime(2024, 1, 31, 9), datetime(2024, 1, 31, 10), recurrence='monthly',
+                       recurrence_until=datetime(2024, 3, 31, 23, 59))
+        self.add_event('Sprint', datetime(2024, 1, 1), datetime(2024, 1, 1, 1), recurrence='daily', recurrence_interval=14)
+
+        self.assertEqual(self.window('2024-01-01', '2024-01-14'), [
+            ('New year', '2024-01-01'), ('Sprint', '2024-01-01'), ('All hands', '2024-01-01'), ('All hands', '2024-01-08')])
+        self.assertEqual([title for title, day in self.window('2024-02-01', '2024-04-30') if title == 'Payroll'],
+                         ['Payroll', 'Payroll'])
+        self.assertIn(('Payroll', '2024-02-29'), self.window('2024-02-01', '2024-02-29'))
+        self.assertEqual(CalendarEvent.query.count(), 4)
+
+    def test_form_validates_recurrence(self):
+        from app.models import CalendarEvent
+        self.login()
+        data = {'title': 'Standup', 'start_date': '2024-01-01T09:00', 'end_date': '2024-01-01T09:15',
+                'event_type': 'Company Event', 'recurrence': 'weekly', 'recurrence_until': '2023-12-01'}
+        self.assertIn(b'Repeat-until date cannot be before', self.client.post('/admin/calendar', data=data, follow_redirects=True).data)
+        data['recurrence_until'] = '2024-06-30'
+        self.client.post('/admin/calendar', data=data)
+        event = CalendarEvent.query.one()
+        self.assertEqual(event.recurrence, 'weekly')
+        page = self.client.get('/admin/calendar?from=2024-01-01&to=2024-01-31').data
+        self.assertEqual(page.count(b'Standup'), 5)
+
+class LeaveQueueCase(AppTestCase):
+    def add_leave(self, employee, start, end, status='Pending'):
+        from app.models import LeaveRequest
+        leave = LeaveRequest(employee_id=employee.id, start_date=start, end_date=end, leave_type='Annual', status=status)
+        db.session.add(leave)
+        db.session.commit()
+        return leave
+
+    def test_bulk_approve_is_one_transaction_and_fills_the_calendar(self):
+        from datetime import date, datetime
+        from app.models import CalendarEvent, LeaveRequest
+        self.login()
+        ada, grace = self.add_employee(), self.add_employee('Grace', 'Hopper')
+        ids = [self.add_leave(ada, date(2024, 3, 1), date(2024, 3, 3)).id,
+               self.add_leave(grace, date(2024, 3, 4), date(2024, 3, 4)).id]
+        done = self.add_leave(ada, date(2024, 1, 1), date(2024, 1, 2), status='Rejected').id
+
+        response = self.client.post('/admin/leave_requests/bulk', data={'request_ids': ids + [done], 'action': 'approve'},
+                                    follow_redirects=True)
+        self.assertIn(b'2 leave requests approved; 1 were no longer pending.', response.data)
+        self.assertEqual({r.id: r.status for r in LeaveRequest.query}, {ids[0]: 'Approved', ids[1]: 'Approved', done: 'Rejected'})
+        events = CalendarEvent.query.order_by(CalendarEvent.start_date).all()
+        self.assertEqual([(e.title, e.event_type, e.leave_request_id) for e in events],
+                         [('Ada Lovelace - Annual leave', 'Leave', ids[0]), ('Grace Hopper - Annual leave', 'Leave', ids[1])])
+        self.assertEqual(events[0].end_date, datetime(2024, 3, 3, 23, 59))
+
+        response = self.client.post('/admin/leave_requests/bulk', json={'ids': ids, 'action': 'reject'})
+        self.assertEqual(response.json['ids'], [])
+        self.assertEqual(self.client.post('/admin/leave_requests/bulk', json={'ids': ids, 'action': 'maybe'}).status_code, 400)
+
+    def test_bulk_rejects_malformed_json_and_counts_unique_ids(self):
+        from datetime import date
+        self.login()
+        leave = self.add_leave(self.add_employee(), date(2024, 3, 1), date(2024, 3, 3))
+        for body in ([leave.id], {'ids': 'abc', 'action': 'approve'}, {'ids': [leave.id, 'x'], 'action': 'approve'},
+                     {'ids': [True], 'action': 'approve'}):
+            response = self.client.post('/admin/leave_requests/bulk', json=body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertEqual(response.json['status'], 'error')
+        response = self.client.post('/admin/leave_requests/bulk', json={'ids': [leave.id, leave.id], 'action': 'approve'})
+        self.assertEqual(response.json['message'], '1 leave requests approved; 0 were no longer pending.')
+
+    def test_holidays_are_expanded_over_a_bounded_window(self):
+        from datetime import date, datetime
+        from unittest import mock
+        from app import leave
+        from app.models import CalendarEvent
+        ada = self.add_employee()
+        db.session.add(CalendarEvent(title='Standup', start_date=datetime(2024, 1, 1, 9), end_date=datetime(2024, 1, 1, 10),
+                                     event_type='Holiday', recurrence='daily'))
+        db.session.commit()
+        soon = self.add_leave(ada, date(2024, 3, 1), date(2024, 3, 1))
+        far = self.add_leave(ada, date(2090, 1, 1), date(2090, 1, 1))
+        with mock.patch.object(leave, 'events_in_window', wraps=leave.events_in_window) as expand:
+            conflicts = leave.leave_conflicts([soon, far])
+        window_start, window_end = expand.call_args.args
+        self.assertLessEqual((window_end - window_start).days, self.app.config['CALENDAR_MAX_WINDOW_DAYS'])
+        self.assertEqual(conflicts, {soon.id: ['Holiday: Standup (2024-03-01)']})
+
+    def test_pending_requests_flag_overlaps(self):
+        from datetime import date, datetime
+        from app.models import CalendarEvent
+        self.login()
+        ada, grace = self.add_employee(), self.add_employee('Grace', 'Hopper')
+        self.add_leave(ada, date(2024, 12, 20), date(2024, 12, 23), status='Approved')
+        self.add_leave(grace, date(2024, 12, 20), date(2024, 12, 31), status='Approved')
+        db.session.add(CalendarEvent(title='Christmas', start_date=datetime(2000, 12, 25), end_date=datetime(2000, 12, 25, 23, 59),
+                                     event_type='Holiday', recurrence='yearly'))
+        db.session.commit()
+        overlapping = self.add_leave(ada, date(2024, 12, 23), date(2024, 12, 27))
+        clear = self.add_leave(ada, date(2024, 11, 1), date(2024, 11, 2))
+
+        from app.leave import leave_conflicts
+        conflicts = leave_conflicts([overlapping, clear])
+        self.assertEqual(conflicts, {overlapping.id: ['Overlaps approved Annual leave 2024-12-20 to 2024-12-23',
+                                                      'Holiday: Christmas (2024-12-25)']})
+        response = self.client.get('/admin/leave_requests?status=Pending')
+        self.assertIn(b'Holiday: Christmas (2024-12-25)', response.data)
+        self.assertLessEqual(int(response.headers['X-Query-Count']), 5)
+
+class IdentityCacheCase(AppTestCase):
+    config = {'LOGIN_CACHE_SIZE': 2}
+
+    def add_user(self, username):
+        from app.models import User
+        user = User(username=username)
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+    def load(self, user_id):
+        return self.app.login_manager._user_callback(str(user_id))
+
+    def test_identity_is_reused_until_the_user_changes(self):
+        from app.identity import CachedUser
+        from app.models import User
+        user_id = self.add_user('ada')
+        first = self.load(user_id)
+        self.assertIsInstance(first, CachedUser)
+        self.assertEqual(first.username, 'ada')
+        self.assertIs(self.load(user_id), first)
+
+        User.query.get(user_id).username = 'lovelace'
+        db.session.commit()
+        self.assertEqual(self.load(user_id).username, 'lovelace')
+
+        db.session.delete(User.query.get(user_id))
+        db.session.commit()
+        self.assertIsNone(self.load(user_id))
+
+    def test_cache_is_bounded_and_cleared_on_logout(self):
+        ids = [self.add_user(name) for name in ('a', 'b', 'c')]
+        loaded = [self.load(user_id) for user_id in ids]
+        cache = self.app.extensions['identity_cache']
+        self.assertEqual(list(cache._entries), ids[1:])
+
+        from flask_login import login_user, logout_user
+        with self.app.test_request_context():
+            login_user(loaded[2])
+            logout_user()
+        self.assertEqual(list(cache._entries), ids[1:2])
+
+    def test_ttl_zero_disables_the_cache(self):
+        from app.models import User
+        self.app.config['LOGIN_CACHE_TTL'] = 0
+        user_id = self.add_user('ada')
+        self.assertIsInstance(self.load(user_id), User)
+
+class PasswordPolicyCase(AppTestCase):
+    def test_weaker_hashes_are_upgraded_on_login(self):
+        from werkzeug.security import generate_password_hash
+        from app.models import User
+        user = User(username='admin', password_hash=generate_password_hash('password', method='pbkdf2:sha256:1000'))
+        db.session.add(user)
+        db.session.commit()
+
+        self.assertIn(b'Invalid username or password', self.client.post('/admin/login', data={
+            'username': 'admin', 'password': 'wrong'}, follow_redirects=True).data)
+        self.assertTrue(User.query.one().password_hash.startswith('pbkdf2'))
+
+        response = self.client.post('/admin/login', data={'username': 'admin', 'password': 'password'})
+        self.assertEqual(response.status_code, 302)
+        upgraded = User.query.one()
+        self.assertTrue(upgraded.password_hash.startswith('$2b$04$'))
+        self.assertTrue(upgraded.check_password('password'))
+
+    def test_cost_change_triggers_rehash(self):
+        from app.passwords import PasswordPolicy
+        policy = self.app.extensions['password_policy']
+        old = policy.hash('secret')
+        self.assertFalse(policy.needs_rehash(old))
+        self.app.config.update(PASSWORD_BCRYPT_ROUNDS=5)
+        stronger = PasswordPolicy(self.app)
+        self.assertTrue(stronger.needs_rehash(old))
+        self.assertTrue(stronger.verify(old, 'secret'))
+
+        self.app.config.update(PASSWORD_HASH_METHOD='pbkdf2:sha256')
+        werkzeug_policy = PasswordPolicy(self.app)
+        self.assertTrue(werkzeug_policy.needs_rehash(old))
+        self.assertFalse(werkzeug_policy.needs_rehash(werkzeug_policy.hash('secret')))
+
+    def test_full_queue_rejects_instead_of_waiting(self):
+        from app.passwords import PasswordCheckBusy
+        from app.models import User
+        self.login()
+        self.client.get('/logout')
+        policy = self.app.extensions['password_policy']
+        for _ in range(self.app.config['PASSWORD_VERIFY_WORKERS'] + self.app.config['PASSWORD_VERIFY_QUEUE']):
+            policy._slots.acquire()
+        with self.assertRaises(PasswordCheckBusy):
+            policy.verify_pooled(User.query.one().password_hash, 'password')
+        response = self.client.post('/admin/login', data={'username': 'admin', 'password': 'password'})
+        self.assertEqual(response.status_code, 503)
+
+    def test_scrypt_hashes_fit_the_column(self):
+        from app.models import User
+        from app.passwords import init_password_policy
+        self.app.config.update(PASSWORD_HASH_METHOD='scrypt:32768:8:1')
+        init_password_policy(self.app)
+        user = User(username='admin')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        stored = db.session.execute(db.text('SELECT password_hash FROM user')).scalar()
+        self.assertEqual(stored, user.password_hash)
+        self.assertLessEqual(len(stored), User.__table__.c.password_hash.type.length)
+        self.assertEqual(self.client.post('/admin/login', data={'username': 'admin', 'password': 'password'}).status_code, 302)
+
+    def test_slow_check_times_out_and_keeps_its_slot(self):
+        import threading
+        from unittest import mock
+        from app.passwords import PasswordCheckBusy, PasswordPolicy
+        self.app.config.update(PASSWORD_VERIFY_WORKERS=1, PASSWORD_VERIFY_QUEUE=0, PASSWORD_VERIFY_TIMEOUT=0.05)
+        policy = PasswordPolicy(self.app)
+        release = threading.Event()
+        with mock.patch.object(PasswordPolicy, 'verify', staticmethod(lambda password_hash, password: release.wait(5))):
+            with self.assertRaisesRegex(PasswordCheckBusy, 'timed out'):
+                policy.verify_pooled('hash', 'password')
+            # The timed-out hash is still running, so the only slot is still taken
+            with self.assertRaisesRegex(PasswordCheckBusy, 'Too many'):
+                policy.verify_pooled('hash', 'password')
+            release.set()
+            policy._executor.shutdown(wait=True)
+        self.assertTrue(policy._slots.acquire(blocking=False))
+
+    def test_bench_login_command(self):
+        result = self.app.test_cli_runner().invoke(args=['auth', 'bench-login', '--concurrency', '4', '--logins', '8'])
+        self.assertIn('inline:', result.output)
+        self.assertIn('pooled:', result.output)
+
+class SeedAndBenchmarkCase(AppTestCase):
+    def test_seed_then_benchmark_every_get_route(self):
+        import json
+        from app.models import Attendance, Employee, Message, OpenShift, WorkReport, WorkReportDailyRollup
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['seed', '--employees', '4', '--years', '1', '--projects', '3'])
+        self.assertIsNone(result.exception, result.output)
+        self.assertEqual(Employee.query.count(), 4)
+        self.assertGreater(WorkReport.query.count(), 800)
+        self.assertEqual(db.session.query(db.func.sum(WorkReportDailyRollup.report_count)).scalar(), WorkReport.query.count())
+        self.assertEqual(OpenShift.query.count(), Attendance.query.filter(Attendance.clock_out_time.is_(None)).count())
+        self.assertIn('already has employees', runner.invoke(args=['seed']).output)
+
+        output = os.path.join(tempfile.mkdtemp(), 'bench.json')
+        result = runner.invoke(args=['bench', 'routes', '--iterations', '2', '--output', output, '--label', 'test'])
+        self.assertIsNone(result.exception, result.output)
+        with open(output) as f:
+            results = json.load(f)
+        self.assertEqual(results['label'], 'test')
+        routes = results['routes']
+        for endpoint in ('main.admin_dashboard', 'main.view_work_reports', 'main.employee_dashboard', 'main.api_calendar'):
+            self.assertIn(endpoint, routes)
+        for endpoint, route in routes.items():
+            self.assertTrue(all(status < 500 for status in route['status']), endpoint)
+            self.assertLessEqual(route['p50_ms'], route['p99_ms'])
+            self.assertNotIn('peak_rss_kb', route)
+        self.assertIn('main.message_attachment', results['skipped'])
+        self.assertGreater(results['peak_rss_kb'], 0)
+        # Employees have no login, so their inbox has no public page
+        self.assertEqual(self.client.get(f'/employee/{Employee.query.first().id}/messages').status_code, 404)
+
+class QueryPlanCase(AppTestCase):
+    # Tables that grow with employees x days; reference tables (employee, project, user, rates) may be scanned
+    # The daily rollup is left out: unfiltered report totals sum all of it, which is what it is there for
+    HOT_TABLES = {'attendance', 'open_shift', 'work_report', 'leave_request', 'message', 'message_receipt',
+                  'calendar_event', 'billing_record', 'billing_adjustment'}
+    # Exports stream whole tables on purpose
+    FULL_SCAN_ENDPOINTS = {'main.export_attendance', 'main.export_work_reports', 'main.export_billing_records'}
+
+    def plan_problems(self, statements):
+        import re
+        problems = []
+        for statement, parameters in statements:
+            plan = [row[3] for row in db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+            # Inbox pages OR the recipient index with broadcasts; only the rows found through the indexes are sorted
+            indexed_or = any('MULTI-INDEX OR' in detail for detail in plan)
+            for detail in plan:
+                scan = re.match(r'SCAN (\w+)', detail)
+                if scan and scan.group(1) in self.HOT_TABLES and 'INDEX' not in detail and 'PRIMARY KEY' not in detail:
+                    problems.append(f'{detail} in: {statement}')
+                if 'TEMP B-TREE FOR ORDER BY' in detail and not indexed_or:
+                    problems.append(f'{detail} in: {statement}')
+        return problems
+
+    def test_routes_do_not_scan_hot_tables(self):
+        from sqlalchemy import event
+        from app.benchmark import benchmark_targets
+        from app.seed import seed_database
+        self.login()
+        seed_database(3, 1, projects=3, echo=lambda message: None)
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        failures = {}
+        for endpoint, url in benchmark_targets(self.app):
+            if url is None or endpoint in self.FULL_SCAN_ENDPOINTS:
+                continue
+            statements.clear()
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            try:
+                self.assertLess(self.client.get(url).status_code, 500, url)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', capture)
+            problems = self.plan_problems(list(statements))
+            if problems:
+                failures[endpoint] = problems
+        self.assertEqual(failures, {})
+
+class ReadReplicaCase(AppTestCase):
+    def setUp(self):
+        fd, self.replica_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.config = {'REPORTS_DATABASE_URL': 'sqlite:///' + self.replica_path}
+        super().setUp()
+        db.metadata.create_all(db.engines['reports'])
+
+    def tearDown(self):
+        replica = db.engines['reports']
+        super().tearDown()
+        replica.dispose()
+        os.remove(self.replica_path)
+        # init_app registered metadata for the bind on the shared db; apps in later tests don't have it
+        db.metadatas.pop('reports', None)
+
+    def test_report_views_read_from_replica(self):
+        from datetime import date
+        from app.models import Employee, Project, WorkReport
+        self.login()
+        self.add_report(self.add_employee(), self.add_project(), date(2024, 1, 2), hours=8)
+        with db.engines['reports'].begin() as conn:
+            conn.execute(Employee.__table__.insert(), {'id': 1, 'first_name': 'Ada', 'last_name': 'Lovelace',
+                                                       'email': 'ada@example.com', 'department': 'Engineering'})
+            conn.execute(Project.__table__.insert(), {'id': 1, 'name': 'Apollo', 'billing_method': 'Hourly'})
+            conn.execute(WorkReport.__table__.insert(), [
+                {'employee_id': 1, 'project_id': 1, 'date': date(2024, 1, d), 'hours_worked': 1} for d in (3, 4)])
+
+        # The replica has no users; the login check still reads the primary
+        items = self.client.get('/api/work_reports').json['items']
+        self.assertEqual([item['date'] for item in items], ['2024-01-04', '2024-01-03'])
+        self.assertIn(b'2024-01-04', self.client.get('/admin/work_reports/export').data)
+        # The rollup was only maintained on the primary
+        self.assertEqual(self.client.get('/api/work_reports/summary').json['items'], [])
+        # Outside those views the session reads the primary again
+        self.assertEqual(WorkReport.query.count(), 1)
+
+    def test_engine_options_from_config(self):
+        from app.database import engine_options
+        options = engine_options(self.app.config, 'mysql+pymysql://u:p@db/ems')
+        self.assertEqual((options['pool_size'], options['max_overflow'], options['pool_pre_ping']), (10, 20, True))
+        self.assertEqual(options['connect_args'], {'connect_timeout': 10})
+        self.assertEqual(engine_options(self.app.config, 'sqlite:///ems.db'), {})
+        from sqlalchemy import create_engine
+        engine = create_engine('mysql+pymysql://u:p@db/ems', **options)
+        self.assertEqual((engine.pool.size(), engine.pool._recycle), (10, 1800))
+
+
+class AttendanceStreamCase(AppTestCase):
+    config = {'ATTENDANCE_STREAM_KEEPALIVE': 0.01, 'ATTENDANCE_STREAM_HISTORY': 3, 'ATTENDANCE_STREAM_RESYNC': 0.01}
+
+    def read_events(self, chunks):
+        import json
+        events = []
+        for message in next(chunks).decode().split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in message.split('\n') if line and not line.startswith(':')
+                          and not line.startswith('retry'))
+            if fields:
+                events.append((fields['id'], fields['event'], json.loads(fields['data'])))
+        return events
+
+    def punch(self, action, employee):
+        return self.client.post(f'/api/attendance/{action}', json={'employee_id': employee.id})
+
+    def test_snapshot_then_committed_punches(self):
+        ada, grace = self.add_employee(), self.add_employee('Grace', 'Hopper')
+        self.punch('clock_in', ada)
+        self.login()
+        response = self.client.get('/api/attendance/stream', buffered=False)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        chunks = iter(response.response)
+        next(chunks) # retry interval
+        [(snapshot_id, name, snapshot)] = self.read_events(chunks)
+        self.assertEqual(name, 'snapshot')
+        self.assertEqual([(e['employee_name'], e['clocked_in']) for e in snapshot['employees']],
+                         [('Ada Lovelace', True), ('Grace Hopper', False)])
+
+        self.assertEqual(self.read_events(chunks), []) # keepalive while idle
+        self.punch('clock_in', grace)
+        self.punch('clock_out', ada)
+        self.punch('clock_out', ada) # rejected, publishes nothing
+        events = self.read_events(chunks)
+        self.assertEqual([(name, data['employee_id']) for _, name, data in events],
+                         [('clock_in', grace.id), ('clock_out', ada.id)])
+        response.close()
+
+        # Reconnecting with the last id seen replays what was missed instead of a new snapshot
+        response = self.client.get('/api/attendance/stream', headers={'Last-Event-ID': snapshot_id}, buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        self.assertEqual([event[0] for event in self.read_events(chunks)], [event[0] for event in events])
+        response.close()
+
+    def test_single_employee_stream_is_public_and_filtered(self):
+        ada, grace = self.add_employee(), self.add_employee('Grace', 'Hopper')
+        self.assertEqual(self.client.get('/api/attendance/stream').status_code, 401)
+        response = self.client.get(f'/api/attendance/stream?employee_id={grace.id}', buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        [(_, _, snapshot)] = self.read_events(chunks)
+        self.assertEqual([e['employee_id'] for e in snapshot['employees']], [grace.id])
+        self.punch('clock_in', ada)
+        self.punch('clock_in', grace)
+        self.assertEqual([(name, data['employee_id']) for _, name, data in self.read_events(chunks)],
+                         [('clock_in', grace.id)])
+        response.close()
+
+    def test_client_behind_the_history_gets_a_new_snapshot(self):
+        employees = [self.add_employee(f'E{i}', 'Smith') for i in range(5)]
+        response = self.client.get(f'/api/attendance/stream?employee_id={employees[0].id}', buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        self.read_events(chunks)
+        for employee in employees:
+            self.punch('clock_in', employee)
+        [(_, name, snapshot)] = self.read_events(chunks)
+        self.assertEqual(name, 'snapshot')
+        self.assertTrue(snapshot['employees'][0]['clocked_in'])
+        response.close()
+
+    def test_punches_committed_by_other_processes_reach_the_stream(self):
+        from unittest import mock
+        from app.models import Attendance
+        ada, grace = self.add_employee(), self.add_employee('Grace', 'Hopper')
+        self.punch('clock_in', ada)
+        self.login()
+        response = self.client.get('/api/attendance/stream', buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        self.read_events(chunks)
+        # Without this process's hub the commits go unpublished, as another worker's would
+        with mock.patch.dict(self.app.extensions):
+            del self.app.extensions['attendance_hub']
+            self.punch('clock_in', grace)
+            self.punch('clock_out', ada)
+        events = []
+        for _ in range(100):
+            events += self.read_events(chunks)
+            if len(events) >= 2:
+                break
+        clock_out = Attendance.query.filter_by(employee_id=ada.id).one().clock_out_time
+        self.assertEqual([(name, data['employee_id'], data['time']) for _, name, data in events],
+                         [('clock_out', ada.id, clock_out.isoformat()), ('clock_in', grace.id, events[1][2]['time'])])
+
+        # Punches this process published itself are not repeated by the next sync
+        self.punch('clock_out', grace)
+        self.assertEqual([name for _, name, _ in self.read_events(chunks)], ['clock_out'])
+        time.sleep(0.05)
+        for _ in range(5):
+            self.assertEqual(self.read_events(chunks), [])
+        response.close()
+
+
+class TimesheetCase(AppTestCase):
+    def shift(self, employee, clock_in, clock_out=None):
+        from app.models import Attendance
+        db.session.add(Attendance(employee_id=employee.id, clock_in_time=clock_in, clock_out_time=clock_out))
+        db.session.commit()
+
+    def test_night_shifts_overlaps_and_open_shifts(self):
+        from datetime import date, datetime as dt
+        from app.timesheets import build_timesheets
+        ada, grace = self.add_employee(), self.add_employee('Grace', 'Hopper')
+        # Sunday night into Monday: splits across the days and the ISO weeks
+        self.shift(ada, dt(2024, 1, 7, 22), dt(2024, 1, 8, 6))
+        # Overlapping punches on Tuesday count 09:00-14:00 once
+        self.shift(ada, dt(2024, 1, 9, 9), dt(2024, 1, 9, 12))
+        self.shift(ada, dt(2024, 1, 9, 11), dt(2024, 1, 9, 14))
+        # Still open, and a forgotten clock-out capped at 24 hours
+        self.shift(grace, dt(2024, 1, 10, 8))
+        self.shift(grace, dt(2024, 1, 1, 8))
+        # Outside the window
+        self.shift(ada, dt(2024, 1, 20, 9), dt(2024, 1, 20, 17))
+
+        ada_sheet, grace_sheet = build_timesheets(date(2024, 1, 7), date(2024, 1, 10), now=dt(2024, 1, 10, 11, 30))
+        self.assertEqual(ada_sheet['days'], [{'date': '2024-01-07', 'hours': 2.0}, {'date': '2024-01-08', 'hours': 6.0},
+                                             {'date': '2024-01-09', 'hours': 5.0}])
+        self.assertEqual(ada_sheet['weeks'], [{'week_start': '2024-01-01', 'hours': 2.0},
+                                              {'week_start': '2024-01-08', 'hours': 11.0}])
+        self.assertEqual((ada_sheet['total_hours'], ada_sheet['overlapping_shifts'], ada_sheet['overlap_hours']), (13.0, 1, 1.0))
+        # The January 1st shift started too long before the window to reach into it once capped
+        self.assertEqual(grace_sheet['days'], [{'date': '2024-01-10', 'hours': 3.5}])
+        self.assertEqual((grace_sheet['open_shifts'], grace_sheet['capped_shifts']), (1, 0))
+
+        [grace_sheet] = build_timesheets(date(2024, 1, 10), date(2024, 1, 11), employee_ids=[grace.id],
+                                         now=dt(2024, 1, 12, 20))
+        self.assertEqual(grace_sheet['days'], [{'date': '2024-01-10', 'hours': 16.0}, {'date': '2024-01-11', 'hours': 8.0}])
+        self.assertEqual(grace_sheet['capped_shifts'], 1)
+
+    def test_api_cross_checks_work_reports(self):
+        from datetime import date, datetime as dt
+        ada, apollo = self.add_employee(), self.add_project()
+        self.shift(ada, dt(2024, 1, 8, 9), dt(2024, 1, 8, 17))
+        self.shift(ada, dt(2024, 1, 9, 9), dt(2024, 1, 9, 14))
+        self.add_report(ada, apollo, date(2024, 1, 8), hours=8)
+        self.add_report(ada, apollo, date(2024, 1, 9), hours=8)
+        self.add_report(ada, apollo, date(2024, 1, 10), hours=2)
+        self.login()
+
+        response = self.client.get('/api/timesheets?start_date=2024-01-08&end_date=2024-01-14&crosscheck=1')
+        [sheet] = response.json['employees']
+        self.assertEqual((sheet['total_hours'], sheet['reported_hours']), (13.0, 18.0))
+        self.assertEqual(sheet['discrepancies'], ['2024-01-09', '2024-01-10'])
+        self.assertEqual(sheet['days'][2], {'date': '2024-01-10', 'hours': 0.0, 'reported_hours': 2.0})
+        self.assertNotIn('discrepancies', self.client.get('/api/timesheets?start_date=2024-01-08&end_date=2024-01-14')
+                         .json['employees'][0])
+
+        self.assertEqual(self.client.get('/api/timesheets?start_date=2024-01-08&end_date=2024-01-01').status_code, 400)
+        self.assertEqual(self.client.get('/api/timesheets?start_date=2024-01-01&end_date=2024-12-31').status_code, 400)
+        self.assertEqual(self.client.get('/api/timesheets?start_date=January').status_code, 400)
+
+
+class AttendanceArchiveCase(AppTestCase):
+    def shift(self, employee, clock_in, clock_out=None):
+        from app.models import Attendance
+        attendance = Attendance(employee_id=employee.id, clock_in_time=clock_in, clock_out_time=clock_out)
+        db.session.add(attendance)
+        db.session.commit()
+        return attendance.id
+
+    def test_archive_moves_closed_shifts_and_reads_union_both(self):
+        from datetime import date, datetime as dt
+        from app.models import Attendance, AttendanceArchive, AttendanceArchiveMonth
+        from app.timesheets import build_timesheets
+        ada = self.add_employee()
+        old_ids = [self.shift(ada, dt(2023, 1, 9, 9), dt(2023, 1, 9, 17)),
+                   self.shift(ada, dt(2023, 1, 31, 22), dt(2023, 2, 1, 6))]
+        forgotten = self.shift(ada, dt(2023, 2, 3, 9))
+        recent = self.shift(ada, dt(2024, 3, 4, 9), dt(2024, 3, 4, 12))
+
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['attendance', 'archive', '--before', '2024-01-15'])
+        self.assertIn('2 shifts archived from before 2024-01', result.output)
+        self.assertEqual(sorted(a.id for a in AttendanceArchive.query), old_ids)
+        self.assertEqual(sorted(a.id for a in Attendance.query), [forgotten, recent])
+        self.assertEqual([(m.month, m.shift_count) for m in AttendanceArchiveMonth.query], [(date(2023, 1, 1), 2)])
+        self.assertIn('0 shifts archived', runner.invoke(args=['attendance', 'archive', '--before', '2024-01-15']).output)
+
+        [sheet] = build_timesheets(date(2023, 1, 1), date(2023, 2, 28), max_shift_hours=12)
+        self.assertEqual(sheet['days'], [{'date': '2023-01-09', 'hours': 8.0}, {'date': '2023-01-31', 'hours': 2.0},
+                                         {'date': '2023-02-01', 'hours': 6.0}, {'date': '2023-02-03', 'hours': 12.0}])
+
+        self.login()
+        lines = self.client.get('/admin/attendance/export').data.decode().splitlines()
+        self.assertEqual([int(line.split(',')[0]) for line in lines[1:]], sorted(old_ids + [forgotten, recent]))
+        lines = self.client.get(f'/admin/attendance/export?employee_id={ada.id}&start_date=2023-01-10&end_date=2023-02-28').data.decode().splitlines()
+        self.assertEqual([int(line.split(',')[0]) for line in lines[1:]], [old_ids[1], forgotten])
+
+    def test_newest_row_stays_hot(self):
+        from datetime import datetime as dt
+        from app.models import Attendance
+        ada = self.add_employee()
+        self.shift(ada, dt(2023, 1, 9, 9), dt(2023, 1, 9, 17))
+        newest = self.shift(ada, dt(2023, 1, 10, 9), dt(2023, 1, 10, 17))
+        self.app.test_cli_runner().invoke(args=['attendance', 'archive', '--months', '1'])
+        self.assertEqual([a.id for a in Attendance.query], [newest])
+
+
+class SearchCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        from datetime import date
+        from app.models import WorkReport
+        self.ada, self.grace = self.add_employee(), self.add_employee('Grace', 'Hopper')
+        self.apollo, self.gemini = self.add_project(), self.add_project('Gemini')
+        db.session.add_all([
+            WorkReport(employee_id=self.ada.id, project_id=self.apollo.id, date=date(2024, 1, 2), hours_worked=2,
+                       description='Chased invoice 4411 with the customer'),
+            WorkReport(employee_id=self.grace.id, project_id=self.gemini.id, date=date(2024, 2, 2), hours_worked=3,
+                       description='Invoice 4411 paid; invoice 4411 closed'),
+            WorkReport(employee_id=self.grace.id, project_id=self.apollo.id, date=date(2024, 2, 3), hours_worked=1,
+                       description='Invoice 5000 drafted'),
+        ])
+        db.session.commit()
+        self.login()
+
+    def search(self, **params):
+        response = self.client.get('/api/search', query_string=params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.json
+
+    def test_ranked_filtered_and_paginated(self):
+        result = self.search(q='invoice 4411')
+        self.assertEqual([item['description'] for item in result['items']],
+                         ['Invoice 4411 paid; invoice 4411 closed', 'Chased invoice 4411 with the customer'])
+        self.assertEqual(result['terms'], ['invoice', '4411'])
+        self.assertEqual(len(self.search(q='invoice', project_id=self.apollo.id)['items']), 2)
+        self.assertEqual([item['employee_id'] for item in self.search(q='4411', employee_id=self.ada.id)['items']],
+                         [self.ada.id])
+        self.assertEqual(len(self.search(q='invoice', start_date='2024-02-01', end_date='2024-02-02')['items']), 1)
+        # Query syntax in user input is treated as plain words
+        self.assertEqual(len(self.search(q='"4411* (:')['items']), 2)
+
+        first = self.search(q='invoice', per_page=2)
+        self.assertEqual(len(first['items']), 2)
+        rest = self.client.get(first['next_url']).json
+        self.assertEqual(len(rest['items']), 1)
+        self.assertIsNone(rest['next_url'])
+        self.assertNotIn(rest['items'][0]['id'], [item['id'] for item in first['items']])
+
+    def test_index_follows_writes(self):
+        from datetime import date
+        from sqlalchemy import insert
+        from app.models import WorkReport
+        report = WorkReport.query.filter_by(employee_id=self.ada.id).one()
+        report.description = 'Followed up on purchase order 77'
+        db.session.commit()
+        self.assertEqual(len(self.search(q='4411')['items']), 1)
+        self.assertEqual(self.search(q='purchase order')['items'][0]['id'], report.id)
+        db.session.delete(report)
+        db.session.commit()
+        self.assertEqual(self.search(q='purchase')['items'], [])
+        # Core bulk inserts, as the CSV import and seed use, are indexed as well
+        db.session.execute(insert(WorkReport), [{'employee_id': self.ada.id, 'project_id': self.apollo.id,
+                                                 'date': date(2024, 3, 1), 'description': 'Bulk loaded widget audit'}])
+        db.session.commit()
+        self.assertEqual(len(self.search(q='widget')['items']), 1)
+
+    def test_messages(self):
+        from app.inbox import send_message
+        send_message(self.ada.id, False, 1, True, 'Where is the invoice for March?', subject='Billing')
+        send_message(1, True, self.grace.id, False, 'Your badge is ready', subject='Invoice copies')
+        send_message(1, True, None, None, 'Office closed on Friday')
+        # Between two other people, so not the admin's to read
+        send_message(self.ada.id, False, self.grace.id, False, 'Lunch after the invoice run?')
+        db.session.commit()
+
+        items = self.search(q='invoice', type='messages')['items']
+        self.assertEqual(len(items), 2)
+        self.assertNotIn('Lunch after the invoice run?', [item['body'] for item in items])
+        self.assertEqual([item['body'] for item in self.search(q='invoice', type='messages', employee_id=self.grace.id)['items']],
+                         ['Your badge is ready'])
+        self.assertEqual(self.search(q='invoice', type='messages', project_id=self.apollo.id)['items'], [])
+        self.assertEqual(self.client.get('/api/search?q=invoice&type=files').status_code, 400)
+
+        page = self.client.get('/admin/search?q=friday&type=messages').data
+        self.assertIn(b'Office closed on Friday', page)
+        self.assertIn(b'Chased invoice 4411', self.client.get('/admin/search?q=chased').data)
+
+
+class DirectoryCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ada = self.add_employee()
+        self.grace = self.add_employee('Grace', 'Hopper', 'Research')
+        self.alan = self.add_employee('Alan', 'Turing', 'Research')
+
+    def names(self, **params):
+        response = self.client.get('/api/employees/search', query_string=params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [item['name'] for item in response.json['items']]
+
+    def test_prefix_search(self):
+        self.assertEqual(self.names(q='a'), ['Ada Lovelace', 'Alan Turing'])
+        self.assertEqual(self.names(q='RES'), ['Grace Hopper', 'Alan Turing'])
+        self.assertEqual(self.names(q='research tur'), ['Alan Turing'])
+        self.assertEqual(self.names(q='hopper gr'), ['Grace Hopper'])
+        self.assertEqual(self.names(q='zz'), [])
+        self.assertEqual(self.names(q='', limit=2), ['Ada Lovelace', 'Alan Turing'])
+
+    def test_public_callers_see_active_employees_without_emails(self):
+        self.alan.is_active = False
+        db.session.commit()
+        response = self.client.get('/api/employees/search', query_string={'q': 'a'})
+        self.assertEqual([item['name'] for item in response.json['items']], ['Ada Lovelace'])
+        self.assertNotIn('email', response.json['items'][0])
+        self.assertEqual(self.names(q='grace.hopper@'), [])
+
+        self.login()
+        self.assertEqual(self.names(q='a'), ['Ada Lovelace', 'Alan Turing'])
+        self.assertEqual(self.names(q='a', active='1'), ['Ada Lovelace'])
+        self.assertEqual(self.names(q='grace.hopper@'), ['Grace Hopper'])
+        users = self.client.get('/api/users/search', query_string={'q': 'ad'}).json
+        self.assertEqual([item['name'] for item in users['items']], ['admin'])
+
+    def test_index_follows_commits(self):
+        version = self.client.get('/api/employees/search').json['version']
+        self.grace.last_name = 'Brewster'
+        db.session.commit()
+        self.assertEqual(self.names(q='brew'), ['Grace Brewster'])
+        self.assertEqual(self.names(q='hopper'), [])
+        self.assertGreater(self.client.get('/api/employees/search').json['version'], version)
+        self.add_employee('Katherine', 'Johnson')
+        self.assertEqual(self.names(q='kath'), ['Katherine Johnson'])
+        # Changes rolled back never reach the index
+        self.ada.first_name = 'Augusta'
+        db.session.rollback()
+        self.assertEqual(self.names(q='aug'), [])
+
+    def test_pages_render_pickers(self):
+        response = self.client.get('/')
+        self.assertIn(b'js/picker.js', response.data)
+        self.assertNotIn(b'Lovelace', response.data)
+        self.login()
+        response = self.client.get('/admin/work_reports', query_string={'employee_id': self.grace.id})
+        self.assertIn(b'value="Grace Hopper"', response.data)
+        self.assertNotIn(b'Lovelace', response.data)
+        self.assertNotIn(b'Lovelace', self.client.get('/messages').data)
+        response = self.client.get('/admin/billing_records')
+        self.assertIn(b'rate_employee_search', response.data)
+        self.assertNotIn(b'Lovelace', response.data)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file